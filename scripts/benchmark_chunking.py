@@ -0,0 +1,72 @@
+import argparse
+import tempfile
+import time
+
+from chunking import Chunker, NearDuplicateIndex
+from data_fetcher import DataFetcher
+from ingestion import sentence_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector count and ingestion time: one row per sentence vs deduplicated passages")
+    parser.add_argument('--links', default="data/links")
+    parser.add_argument('--chunk-tokens', type=int, default=128)
+    parser.add_argument('--overlap', type=int, default=32)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--embed', action='store_true', help="Also time embedding with SENTENCE_MODEL (downloads the model)")
+    args = parser.parse_args()
+
+    fetcher = DataFetcher(args.links)
+    start = time.perf_counter()
+    pages = [(url, response.content) for url, response in fetcher.iter_pages(fetcher.load_urls()) if response is not None]
+    fetched = time.perf_counter() - start
+    if not pages:
+        print("No pages could be fetched")
+        return
+
+    start = time.perf_counter()
+    split = [(url, sentences) for url, sentences in fetcher.split_pages(pages)]
+    split_time = time.perf_counter() - start
+    sentences = list(dict.fromkeys(s for _, page in split for s in page))
+
+    count_tokens = None
+    if args.embed:
+        from config import Config
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(Config.SENTENCE_MODEL)
+        count_tokens = lambda text: len(model.tokenizer.tokenize(text))
+    chunker = Chunker(args.chunk_tokens, args.overlap, **({'count_tokens': count_tokens} if count_tokens else {}))
+
+    start = time.perf_counter()
+    chunks = [text for _, page in split for text, _ in chunker.chunk(page)]
+    chunk_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        dedup = NearDuplicateIndex(directory, threshold=args.threshold)
+        start = time.perf_counter()
+        kept = [text for text in dict.fromkeys(chunks) if dedup.add_if_new(sentence_hash(text), text)]
+        dedup_time = time.perf_counter() - start
+
+    print(f"{len(pages)} pages fetched in {fetched:.2f}s, split in {split_time:.2f}s")
+    print(f"{'':<24} | {'vectors':>8} | {'words/vector':>12} | {'stage s':>7}")
+    for name, texts, seconds in (("sentences (before)", sentences, 0.0),
+                                 ("passages", chunks, chunk_time),
+                                 ("passages deduplicated", kept, dedup_time)):
+        words = sum(len(text.split()) for text in texts) / max(len(texts), 1)
+        print(f"{name:<24} | {len(texts):>8} | {words:>12.1f} | {seconds:>7.3f}")
+    unique = len(dict.fromkeys(chunks))
+    print(f"Chunking: {len(sentences)} sentences -> {len(chunks)} passages "
+          f"({1 - len(chunks) / max(len(sentences), 1):.1%} fewer vectors)")
+    print(f"Deduplication: {len(chunks) - unique} exact and {unique - len(kept)} near duplicates dropped "
+          f"({1 - len(kept) / max(len(chunks), 1):.1%} of the passages)")
+    print(f"Link set vector count reduction: {1 - len(kept) / max(len(sentences), 1):.1%}")
+
+    if args.embed:
+        for name, texts in (("sentences", sentences), ("passages", kept)):
+            start = time.perf_counter()
+            model.encode(texts, batch_size=32)
+            print(f"Embedding {name}: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
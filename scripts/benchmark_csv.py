@@ -0,0 +1,75 @@
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from csv_data_fetcher import CSVDataFetcher
+
+
+def legacy_load(csv_file: str) -> pd.DataFrame:
+    # The previous CSVDataFetcher: date format inferred per element
+    df = pd.read_csv(csv_file)
+    for col in ['Start Date', 'End Date']:
+        df[col] = pd.to_datetime(df[col]).dt.strftime('%Y-%m-%d')
+    for col in ['Start Time', 'End Time']:
+        df[col] = pd.to_datetime(df[col], format='%H:%M').dt.strftime('%H:%M')
+    return df
+
+
+def legacy_serialize(df: pd.DataFrame):
+    rows = []
+    for _, row in df.iterrows():
+        rows.append(', '.join([f"{col}: {row[col]}" for col in df.columns]))
+    return rows
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def make_calendar(source: str, rows: int, path: str):
+    # Repeat the sample calendar and spread the dates over a few years
+    sample = pd.read_csv(source)
+    df = sample.iloc[[i % len(sample) for i in range(rows)]].reset_index(drop=True)
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta([i % 1000 for i in range(rows)], unit='D')
+    for col in ['Start Date', 'End Date']:
+        df[col] = [f"{d.month}/{d.day}/{d.year}" for d in dates]
+    df.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy vs vectorized CSVDataFetcher")
+    parser.add_argument('--csv', default='data/data.csv', help="Sample calendar to replicate")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=100_000, help="Skip the iterrows baseline above this size")
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} | {'legacy load':>11} | {'load':>7} | {'snapshot':>8} | {'legacy rows':>11} | {'rows':>7}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'calendar.csv')
+            make_calendar(args.csv, rows, path)
+
+            load_time, fetcher = timed(CSVDataFetcher, path)
+            snapshot_time, cached = timed(CSVDataFetcher, path)
+            serialize_time, serialized = timed(cached.fetch_and_process_csv)
+
+            if rows <= args.legacy_max:
+                legacy_load_time, legacy_df = timed(legacy_load, path)
+                legacy_time, legacy_rows = timed(legacy_serialize, legacy_df)
+                assert legacy_rows == serialized, "vectorized rows differ from iterrows output"
+                legacy = f"{legacy_load_time:>10.2f}s | "
+                legacy_serialized = f"{legacy_time:>10.2f}s"
+            else:
+                legacy = f"{'-':>11} | "
+                legacy_serialized = f"{'-':>11}"
+
+            print(f"{rows:>9} | {legacy}{load_time:>6.2f}s | {snapshot_time:>7.2f}s | {legacy_serialized} | {serialize_time:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
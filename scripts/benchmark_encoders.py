@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from config import Config
+from model_loader import BACKENDS, PreloadedModel, cosine_drift
+
+
+def load_sentences(path: str, count: int):
+    # Calendar rows and the passages of the local vector store when there is one, cycled up to count
+    sentences = []
+    if os.path.exists(path):
+        from csv_data_fetcher import CSVDataFetcher
+        sentences = CSVDataFetcher(path).fetch_and_process_csv()
+    stored = os.path.join(Config.LOCAL_VECTOR_DIR, "chatbott.sentences.json")
+    if os.path.exists(stored):
+        with open(stored, 'r', encoding='utf-8') as f:
+            sentences += json.load(f)
+    if not sentences:
+        sentences = ["What is Python?", "Who organizes the design review on Friday?"]
+    return [sentences[i % len(sentences)] + ("" if i < len(sentences) else f" ({i})") for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoder backends: cosine drift against float32, sentences/sec and query latency")
+    parser.add_argument('--model', default=Config.SENTENCE_MODEL, help="Model name or local path")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--threads', type=int, default=Config.ENCODER_THREADS)
+    parser.add_argument('--sentences', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--csv', default="data/data.csv")
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.csv, args.sentences)
+    queries = [f"Who attends the meeting number {i}?" for i in range(args.queries)]
+
+    reference = reference_queries = None
+    print(f"{len(sentences)} sentences, {len(queries)} queries, {args.threads or 'default'} threads")
+    print(f"{'backend':<7} | {'load s':>6} | {'sent/s':>7} | {'query p50 ms':>12} | {'query p99 ms':>12} | "
+          f"{'cos mean':>8} | {'cos min':>7} | {f'top-{args.top_k} overlap':>13}")
+    for backend in ['torch'] + [b for b in args.backends if b != 'torch']:
+        start = time.perf_counter()
+        model = PreloadedModel(args.model, Config.MODEL_DIR, background=False, backend=backend, threads=args.threads)
+        load = time.perf_counter() - start
+
+        model.encode(sentences[:args.batch_size], batch_size=args.batch_size)
+        start = time.perf_counter()
+        embeddings = np.asarray(model.encode(sentences, batch_size=args.batch_size), dtype=np.float32)
+        throughput = len(sentences) / (time.perf_counter() - start)
+
+        latencies, query_vectors = [], []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(model.encode([query])[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+
+        if reference is None:
+            # float32 PyTorch is the reference the others are compared against
+            reference, reference_queries = embeddings, query_vectors
+        drift = cosine_drift(reference, embeddings)
+        # Same nearest sentences as float32 for the queries?
+        expected = np.argsort(-reference_queries @ reference.T, axis=1)[:, :args.top_k]
+        found = np.argsort(-query_vectors @ embeddings.T, axis=1)[:, :args.top_k]
+        overlap = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(expected, found)])
+
+        print(f"{backend:<7} | {load:>6.1f} | {throughput:>7.0f} | {np.percentile(latencies, 50):>12.2f} | "
+              f"{np.percentile(latencies, 99):>12.2f} | {drift['mean']:>8.4f} | {drift['min']:>7.4f} | {overlap:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from data_fetcher import DataFetcher
+
+PARAGRAPH = ("<p>Python is a high-level, general-purpose programming language. "
+             "Its design philosophy emphasizes code readability with the use of significant indentation. "
+             "Python is dynamically typed and garbage-collected? It supports multiple programming paradigms.</p>")
+
+
+def make_handler(latency: float, paragraphs: int):
+    class PageHandler(BaseHTTPRequestHandler):
+        # Stand-in for a remote site: fixed latency, a page body and an ETag per path
+        def do_GET(self):
+            time.sleep(latency)
+            etag = f'"{self.path}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = f"<html><body><h1>{self.path}</h1>{PARAGRAPH * paragraphs}</body></html>".encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PageHandler
+
+
+def time_fetch(fetcher: DataFetcher):
+    start = time.perf_counter()
+    sentences = fetcher.fetch_and_process_urls()
+    return time.perf_counter() - start, sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serial vs concurrent DataFetcher against a local HTTP server")
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds the server waits before answering")
+    parser.add_argument('--paragraphs', type=int, default=200, help="Paragraphs per page, drives parse cost")
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--per-host', type=int, default=32)
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.latency, args.paragraphs))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+
+    with tempfile.NamedTemporaryFile('w', suffix='.links', delete=False) as f:
+        f.write('\n'.join(f"http://{host}:{port}/page/{i}" for i in range(args.pages)))
+        links_path = f.name
+
+    try:
+        serial_time, serial = time_fetch(DataFetcher(links_path, max_workers=1))
+        concurrent_time, concurrent = time_fetch(DataFetcher(links_path, max_workers=args.workers,
+                                                             per_host_limit=args.per_host,
+                                                             parse_workers=args.parse_workers))
+    finally:
+        server.shutdown()
+        os.unlink(links_path)
+
+    print(f"Pages: {args.pages}, latency: {args.latency * 1000:.0f} ms, sentences: {len(serial)}")
+    print(f"Serial:     {serial_time:.2f} s")
+    print(f"Concurrent: {concurrent_time:.2f} s ({args.workers} fetch workers, {args.parse_workers} parse workers)")
+    print(f"Speedup:    {serial_time / concurrent_time:.1f}x")
+    print(f"Same output in same order: {serial == concurrent}")
+
+
+if __name__ == "__main__":
+    main()
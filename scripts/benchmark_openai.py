@@ -0,0 +1,105 @@
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_openai_server import MockChatServer
+from openai_handler import OpenAIHandler, AsyncOpenAIHandler
+from prompt_builder import PromptBuilder
+
+CONTEXT = ["Python is a high-level, general-purpose programming language."]
+
+
+def add_tool_latency(handler, seconds: float):
+    # Both tools are local lookups; the delay stands in for a tool that waits on I/O
+    execute = handler._execute_tool
+
+    def slow_execute(tool_call, context):
+        time.sleep(seconds)
+        return execute(tool_call, context)
+
+    handler._execute_tool = slow_execute
+
+
+def run_turns(handler, turns: int, users: int):
+    # Each simulated user sends its turns back to back, users run side by side
+    latencies = []
+
+    def one_turn(i):
+        start = time.perf_counter()
+        response = handler.generate_response(f"question {i}", CONTEXT)
+        latencies.append(time.perf_counter() - start)
+        return response
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        responses = list(executor.map(one_turn, range(turns)))
+    elapsed = time.perf_counter() - start
+    assert all(responses), "some turns failed"
+    return elapsed, latencies
+
+
+def run_streams(handler, turns: int, users: int):
+    # Time to first token and to the last token of streamed answers
+    ttfts, totals = [], []
+
+    def one_turn(i):
+        stream = handler.generate_response_stream(f"question {i}", CONTEXT)
+        for _ in stream:
+            pass
+        assert stream.error is None and stream.parts, "a stream failed"
+        ttfts.append(stream.ttft)
+        totals.append(stream.total)
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(one_turn, range(turns)))
+    return ttfts, totals
+
+
+def report(name: str, elapsed: float, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<6} p50 {p50 * 1000:7.0f} ms | p95 {p95 * 1000:7.0f} ms | {len(latencies) / elapsed:6.1f} turns/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async OpenAIHandler on multi-tool turns against a mock server")
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock latency per completion in seconds")
+    parser.add_argument('--tool-calls', type=int, default=3)
+    parser.add_argument('--tool-latency', type=float, default=0.1, help="Simulated I/O wait per tool call in seconds")
+    parser.add_argument('--turns', type=int, default=16)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--stream', action='store_true', help="Also compare time to first token with streaming")
+    parser.add_argument('--token-latency', type=float, default=0.01, help="Mock seconds between streamed words")
+    parser.add_argument('--answer-words', type=int, default=100)
+    args = parser.parse_args()
+
+    mock = MockChatServer(args.latency, args.tool_calls, token_latency=args.token_latency,
+                          answer_words=args.answer_words).start()
+    try:
+        sync_handler = OpenAIHandler(mock.endpoint, "mock-key", "2024-02-15-preview", "data/data.csv",
+                                     prompt_builder=PromptBuilder("gpt-4o-mini"))
+        async_handler = AsyncOpenAIHandler(mock.endpoint, "mock-key", "2024-02-15-preview", "data/data.csv",
+                                           prompt_builder=PromptBuilder("gpt-4o-mini"))
+
+        for handler in (sync_handler, async_handler):
+            add_tool_latency(handler, args.tool_latency)
+
+        print(f"Mock latency {args.latency * 1000:.0f} ms, {args.tool_calls} tool calls per turn "
+              f"of {args.tool_latency * 1000:.0f} ms each, {args.users} users")
+        report("sync", *run_turns(sync_handler, args.turns, args.users))
+        report("async", *run_turns(async_handler, args.turns, args.users))
+        if args.stream:
+            print(f"Streaming {args.answer_words} words, {args.token_latency * 1000:.0f} ms apart")
+            for name, handler in (("sync", sync_handler), ("async", async_handler)):
+                ttfts, totals = run_streams(handler, args.turns, args.users)
+                print(f"{name:<6} first token p50 {statistics.median(ttfts) * 1000:7.0f} ms | "
+                      f"full answer p50 {statistics.median(totals) * 1000:7.0f} ms")
+        async_handler.close()
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
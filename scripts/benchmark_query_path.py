@@ -0,0 +1,159 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+from mock_openai_server import MockChatServer
+
+
+def default_queries(calendar_csv: str):
+    # Questions about the calendar rows, plus one for the Wikipedia tool
+    with open(calendar_csv, newline='', encoding='utf-8') as f:
+        subjects = list(dict.fromkeys(row['Subject'] for row in csv.DictReader(f)))
+    queries = [f"{question} the {subject}?" for subject in subjects
+               for question in ("Who organizes", "Where is", "When is")]
+    return queries + ["What is Python?"]
+
+
+def load_queries(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def isolate(cache_dir: str, endpoint: str, args):
+    # Must run before config is imported: every store lives in cache_dir, completions go to the mock
+    os.environ.setdefault('MODEL_DIR', os.path.join(os.getenv('CACHE_DIR', '.cache'), 'models'))
+    links = os.path.join(cache_dir, 'links')
+    with open(links, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(args.links))
+    os.environ.update({
+        'CACHE_DIR': cache_dir,
+        'VECTOR_BACKEND': 'local',
+        'LOCAL_VECTOR_DIR': os.path.join(cache_dir, 'vectors'),
+        'INGEST_MANIFEST': os.path.join(cache_dir, 'ingest_manifest.json'),
+        'SPARSE_INDEX_DIR': os.path.join(cache_dir, 'bm25'),
+        'DEDUP_DIR': os.path.join(cache_dir, 'minhash'),
+        'LINKS_FILE': links,
+        'WARM_START_MAX_AGE': '0',
+        'METRICS_JSONL': '',
+        'AZURE_ENDPOINT': endpoint,
+        'AZURE_API_KEY': 'mock-key'
+    })
+    if args.model:
+        os.environ['SENTENCE_MODEL'] = args.model
+
+
+def replay(chatbot, queries, users: int, stream: bool) -> float:
+    def one_query(query):
+        with METRICS.timer('query'):
+            sentences = chatbot.get_similar_sentences(query)
+            if stream:
+                response = chatbot.generate_response_stream(query, sentences)
+                for _ in response:
+                    pass
+                ok = response.error is None and bool(response.parts)
+            else:
+                ok = chatbot.generate_response(query, sentences) is not None
+        if not ok:
+            METRICS.inc('failed_queries')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(one_query, queries))
+    return time.perf_counter() - start
+
+
+def report(snapshot: dict, queries: int, elapsed: float):
+    print(f"{queries} queries in {elapsed:.2f}s, {queries / elapsed:.1f} queries/s")
+    print(f"{'stage':<32} | {'count':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    for stage, values in snapshot['stages'].items():
+        print(f"{stage:<32} | {values['count']:>6} | {values['p50_ms']:>8.1f} | {values['p95_ms']:>8.1f} | "
+              f"{values['p99_ms']:>8.1f}")
+    for name, value in snapshot['counters'].items():
+        print(f"{name}: {value:g}")
+
+
+def regressions(snapshot: dict, baseline: dict, tolerance: float, min_delta_ms: float):
+    # Stages whose p95 grew by more than tolerance (and by more than min_delta_ms, below that it is noise)
+    found = []
+    for stage, values in snapshot['stages'].items():
+        before = baseline['stages'].get(stage)
+        if before is None:
+            continue
+        delta = values['p95_ms'] - before['p95_ms']
+        if delta > min_delta_ms and values['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{stage}: p95 {before['p95_ms']:.1f} -> {values['p95_ms']:.1f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query set through Chatbot on the local vector store and "
+                                                 "a mock OpenAI server, and report per-stage latency")
+    parser.add_argument('--queries', help="File with one query per line (default: questions about data/data.csv)")
+    parser.add_argument('--repeat', type=int, default=3, help="Times the query set is replayed")
+    parser.add_argument('--users', type=int, default=4, help="Concurrent callers; above 1 retrieval is micro-batched")
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock latency per completion in seconds")
+    parser.add_argument('--tool-calls', type=int, default=1, help="Tool calls the mock asks for before answering")
+    parser.add_argument('--stream', action='store_true', help="Stream the answers")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="Mock seconds between streamed words")
+    parser.add_argument('--answer-words', type=int, default=50)
+    parser.add_argument('--model', help="Sentence model name or local path (default: SENTENCE_MODEL)")
+    parser.add_argument('--links', nargs='*', default=[], help="Pages to ingest besides the calendar CSV")
+    parser.add_argument('--response-cache', action='store_true', help="Keep the response cache on")
+    parser.add_argument('--jsonl', help="Append the metrics snapshot to this JSONL file")
+    parser.add_argument('--save', help="Write the results to this JSON file, for use as a later --baseline")
+    parser.add_argument('--baseline', help="Results of an earlier run; exit with 1 if a stage's p95 regressed")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative p95 growth per stage")
+    parser.add_argument('--min-delta-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries) if args.queries else default_queries("data/data.csv")
+    mock = MockChatServer(args.latency, args.tool_calls, token_latency=args.token_latency,
+                          answer_words=args.answer_words).start()
+    cache_dir = tempfile.mkdtemp(prefix="query-path-")
+    isolate(cache_dir, mock.endpoint, args)
+    from chatbot import Chatbot
+
+    chatbot = Chatbot(batch_queries=args.users > 1)
+    try:
+        chatbot.openai_handler.prompt_builder.log = False
+        if not args.response_cache:
+            chatbot.openai_handler.response_cache = None
+
+        # Warm-up pass, then only the replay is measured
+        replay(chatbot, queries[:args.users], args.users, args.stream)
+        METRICS.reset()
+        print(f"Mock latency {args.latency * 1000:.0f} ms, {args.tool_calls} tool calls, {args.users} users, "
+              f"{chatbot.passages} passages")
+        elapsed = replay(chatbot, queries * args.repeat, args.users, args.stream)
+        snapshot = METRICS.snapshot()
+        report(snapshot, len(queries) * args.repeat, elapsed)
+    finally:
+        chatbot.close()
+        if chatbot.retrieval is not None:
+            chatbot.retrieval.close()
+        chatbot.openai_handler.close()
+        mock.stop()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results = {'queries_per_s': len(queries) * args.repeat / elapsed, **snapshot}
+    if args.jsonl:
+        METRICS.write_jsonl(args.jsonl)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            found = regressions(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if found:
+            raise SystemExit("Latency regressions:\n  " + "\n  ".join(found))
+        print(f"No stage regressed by more than {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from rag import BatchRAGEvaluator, RAGEvaluator
+
+
+def legacy_groundedness(response: str, context: str) -> float:
+    # The previous RAGEvaluator.evaluate_groundedness: word sets rebuilt for every sentence pair
+    response_sentences = [s.strip() for s in response.split('.') if s.strip()]
+    context_lower = [s.strip().lower() for s in context.split('.') if s.strip()]
+    grounded_count = 0
+    for sentence in response_sentences:
+        for context_sent in context_lower:
+            common_words = set(sentence.lower().split()) & set(context_sent.split())
+            if len(common_words) / len(set(sentence.lower().split())) > 0.5:
+                grounded_count += 1
+                break
+    return grounded_count / len(response_sentences) * 10
+
+
+def make_rows(count: int, context_sentences: int, response_sentences: int, rng):
+    # Answers that partly reuse context sentences, like real RAG output
+    words = np.array([f"w{i}" for i in range(20000)])
+
+    def sentence():
+        return ' '.join(words[np.minimum(rng.zipf(1.3, rng.integers(5, 25)), len(words) - 1)])
+
+    rows = []
+    for _ in range(count):
+        context = [sentence() for _ in range(context_sentences)]
+        response = [context[rng.integers(len(context))] if rng.random() < 0.6 else sentence()
+                    for _ in range(response_sentences)]
+        rows.append((sentence() + '?', '. '.join(response) + '.', '. '.join(context) + '.'))
+    return pd.DataFrame(rows, columns=['question', 'response', 'context'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-by-row RAGEvaluator vs BatchRAGEvaluator throughput")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--context-sentences', type=int, default=30)
+    parser.add_argument('--response-sentences', type=int, default=6)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    df = make_rows(args.rows, args.context_sentences, args.response_sentences, np.random.default_rng(0))
+    print(f"{args.rows} rows, {args.context_sentences} context and {args.response_sentences} response sentences each")
+
+    start = time.perf_counter()
+    for row in df.itertuples(index=False):
+        legacy_groundedness(row.response, row.context)
+    legacy = time.perf_counter() - start
+
+    evaluator = RAGEvaluator()
+    start = time.perf_counter()
+    reference = [evaluator.evaluate(*row) for row in df[['question', 'response', 'context']].itertuples(index=False)]
+    row_by_row = time.perf_counter() - start
+    expected = np.array([metrics.groundedness for metrics in reference])
+    print(f"{'evaluator':<21} | {'s':>6} | {'rows/s':>8} | {'max diff':>8}")
+    print(f"{'previous groundedness':<21} | {legacy:>6.2f} | {args.rows / legacy:>8.0f} | {'':>8}")
+    print(f"{'row by row':<21} | {row_by_row:>6.2f} | {args.rows / row_by_row:>8.0f} | {0.0:>8.1e}")
+
+    for workers in dict.fromkeys(args.workers):
+        batch = BatchRAGEvaluator(workers=workers, chunk_size=args.chunk_size)
+        start = time.perf_counter()
+        metrics = batch.evaluate_frame(df)
+        elapsed = time.perf_counter() - start
+        diff = float(np.abs(metrics['groundedness'].to_numpy() - expected).max())
+        print(f"{f'batch, {workers} workers':<21} | {elapsed:>6.2f} | {args.rows / elapsed:>8.0f} | {diff:>8.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from milvus_handler import MilvusHandler
+from retrieval_service import RetrievalService
+
+
+class SimulatedEncoder:
+    # Encoder stand-in: a fixed cost per encode call plus a smaller cost per text, like a batched transformer.
+    # A forward pass already uses every core, so calls from different threads run one after another.
+    def __init__(self, dim: int, call_cost: float, item_cost: float):
+        self.dim = dim
+        self.call_cost = call_cost
+        self.item_cost = item_cost
+        self.lock = threading.Lock()
+
+    def encode_queries(self, queries):
+        with self.lock:
+            time.sleep(self.call_cost + self.item_cost * len(queries))
+            return np.random.default_rng(len(queries)).standard_normal((len(queries), self.dim)).astype(np.float32)
+
+
+class SimulatedCollection:
+    # Milvus stand-in: one network round trip per search plus exact inner-product top-k
+    def __init__(self, sentences, vectors, round_trip: float):
+        self.sentences = sentences
+        self.vectors = vectors
+        self.round_trip = round_trip
+
+    def load(self):
+        pass
+
+    def search(self, data, anns_field, param, limit, output_fields):
+        time.sleep(self.round_trip)
+        scores = np.asarray(data, dtype=np.float32) @ self.vectors.T
+        top = np.argsort(-scores, axis=1)[:, :limit]
+        return [[SimpleNamespace(entity={'sentence': self.sentences[i]}) for i in row] for row in top]
+
+
+def run_clients(search, clients: int, requests_per_client: int):
+    def client(c):
+        for i in range(requests_per_client):
+            search(f"client {c} question {i}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-query vs micro-batched retrieval throughput")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 64])
+    parser.add_argument('--requests', type=int, default=20, help="Requests per client")
+    parser.add_argument('--corpus', type=int, default=5000)
+    parser.add_argument('--encode-call-ms', type=float, default=8.0)
+    parser.add_argument('--encode-item-ms', type=float, default=0.5)
+    parser.add_argument('--round-trip-ms', type=float, default=3.0)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batch-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    dim = 384
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((args.corpus, dim)).astype(np.float32)
+    sentences = [f"sentence {i}" for i in range(args.corpus)]
+
+    handler = MilvusHandler("localhost", "19530", SimulatedEncoder(dim, args.encode_call_ms / 1000, args.encode_item_ms / 1000), dim)
+    handler.collection = SimulatedCollection(sentences, vectors, args.round_trip_ms / 1000)
+
+    print(f"{'clients':>7} | {'per-query q/s':>13} | {'batched q/s':>11} | {'mean batch':>10}")
+    for clients in args.clients:
+        service = RetrievalService(handler, args.batch_size, args.batch_wait_ms / 1000)
+        direct = run_clients(handler.search_similar_sentences, clients, args.requests)
+        batched = run_clients(service.search, clients, args.requests)
+        stats = service.stats()
+        service.close()
+        print(f"{clients:>7} | {direct:>13.1f} | {batched:>11.1f} | {stats['mean_batch_size']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
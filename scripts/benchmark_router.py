@@ -0,0 +1,98 @@
+import argparse
+import statistics
+import time
+
+import pandas as pd
+
+from config import Config
+from csv_data_fetcher import CSVDataFetcher
+from embedding_cache import CachedEncoder
+from intent_router import IntentRouter
+from mock_openai_server import MockChatServer
+from model_loader import PreloadedModel
+from openai_handler import OpenAIHandler
+from prompt_builder import PromptBuilder
+
+CONTEXT = ["Python is a high-level, general-purpose programming language.",
+           "Artificial intelligence is the capability of computational systems to perform tasks associated with human intelligence."]
+
+
+def run(handler, mock, queries, embeddings):
+    # Sequential turns: latency per query and completions sent per query
+    requests = mock.requests
+    latencies = []
+    for query, embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        response = handler.generate_response(query, CONTEXT, embedding)
+        latencies.append(time.perf_counter() - start)
+        assert response, f"no answer for {query!r}"
+    return latencies, (mock.requests - requests) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent router accuracy, LLM calls skipped and latency saved on a labeled query set")
+    parser.add_argument('--queries', default="data/intent_queries.csv", help="CSV with query and intent (calendar/knowledge) columns")
+    parser.add_argument('--model', default=Config.SENTENCE_MODEL, help="Sentence model name or local path")
+    parser.add_argument('--threshold', type=float, help="Fixed threshold instead of the calibrated one")
+    parser.add_argument('--margin', type=float, help="Fixed margin instead of the calibrated one")
+    parser.add_argument('--min-precision', type=float, default=Config.ROUTER_MIN_PRECISION)
+    parser.add_argument('--latency', type=float, default=0.2, help="Mock latency per completion in seconds")
+    args = parser.parse_args()
+
+    labeled = pd.read_csv(args.queries)
+    queries = labeled['query'].tolist()
+    model = PreloadedModel(args.model, Config.MODEL_DIR, background=False)
+    encoder = CachedEncoder(model, model.name, Config.CACHE_DIR)
+    calendar = CSVDataFetcher('data/data.csv')
+    router = IntentRouter(encoder, calendar.df)
+    router.prepare()
+    # Computed by retrieval in the chatbot, the router reuses them
+    embeddings = encoder.encode_queries(queries)
+
+    # Skip rate / precision of every setting, then the one the chatbot would pick at startup
+    sweep = pd.DataFrame(router.sweep(queries, labeled['intent'].tolist(), embeddings))
+    sweep['cell'] = [f"{skip:4.0%} {precision:.2f}" for skip, precision in zip(sweep['skip_rate'], sweep['precision'])]
+    print("Skip rate and precision by threshold (rows) and margin (columns)")
+    print(sweep.pivot(index='threshold', columns='margin', values='cell').to_string())
+    router.calibrate(queries, labeled['intent'].tolist(), args.min_precision, embeddings)
+    if args.threshold is not None:
+        router.threshold = args.threshold
+    if args.margin is not None:
+        router.margin = args.margin
+
+    start = time.perf_counter()
+    routes = [router.route(query, embedding) for query, embedding in zip(queries, embeddings)]
+    routing_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    labeled['route'] = [route.intent or 'llm' for route in routes]
+    routed = labeled[labeled['route'] != 'llm']
+
+    print(f"{len(labeled)} labeled queries, threshold {router.threshold}, margin {router.margin}, "
+          f"{routing_ms:.2f} ms routing per query")
+    print(pd.crosstab(labeled['intent'], labeled['route']).to_string())
+    print(f"Routed without the tool-choice call: {len(routed)}/{len(labeled)} ({len(routed) / len(labeled):.0%}), "
+          f"correct {int((routed['route'] == routed['intent']).sum())}/{len(routed)}")
+    wrong = routed[routed['route'] != routed['intent']]
+    for row in wrong.itertuples(index=False):
+        print(f"  misrouted: {row.query!r} ({row.intent} -> {row.route})")
+
+    mock = MockChatServer(args.latency, tool_calls=1).start()
+    try:
+        results = {}
+        for name, handler_router in (("llm choice", None), ("router", router)):
+            handler = OpenAIHandler(mock.endpoint, "mock-key", "2024-02-15-preview", "data/data.csv",
+                                    prompt_builder=PromptBuilder("gpt-4o-mini"),
+                                    csv_data_fetcher=calendar, router=handler_router)
+            results[name] = run(handler, mock, queries, embeddings)
+    finally:
+        mock.stop()
+
+    print(f"Mock latency {args.latency * 1000:.0f} ms per completion")
+    for name, (latencies, completions) in results.items():
+        print(f"{name:<10} | mean {statistics.mean(latencies) * 1000:7.0f} ms | p50 {statistics.median(latencies) * 1000:7.0f} ms | "
+              f"{completions:.2f} completions/query")
+    saved = statistics.mean(results["llm choice"][0]) - statistics.mean(results["router"][0])
+    print(f"Latency saved: {saved * 1000:.0f} ms per query on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from config import Config
+from model_loader import BACKENDS, PreloadedModel
+from sharded_encoder import ShardedEncoder
+
+
+def make_sentences(count: int, rng):
+    # Lengths from a few words to a long paragraph, like passages mixed with calendar rows
+    words = [f"word{i}" for i in range(5000)]
+    lengths = np.clip(rng.lognormal(3.0, 0.8, count).astype(int), 3, 250)
+    return [' '.join(rng.choice(words, length)) for length in lengths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-process vs sharded multi-process embedding throughput")
+    parser.add_argument('--model', default=Config.SENTENCE_MODEL, help="Model name or local path")
+    parser.add_argument('--backend', default=Config.ENCODER_BACKEND, choices=BACKENDS)
+    parser.add_argument('--sentences', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--shard-size', type=int, default=Config.EMBED_SHARD_SIZE)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sentences = make_sentences(args.sentences, rng)
+    model = PreloadedModel(args.model, Config.MODEL_DIR, background=False, backend=args.backend,
+                           threads=os.cpu_count() or 1)
+
+    start = time.perf_counter()
+    reference = np.asarray(model.encode(sentences, batch_size=args.batch_size), dtype=np.float32)
+    single = time.perf_counter() - start
+    print(f"{len(sentences)} sentences on {os.cpu_count()} cores, {args.backend} backend")
+    print(f"{'workers':>7} | {'s':>7} | {'sent/s':>7} | {'speedup':>7} | {'max abs diff':>12}")
+    print(f"{1:>7} | {single:>7.2f} | {len(sentences) / single:>7.0f} | {1.0:>7.2f} | {0.0:>12.2e}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in args.workers:
+            encoder = ShardedEncoder(model, workers, shard_size=args.shard_size)
+            # Pool start and model loads are paid once per ingestion, timed separately
+            start = time.perf_counter()
+            encoder.encode(sentences[:workers], batch_size=args.batch_size)
+            warmup = time.perf_counter() - start
+
+            start = time.perf_counter()
+            output = encoder.encode_to(sentences, os.path.join(directory, f"{workers}.f32"), args.batch_size)
+            elapsed = time.perf_counter() - start
+            encoder.close()
+            # Same vectors in the same order as the single process
+            diff = float(np.abs(np.asarray(output) - reference).max())
+            print(f"{workers:>7} | {elapsed:>7.2f} | {len(sentences) / elapsed:>7.0f} | {single / elapsed:>7.2f} | "
+                  f"{diff:>12.2e}   (pool start {warmup:.1f}s)")
+            del output
+
+
+if __name__ == "__main__":
+    main()
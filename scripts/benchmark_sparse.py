@@ -0,0 +1,75 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from hybrid_search import reciprocal_rank_fusion
+from sparse_index import SparseIndex
+
+
+def make_sentences(count: int, vocab: int, length: int, rng):
+    # Zipf-distributed words like natural text, plus a date and a name per sentence
+    words = np.array([f"w{i}" for i in range(vocab)])
+    ranks = np.minimum(rng.zipf(1.2, (count, length)) - 1, vocab - 1)
+    days = rng.integers(1, 29, count)
+    names = rng.integers(0, 5000, count)
+    return [f"{' '.join(words[row])} 2024-01-{day:02d} person{name}"
+            for row, day, name in zip(ranks, days, names)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 sparse index build time, size and query latency")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--length', type=int, default=20, help="Words per sentence")
+    parser.add_argument('--vocab', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'docs':>8} | {'postings':>10} | {'build s':>7} | {'update s':>8} | {'load ms':>7} | "
+          f"{'MB/1M postings':>14} | {'p50 ms':>6} | {'p99 ms':>6} | {'rrf ms':>6}")
+    for size in args.sizes:
+        sentences = make_sentences(size, args.vocab, args.length, rng)
+        with tempfile.TemporaryDirectory() as directory:
+            index = SparseIndex(directory)
+            start = time.perf_counter()
+            index.add(sentences)
+            index.flush()
+            build = time.perf_counter() - start
+
+            # 1% churn, as in a re-ingestion where a few pages changed
+            churn = max(1, size // 100)
+            start = time.perf_counter()
+            index.delete(index.doc_ids[:churn].tolist())
+            index.add(make_sentences(churn, args.vocab, args.length, rng))
+            index.flush()
+            update = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = SparseIndex(directory)
+            load = (time.perf_counter() - start) * 1000
+
+            postings = len(index.rows)
+            size_bytes = sum(np.asarray(getattr(index, name)).nbytes for name in ('rows', 'tfs', 'weights', 'offsets'))
+            per_million = size_bytes / max(postings, 1) * 1e6 / 2 ** 20
+
+            # Queries mix a frequent word, a rarer word, a date and a name
+            queries = [f"w{rng.integers(0, 20)} w{rng.integers(100, 5000)} 2024-01-{rng.integers(1, 29):02d} person{rng.integers(0, 5000)}"
+                       for _ in range(args.queries)]
+            latencies, fusion = [], []
+            dense = [f"dense {i}" for i in range(20)]
+            for query in queries:
+                start = time.perf_counter()
+                hits = index.search(query, 20)
+                latencies.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                reciprocal_rank_fusion([dense, hits], top_k=5)
+                fusion.append((time.perf_counter() - start) * 1000)
+
+        print(f"{size:>8} | {postings:>10} | {build:>7.2f} | {update:>8.2f} | {load:>7.1f} | {per_million:>14.1f} | "
+              f"{np.percentile(latencies, 50):>6.3f} | {np.percentile(latencies, 99):>6.3f} | {np.percentile(fusion, 50):>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
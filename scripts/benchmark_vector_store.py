@@ -0,0 +1,94 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from local_vector_store import LocalVectorStore
+
+
+def make_corpus(size: int, dim: int, clusters: int, rng) -> np.ndarray:
+    # Clustered like real sentence embeddings, so IVF has structure to exploit
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size)] + 0.6 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ground_truth(corpus: np.ndarray, queries: np.ndarray, top_k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis=1)[:, :top_k]
+
+
+def measure(search, queries: np.ndarray, truth: np.ndarray, top_k: int):
+    latencies = []
+    recall = 0.0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query, top_k)
+        latencies.append(time.perf_counter() - start)
+        recall += len(set(found) & set(expected.tolist())) / top_k
+    latencies = np.array(latencies) * 1000
+    return recall / len(queries), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def local_backend(corpus: np.ndarray, index_type: str, nprobe: int, directory: str):
+    store = LocalVectorStore(None, directory, collection_name=f"bench_{index_type}", dim=corpus.shape[1],
+                             index_type=index_type, nprobe=nprobe)
+    store.create_collection()
+    store.insert_embeddings([f"s{i}" for i in range(len(corpus))], corpus, flush=False)
+    if index_type == 'IVF':
+        store._build_ivf()
+    # No deletes, so row numbers are corpus positions
+    return lambda query, top_k: store.search_rows(query, top_k)[0].tolist()
+
+
+def milvus_backend(corpus: np.ndarray, host: str, port: str):
+    from milvus_handler import MilvusHandler
+
+    handler = MilvusHandler(host, port, None, corpus.shape[1], collection_name='bench_vectors')
+    handler.connect()
+    if not handler.create_collection():
+        handler.collection.drop()
+        handler.create_collection()
+    for start in range(0, len(corpus), 10000):
+        handler.insert_embeddings([f"s{i}" for i in range(start, min(start + 10000, len(corpus)))],
+                                  corpus[start:start + 10000], flush=False)
+    handler.flush()
+    handler.ensure_index()
+    return lambda query, top_k: [int(s[1:]) for s in handler.search_embeddings(query[None, :], top_k)[0]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and recall@k of the vector store backends")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--milvus', help="host:port of a Milvus to include (creates a bench_vectors collection)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>8} | {'backend':<14} | {'recall@' + str(args.top_k):>9} | {'p50 ms':>7} | {'p99 ms':>7}")
+    for size in args.sizes:
+        corpus = make_corpus(size, args.dim, max(10, size // 500), rng)
+        # Queries are perturbed corpus rows
+        queries = corpus[rng.integers(0, size, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        truth = ground_truth(corpus, queries, args.top_k)
+
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [('local FLAT', local_backend(corpus, 'FLAT', 0, directory))]
+            for nprobe in args.nprobe:
+                backends.append((f"local IVF/{nprobe}", local_backend(corpus, 'IVF', nprobe, directory)))
+            if args.milvus:
+                host, port = args.milvus.split(':')
+                backends.append(('milvus', milvus_backend(corpus, host, port)))
+
+            for name, search in backends:
+                recall, p50, p99 = measure(search, queries, truth, args.top_k)
+                print(f"{size:>8} | {name:<14} | {recall:>9.3f} | {p50:>7.2f} | {p99:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from visualizer import ArraySource, Visualizer
+
+
+def write_synthetic(path: str, rows: int, dim: int, clusters: int = 40, seed: int = 0, chunk: int = 100000):
+    # Clustered unit vectors as raw float32 rows, the embedding cache format, written in chunks
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.memmap(path, dtype=np.float32, mode='w+', shape=(rows, dim))
+    for start in range(0, rows, chunk):
+        end = min(start + chunk, rows)
+        block = centers[rng.integers(0, clusters, end - start)] + 0.6 * rng.standard_normal((end - start, dim))
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    vectors.flush()
+    del vectors
+
+
+def synthetic_kinds(rows: int, calendar_share: float, seed: int = 0):
+    # Most passages come from web pages, a small share from the calendar CSV
+    rng = np.random.default_rng(seed)
+    return np.where(rng.random(rows) < calendar_share, 'calendar', 'web')
+
+
+def measure(run):
+    # Wall time, peak Python heap (numpy included) and process peak RSS so far; the in-memory baseline runs last
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory of the streaming embedding visualizer against an "
+                                                 "in-memory PCA on synthetic collections")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--methods', nargs='+', default=['randomized', 'incremental'])
+    parser.add_argument('--sample-size', type=int, default=50000)
+    parser.add_argument('--kind', choices=['hexbin', 'hist2d'], default='hexbin')
+    parser.add_argument('--calendar-share', type=float, default=0.02)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help="Largest size the in-memory PCA baseline is run on")
+    parser.add_argument('--output-dir', help="Keep the rendered images here (default: discarded)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="visualizer-")
+    output_dir = args.output_dir or workdir
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        print(f"{'vectors':>9} | {'method':<12} | {'fit s':>7} | {'project s':>9} | {'render s':>8} | "
+              f"{'total s':>7} | {'peak heap MB':>12} | {'max RSS MB':>10}")
+        for rows in args.sizes:
+            path = os.path.join(workdir, f"{rows}.f32")
+            write_synthetic(path, rows, args.dim)
+            source = ArraySource.from_file(path, args.dim)
+            source.kinds = synthetic_kinds(rows, args.calendar_share)
+
+            for method in args.methods:
+                output = os.path.join(output_dir, f"embeddings_{rows}_{method}.png")
+                summary, elapsed, peak, rss = measure(lambda: Visualizer.visualize_collection(
+                    source, output, method, args.sample_size, color_by_source=True, kind=args.kind))
+                print(f"{rows:>9} | {method:<12} | {summary['fit s']:>7.2f} | {summary['project s']:>9.2f} | "
+                      f"{summary['render s']:>8.2f} | {elapsed:>7.2f} | {peak:>12.0f} | {rss:>10.0f}")
+            if rows <= args.legacy_max:
+                def legacy():
+                    # What visualize_embeddings_pca does: the whole matrix in memory, full PCA
+                    from sklearn.decomposition import PCA
+                    return PCA(n_components=2).fit_transform(np.array(source.vectors))
+                _, elapsed, peak, rss = measure(legacy)
+                print(f"{rows:>9} | {'in-memory':<12} | {elapsed:>7.2f} | {'':>9} | {'':>8} | {elapsed:>7.2f} | "
+                      f"{peak:>12.0f} | {rss:>10.0f}")
+
+            del source
+            os.remove(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.output_dir:
+        print(f"Images written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import json
+import re
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class CalendarIndex:
+    '''
+    Read-only index over the calendar DataFrame, built once at load time.
+
+    Start and end timestamps are kept as sorted datetime64 arrays for range
+    lookups, exact fields (dates, times, flags) and lowercased tokens of the
+    text fields map to sorted row-id postings. A query intersects the postings
+    of its filters instead of scanning columns.
+    '''
+
+    # Tool argument -> column searched by token (every query token must prefix-match a token of the cell)
+    TEXT_FIELDS = {
+        'subject': 'Subject',
+        'meeting_organizer': 'Meeting Organizer',
+        'required_attendees': 'Required Attendees',
+        'optional_attendees': 'Optional Attendees',
+        'meeting_resources': 'Meeting Resources',
+        'categories': 'Categories',
+        'description': 'Description',
+        'location': 'Location',
+        'priority': 'Priority',
+        'mileage': 'Mileage'
+    }
+
+    # Tool argument -> column matched exactly
+    EXACT_FIELDS = {
+        'start_date': 'Start Date',
+        'end_date': 'End Date',
+        'start_time': 'Start Time',
+        'end_time': 'End Time',
+        'all_day_event': 'All day event',
+        'reminder': 'Reminder on/off'
+    }
+
+    def __init__(self, df: pd.DataFrame, max_results: int = 20):
+        self.df = df.reset_index(drop=True)
+        self.max_results = max_results
+        self.size = len(self.df)
+
+        # Compact JSON-ready rows, missing cells left out
+        self.records = [
+            {key: value for key, value in record.items() if not pd.isna(value)}
+            for record in self.df.to_dict('records')
+        ]
+
+        self.start_order, self.start_sorted = self._sorted_timestamps('Start Date', 'Start Time')
+        self.end_order, self.end_sorted = self._sorted_timestamps('End Date', 'End Time')
+
+        self.exact = {param: self._exact_postings(column) for param, column in self.EXACT_FIELDS.items() if column in self.df}
+        self.text = {param: self._token_postings(column) for param, column in self.TEXT_FIELDS.items() if column in self.df}
+
+    def _sorted_timestamps(self, date_column: str, time_column: str):
+        stamps = pd.to_datetime(self.df[date_column].astype(str) + ' ' + self.df[time_column].astype(str),
+                                format='%Y-%m-%d %H:%M', errors='coerce')
+        values = stamps.to_numpy(dtype='datetime64[m]')
+        valid = np.flatnonzero(~np.isnat(values))
+        order = valid[np.argsort(values[valid], kind='stable')].astype(np.int32)
+        return order, values[order]
+
+    def _exact_postings(self, column: str) -> Dict[str, np.ndarray]:
+        rows = {}
+        for row, value in enumerate(self.df[column].tolist()):
+            if not pd.isna(value):
+                rows.setdefault(self._normalize(value), []).append(row)
+        return {value: np.array(ids, dtype=np.int32) for value, ids in rows.items()}
+
+    def _token_postings(self, column: str):
+        rows = {}
+        for row, value in enumerate(self.df[column].tolist()):
+            if pd.isna(value):
+                continue
+            for token in set(tokenize(value)):
+                rows.setdefault(token, []).append(row)
+        postings = {token: np.array(ids, dtype=np.int32) for token, ids in rows.items()}
+        return sorted(postings), postings
+
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        if isinstance(value, bool):
+            return 'yes' if value else 'no'
+        value = str(value).strip().lower()
+        # 9:00 and 09:00 are the same time
+        if re.fullmatch(r'\d:\d\d', value):
+            value = '0' + value
+        return value
+
+    def _token_rows(self, param: str, text: str) -> np.ndarray:
+        vocabulary, postings = self.text[param]
+        result = None
+        for token in tokenize(text):
+            # Prefix match keeps the old substring behaviour for partial names like "conf"
+            start = bisect_left(vocabulary, token)
+            end = start
+            while end < len(vocabulary) and vocabulary[end].startswith(token):
+                end += 1
+            matches = [postings[term] for term in vocabulary[start:end]]
+            rows = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int32)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if not result.size:
+                break
+        return result if result is not None else np.arange(self.size, dtype=np.int32)
+
+    def _range_rows(self, order: np.ndarray, stamps: np.ndarray, date_from: Optional[str], date_to: Optional[str]) -> np.ndarray:
+        low = np.searchsorted(stamps, np.datetime64(f"{date_from}T00:00"), 'left') if date_from else 0
+        high = np.searchsorted(stamps, np.datetime64(f"{date_to}T23:59"), 'right') if date_to else len(stamps)
+        return np.sort(order[low:high])
+
+    def search(self, query: Dict[str, Any]) -> np.ndarray:
+        '''
+        Row ids matching every filter in query (tool call arguments), in calendar order.
+        Raises ValueError for malformed dates.
+        '''
+        candidates = []
+
+        if query.get('date_from') or query.get('date_to'):
+            candidates.append(self._range_rows(self.start_order, self.start_sorted, query.get('date_from'), query.get('date_to')))
+
+        for param, postings in self.exact.items():
+            if query.get(param) is not None and query.get(param) != '':
+                candidates.append(postings.get(self._normalize(query[param]), np.empty(0, dtype=np.int32)))
+
+        for param in self.text:
+            value = query.get(param)
+            if value is None or value == '' or value == []:
+                continue
+            # Array arguments (attendee lists) must all match
+            for item in value if isinstance(value, list) else [value]:
+                candidates.append(self._token_rows(param, str(item)))
+
+        if not candidates:
+            return np.arange(self.size, dtype=np.int32)
+
+        # Intersect smallest postings first so the work shrinks fastest
+        candidates.sort(key=len)
+        result = candidates[0]
+        for rows in candidates[1:]:
+            if not result.size:
+                break
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def to_json(self, rows: np.ndarray) -> str:
+        events = [self.records[row] for row in rows[:self.max_results]]
+        return json.dumps({'total': int(len(rows)), 'returned': len(events), 'events': events},
+                          separators=(',', ':'), default=str)
@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+import requests
+
+from response_stream import ResponseStream
+
+
+class RemoteChatbot:
+    '''
+    Talks to a running server.py and exposes the same methods as Chatbot,
+    so ChatUI can be used as a thin client without loading any model.
+    '''
+
+    def __init__(self, base_url: str, timeout: float = 120):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_similar_sentences(self, query: str) -> List[str]:
+        return self._post('/retrieve', {'query': query})['sentences']
+
+    def generate_response(self, query: str, similar_sentences: List[str]) -> Optional[str]:
+        return self._post('/query', {'query': query, 'context': similar_sentences})['response']
+
+    def generate_response_stream(self, query: str, similar_sentences: List[str]) -> ResponseStream:
+        def tokens():
+            with self.session.post(f"{self.base_url}/stream", json={'query': query, 'context': similar_sentences},
+                                   timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                response.encoding = 'utf-8'
+                # Byte-sized reads: a larger chunk_size waits until that much of the answer arrived
+                yield from response.iter_content(chunk_size=1, decode_unicode=True)
+
+        return ResponseStream(tokens())
@@ -1,51 +1,181 @@
-import re
+import os
+import time
+
+STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 
 # load environment variables from .env file
 load_dotenv()
 
 from config import Config
-import pandas as pd
-from data_fetcher import DataFetcher
-from csv_data_fetcher import CSVDataFetcher
-from milvus_handler import MilvusHandler
-from openai_handler import OpenAIHandler
-from sentence_transformers import SentenceTransformer
+from vector_store import create_vector_store
+from ingestion import IngestionManifest, Ingestor
+from chunking import Chunker, NearDuplicateIndex
+from embedding_cache import CachedEncoder
+from index_tuner import load_index_config
+from retrieval_service import RetrievalService
+from sparse_index import SparseIndex
+from hybrid_search import HybridSearcher
+from response_cache import ResponseCache
+from model_loader import PreloadedModel
+from startup_profile import StartupProfile
+from metrics import METRICS, JsonlExporter
 
-import tkinter as tk
-from tkinter import scrolledtext
+import argparse
+import threading
 
-# Load environment variables
-load_dotenv()
+try:
+    import tkinter as tk
+    from tkinter import scrolledtext
+except ImportError:  # Headless installs only run the HTTP server
+    tk = None
+
+# torch, pandas, openai and bs4 are imported inside Chatbot, the thin client never loads them
+IMPORT_TIME = time.perf_counter() - STARTED
 
 class Chatbot:
-    def __init__(self):
-        # Initialize components
-        self.embedder = SentenceTransformer(Config.SENTENCE_MODEL)
-        self.data_fetcher = DataFetcher()
-        self.csv_data_fetcher = CSVDataFetcher('data/data.csv')  # Load CSV
-        self.milvus_handler = MilvusHandler(Config.MILVUS_HOST, Config.MILVUS_PORT, self.embedder)
-        self.openai_handler = OpenAIHandler(Config.AZURE_ENDPOINT, Config.AZURE_API_KEY, Config.VERSION, "data/data.csv")
+    def __init__(self, batch_queries: bool = False, profile: bool = Config.PROFILE_STARTUP):
+        self.startup = StartupProfile()
+        self.startup.add("imports", IMPORT_TIME)
+
+        # The model loads on a background thread while the CSV, stores and client are set up
+        with self.startup.phase("model (start)"):
+            self.embedder = PreloadedModel(Config.SENTENCE_MODEL, Config.MODEL_DIR, background=Config.PRELOAD_MODEL,
+                                           backend=Config.ENCODER_BACKEND, threads=Config.ENCODER_THREADS)
+            # All embedding goes through the on-disk cache so identical text is encoded once
+            self.encoder = CachedEncoder(self.embedder, self.embedder.name, Config.CACHE_DIR, Config.QUERY_CACHE_SIZE)
+
+        with self.startup.phase("calendar csv"):
+            from csv_data_fetcher import CSVDataFetcher
+            # Loaded once, the meeting tool searches the same frame
+            self.csv_data_fetcher = CSVDataFetcher('data/data.csv')
+
+        with self.startup.phase("stores"):
+            # Milvus, or the in-process store for tests and small deployments
+            self.vector_store = create_vector_store(Config.VECTOR_BACKEND, self.encoder, host=Config.MILVUS_HOST, port=Config.MILVUS_PORT,
+                                                    index_config=load_index_config(Config.MILVUS_INDEX_CONFIG),
+                                                    alias=Config.MILVUS_ALIAS, pool_size=Config.MILVUS_POOL_SIZE,
+                                                    directory=Config.LOCAL_VECTOR_DIR, index_type=Config.LOCAL_INDEX_TYPE)
+            # BM25 over the same sentences catches exact names, dates and rooms the embedding misses
+            self.sparse_index = SparseIndex(Config.SPARSE_INDEX_DIR) if Config.HYBRID_SEARCH else None
+            self.searcher = (HybridSearcher(self.vector_store, self.sparse_index, Config.HYBRID_CANDIDATES, Config.RRF_K)
+                             if self.sparse_index is not None else self.vector_store)
+            # With many concurrent callers, queries arriving together are encoded and searched in one batch
+            self.retrieval = (RetrievalService(self.searcher, Config.QUERY_BATCH_SIZE, Config.QUERY_BATCH_WAIT)
+                              if batch_queries else None)
+
+        with self.startup.phase("openai client"):
+            from openai_handler import AsyncOpenAIHandler
+            from prompt_builder import PromptBuilder
+            from intent_router import IntentRouter, load_labeled_queries
+            self.router = (IntentRouter(self.encoder, self.csv_data_fetcher.df, threshold=Config.ROUTER_THRESHOLD,
+                                        margin=Config.ROUTER_MARGIN)
+                           if Config.INTENT_ROUTER else None)
+            self.response_cache = ResponseCache(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_TTL, Config.RESPONSE_CACHE_THRESHOLD)
+            # Async client underneath, tool calls of one turn run concurrently
+            self.openai_handler = AsyncOpenAIHandler(Config.AZURE_ENDPOINT, Config.AZURE_API_KEY, Config.VERSION, "data/data.csv",
+                                                     model=Config.CHAT_MODEL, response_cache=self.response_cache,
+                                                     prompt_builder=PromptBuilder(Config.CHAT_MODEL, Config.PROMPT_CONTEXT_TOKENS,
+                                                                                  Config.TOOL_OUTPUT_TOKENS),
+                                                     csv_data_fetcher=self.csv_data_fetcher,
+                                                     max_concurrency=Config.OPENAI_MAX_CONCURRENCY,
+                                                     request_timeout=Config.OPENAI_TIMEOUT, router=self.router)
+
+        self.manifest = IngestionManifest(Config.INGEST_MANIFEST, self.embedder.name)
+
+        # Set up the vector store, a freshly created collection has nothing from the manifest in it.
+        # Without a usable manifest the stored rows can never be deleted, so start from an empty one.
+        with self.startup.phase("vector store"):
+            self.vector_store.connect()
+            fresh = self.vector_store.create_collection(drop=not self.manifest.loaded)
+            if fresh:
+                self.manifest.reset()
+
+        # Warm start: a recent enough ingestion is served as is, nothing is fetched
+        age = self.manifest.age()
+        if not fresh and self.manifest.sources and age is not None and age < Config.WARM_START_MAX_AGE:
+            with self.startup.phase("warm start"):
+                self.passages = len(self.manifest.live_hashes())
+            print(f"Warm start: serving the ingestion from {age / 60:.0f} min ago ({self.passages} passages)")
+        else:
+            with self.startup.phase("ingest"):
+                self._ingest()
+
+        with self.startup.phase("index"):
+            self.vector_store.ensure_index()
+
+        # Ready to serve means queries can be embedded
+        with self.startup.phase("model (wait)"):
+            self.embedder.wait()
 
-        # Fetch and process URLs and CSV data
-        self.sentences = self.data_fetcher.fetch_and_process_urls()
-        self.csv_sentences = self.csv_data_fetcher.fetch_and_process_csv()
+        if self.router is not None:
+            with self.startup.phase("intent router"):
+                self.router.prepare()
+                if Config.ROUTER_CALIBRATE and os.path.exists(Config.ROUTER_QUERIES):
+                    self.router.calibrate(*load_labeled_queries(Config.ROUTER_QUERIES), Config.ROUTER_MIN_PRECISION)
 
-        # Combine web and CSV sentences
-        self.sentences.extend(self.csv_sentences)
+        if profile:
+            self.startup.report()
 
-        self.embeddings = self.embedder.encode(self.sentences)
+        # Stage latencies and counters of every query, see scripts/metrics.py
+        self.metrics_exporter = (JsonlExporter(METRICS, Config.METRICS_JSONL, Config.METRICS_INTERVAL)
+                                 if Config.METRICS_JSONL else None)
 
-        # Set up Milvus
-        self.milvus_handler.connect()
-        self.milvus_handler.create_collection()
-        self.milvus_handler.insert_embeddings(self.sentences, self.embeddings)
+    def _ingest(self):
+        from data_fetcher import DataFetcher
+        data_fetcher = DataFetcher(Config.LINKS_FILE, max_workers=Config.FETCH_WORKERS, per_host_limit=Config.FETCH_PER_HOST,
+                                   parse_workers=Config.PARSE_WORKERS)
+
+        # Pages become token-sized overlapping passages, boilerplate repeated across pages is stored once
+        chunker = dedup = None
+        if Config.CHUNKING:
+            chunker = Chunker(Config.CHUNK_TOKENS, Config.CHUNK_OVERLAP,
+                              count_tokens=lambda text: len(self.embedder.tokenizer.tokenize(text)))
+            dedup = NearDuplicateIndex(Config.DEDUP_DIR, threshold=Config.DEDUP_THRESHOLD)
+
+        # Large ingests are embedded on a process pool, with batches big enough to keep every worker busy
+        batch_size = Config.INGEST_BATCH_SIZE
+        sharded = None
+        if Config.EMBED_WORKERS > 1:
+            from sharded_encoder import ShardedEncoder
+            sharded = ShardedEncoder(self.embedder, Config.EMBED_WORKERS, Config.ENCODER_THREADS, Config.EMBED_SHARD_SIZE,
+                                     tmp_dir=os.path.join(Config.CACHE_DIR, 'tmp'))
+            self.encoder.bulk_model, self.encoder.bulk_threshold = sharded, Config.EMBED_SHARD_SIZE
+            batch_size = max(batch_size, Config.EMBED_WORKERS * Config.EMBED_SHARD_SIZE)
+
+        # Fetch URLs and CSV data, embed and store only what changed since the last run
+        ingestor = Ingestor(data_fetcher, self.csv_data_fetcher, self.vector_store, self.encoder, self.manifest,
+                            batch_size=batch_size, sparse_index=self.sparse_index,
+                            chunker=chunker, dedup=dedup)
+        try:
+            # Only the count is kept, the passages themselves live in the vector store
+            self.passages = ingestor.run()
+        finally:
+            if sharded is not None:
+                # The workers' models are only needed for ingestion
+                self.encoder.bulk_model = None
+                sharded.close()
 
     def get_similar_sentences(self, query: str):
-        return self.milvus_handler.search_similar_sentences(query)
+        with METRICS.timer('retrieval'):
+            if self.retrieval is not None:
+                return self.retrieval.search(query)
+            return self.searcher.search_similar_sentences(query)
 
     def generate_response(self, query: str, similar_sentences):
-        return self.openai_handler.generate_response(query, similar_sentences)
+        with METRICS.timer('generation'):
+            # The query embedding is still in the encoder's LRU from retrieval
+            query_embedding = self.encoder.encode_query(query)
+            return self.openai_handler.generate_response(query, similar_sentences, query_embedding)
+
+    def generate_response_stream(self, query: str, similar_sentences):
+        query_embedding = self.encoder.encode_query(query)
+        return self.openai_handler.generate_response_stream(query, similar_sentences, query_embedding)
+
+    def close(self):
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
 
 class ChatUI:
     def __init__(self, root, chatbot):
@@ -78,16 +208,34 @@ class ChatUI:
             return
 
         self.display_message(query, "User")
+        self.user_input.delete(0, tk.END)
+        self.submit_button.config(state=tk.DISABLED)
 
-        similar_sentences = self.chatbot.get_similar_sentences(query)
-
-        self.display_similar_sentences(similar_sentences)
+        # Retrieval and the LLM calls run off the Tk thread so the window stays responsive
+        threading.Thread(target=self._answer, args=(query,), daemon=True).start()
 
-        response = self.chatbot.generate_response(query, similar_sentences)
+    def _answer(self, query):
+        self.root.after(0, self.append_text, "Bot: ", "bot")
+        try:
+            similar_sentences = self.chatbot.get_similar_sentences(query)
+            self.root.after(0, self.display_similar_sentences, similar_sentences)
 
-        self.display_message(response, "Bot")
+            # Tokens are shown as they arrive; widgets are only touched on the Tk thread
+            stream = self.chatbot.generate_response_stream(query, similar_sentences)
+            for token in stream:
+                self.root.after(0, self.append_text, token, "bot")
+            if stream.error is not None or not stream.parts:
+                self.root.after(0, self.append_text, f"Error: {stream.error}" if stream.error else "None", "bot")
+        except Exception as e:
+            self.root.after(0, self.append_text, f"Error: {e}", "bot")
+        self.root.after(0, self.append_text, "\n", "bot")
+        self.root.after(0, self.submit_button.config, {"state": tk.NORMAL})
 
-        self.user_input.delete(0, tk.END)
+    def append_text(self, text, tag):
+        self.chat_history.config(state=tk.NORMAL)
+        self.chat_history.insert(tk.END, text, tag)
+        self.chat_history.config(state=tk.DISABLED)
+        self.chat_history.yview(tk.END)
 
     def display_message(self, message, sender):
         self.chat_history.config(state=tk.NORMAL)
@@ -110,10 +258,24 @@ class ChatUI:
         self.similar_sentences_text.config(state=tk.DISABLED)
 
 def main():
-    chatbot = Chatbot()
+    parser = argparse.ArgumentParser(description="Chatbot desktop UI")
+    parser.add_argument('--server', help="URL of a running server.py; the UI then only acts as a thin client")
+    parser.add_argument('--profile-startup', action='store_true', help="Print the time spent in each startup phase")
+    args = parser.parse_args()
+
+    if tk is None:
+        raise SystemExit("tkinter is not available, run the headless server with scripts/server.py")
+
+    if args.server:
+        from chat_client import RemoteChatbot
+        chatbot = RemoteChatbot(args.server)
+    else:
+        chatbot = Chatbot(profile=args.profile_startup or Config.PROFILE_STARTUP)
     root = tk.Tk()
     chat_ui = ChatUI(root, chatbot)
     root.mainloop()
+    if not args.server:
+        chatbot.close()
 
 if __name__ == "__main__":
     main()
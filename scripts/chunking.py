@@ -0,0 +1,196 @@
+import os
+import re
+import zlib
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+def approximate_tokens(text: str) -> int:
+    # Words and punctuation marks; a wordpiece tokenizer gives the same or a few more
+    return len(WORD_PATTERN.findall(text))
+
+
+class Chunker:
+    '''
+    Groups a page's sentences into passages of at most max_tokens, each window
+    starting so that it repeats about overlap tokens of the previous one.
+
+    Windows follow sentence boundaries; a sentence longer than max_tokens is cut
+    into word windows on its own. count_tokens should be the embedding model's
+    tokenizer so passages are not truncated by the model.
+    '''
+
+    def __init__(self, max_tokens: int = 128, overlap: int = 32,
+                 count_tokens: Callable[[str], int] = approximate_tokens):
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.count_tokens = count_tokens
+
+    def _pieces(self, sentences: List[str]) -> List[Tuple[str, int, int]]:
+        # (text, character offset in the page text, tokens), long sentences cut into word windows
+        pieces = []
+        offset = 0
+        for sentence in sentences:
+            tokens = self.count_tokens(sentence)
+            if tokens <= self.max_tokens:
+                pieces.append((sentence, offset, tokens))
+            else:
+                words = sentence.split(' ')
+                step = max(1, len(words) * (self.max_tokens - self.overlap) // tokens)
+                size = max(1, len(words) * self.max_tokens // tokens)
+                word_offset = offset
+                for start in range(0, len(words), step):
+                    text = ' '.join(words[start:start + size])
+                    pieces.append((text, word_offset, self.count_tokens(text)))
+                    word_offset += len(' '.join(words[start:start + step])) + 1
+                    if start + size >= len(words):
+                        break
+            offset += len(sentence) + 1
+        return pieces
+
+    def chunk(self, sentences: List[str]) -> List[Tuple[str, int]]:
+        '''
+        Returns (passage, offset) pairs, offset being the passage's character
+        position in the page text (the sentences joined by single spaces).
+        '''
+        pieces = self._pieces(sentences)
+        chunks = []
+        start = 0
+        while start < len(pieces):
+            end, tokens = start, 0
+            while end < len(pieces) and (end == start or tokens + pieces[end][2] <= self.max_tokens):
+                tokens += pieces[end][2]
+                end += 1
+            chunks.append((' '.join(piece[0] for piece in pieces[start:end]), pieces[start][1]))
+            if end == len(pieces):
+                break
+
+            # Step back over whole sentences until about overlap tokens are repeated
+            next_start, repeated = end, 0
+            while next_start - 1 > start and repeated + pieces[next_start - 1][2] <= self.overlap:
+                next_start -= 1
+                repeated += pieces[next_start][2]
+            start = next_start
+        return chunks
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    # Word n-grams hashed with crc32, which is stable across processes unlike hash()
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {zlib.crc32(' '.join(words[i:i + size]).encode('utf-8')) for i in range(len(words) - size + 1)}
+
+
+class NearDuplicateIndex:
+    '''
+    MinHash signatures with LSH banding over the passages kept so far.
+
+    A passage is a near duplicate when a kept passage shares at least one band
+    and their signatures estimate a Jaccard similarity of at least threshold.
+    The first passage seen is kept, later copies (navigation, infobox and footer
+    boilerplate repeated across pages) are dropped. Signatures of kept passages
+    are persisted in directory as <name>.digests.npy / <name>.signatures.npy.
+    '''
+
+    # Largest prime below 2**32: a * x + b with a, b, x below it stays below 2**64,
+    # so the uint64 arithmetic never wraps
+    PRIME = np.uint64(4294967291)
+
+    def __init__(self, directory: str, num_perm: int = 128, bands: int = 32, threshold: float = 0.8,
+                 name: str = 'minhash'):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.directory = directory
+        self.name = name
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = np.random.default_rng(1)
+        self.a = rng.integers(1, int(self.PRIME), num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(self.PRIME), num_perm, dtype=np.uint64)
+
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self.load()
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{suffix}")
+
+    def load(self):
+        if not os.path.exists(self._path('signatures.npy')):
+            return
+        digests = np.load(self._path('digests.npy'))
+        signatures = np.load(self._path('signatures.npy'))
+        if signatures.shape[1:] != (len(self.a),):
+            return
+        for digest, signature in zip(digests.tolist(), signatures):
+            self._insert(digest, signature)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        digests = list(self.signatures)
+        signatures = np.stack([self.signatures[d] for d in digests]) if digests else np.empty((0, len(self.a)), dtype=np.uint64)
+        for suffix, array in (('digests.npy', np.array(digests, dtype='U40')), ('signatures.npy', signatures)):
+            with open(self._path(f"{suffix}.tmp"), 'wb') as f:
+                np.save(f, array)
+            os.replace(self._path(f"{suffix}.tmp"), self._path(suffix))
+
+    def signature(self, text: str) -> np.ndarray:
+        values = np.fromiter(shingles(text), dtype=np.uint64) % self.PRIME
+        return ((np.outer(values, self.a) + self.b) % self.PRIME).min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _insert(self, digest: str, signature: np.ndarray):
+        self.signatures[digest] = signature
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(digest)
+
+    def find_duplicate(self, text: str, signature: Optional[np.ndarray] = None) -> Optional[str]:
+        if signature is None:
+            signature = self.signature(text)
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        for digest in candidates:
+            if np.mean(self.signatures[digest] == signature) >= self.threshold:
+                return digest
+        return None
+
+    def add_if_new(self, digest: str, text: str) -> bool:
+        '''
+        Keeps the passage and returns True, or returns False if it duplicates a kept one.
+        '''
+        if digest in self.signatures:
+            return False
+        signature = self.signature(text)
+        if self.find_duplicate(text, signature) is not None:
+            return False
+        self._insert(digest, signature)
+        return True
+
+    def remove(self, digests: Iterable[str]):
+        for digest in digests:
+            signature = self.signatures.pop(digest, None)
+            if signature is None:
+                continue
+            for key in self._band_keys(signature):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(digest)
+                    if not bucket:
+                        del self.buckets[key]
+
+    def prune(self, live: Set[str]):
+        self.remove([digest for digest in self.signatures if digest not in live])
+
+    def __len__(self) -> int:
+        return len(self.signatures)
@@ -5,9 +5,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
+    # Vector store: "milvus" or "local" (in-process, FLAT or IVF index)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "milvus")
+
     # Milvus connection settings
     MILVUS_HOST = os.getenv("MILVUS_HOST", "localhost")
     MILVUS_PORT = os.getenv("MILVUS_PORT", "19530")
+    # Connection alias (set one per worker process) and connections per process
+    MILVUS_ALIAS = os.getenv("MILVUS_ALIAS", "chatbot")
+    MILVUS_POOL_SIZE = int(os.getenv("MILVUS_POOL_SIZE", "1"))
     
     # Azure OpenAI settings
     AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT", "")
@@ -15,4 +21,88 @@ class Config:
     VERSION = os.getenv("VERSION","2024-02-15-preview")
     
     # Sentence Transformer model settings
-    SENTENCE_MODEL = os.getenv("SENTENCE_MODEL", "all-MiniLM-L6-v2")
\ No newline at end of file
+    SENTENCE_MODEL = os.getenv("SENTENCE_MODEL", "all-MiniLM-L6-v2")
+    
+    # Local state kept between runs (ingestion manifest, caches)
+    CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+    # Local copy of the model, saved on the first run; PRELOAD_MODEL loads it on a background thread
+    MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(CACHE_DIR, "models"))
+    PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "1") == "1"
+    # Encoder backend: "torch" (float32), "int8" (quantized PyTorch) or "onnx" (ONNX Runtime); 0 threads keeps the default
+    ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+    ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+    # Serve the last ingestion without fetching anything if it is younger than this many seconds (0: always ingest)
+    WARM_START_MAX_AGE = float(os.getenv("WARM_START_MAX_AGE", "0"))
+    PROFILE_STARTUP = os.getenv("PROFILE_STARTUP", "0") == "1"
+    # Query path metrics are appended to this JSONL file every METRICS_INTERVAL seconds (empty: not written)
+    METRICS_JSONL = os.getenv("METRICS_JSONL", "")
+    METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "60"))
+    # One manifest per backend, each store holds its own copy of the corpus
+    INGEST_MANIFEST = os.getenv("INGEST_MANIFEST", os.path.join(CACHE_DIR, f"ingest_manifest_{VECTOR_BACKEND}.json"))
+    # Index chosen by scripts/tune_index.py; without it the index is sized from the row count
+    MILVUS_INDEX_CONFIG = os.getenv("MILVUS_INDEX_CONFIG", os.path.join(CACHE_DIR, "milvus_index.json"))
+    MILVUS_TARGET_RECALL = float(os.getenv("MILVUS_TARGET_RECALL", "0.95"))
+
+    # Web pages are ingested as overlapping passages of CHUNK_TOKENS model tokens,
+    # passages with an estimated Jaccard similarity >= DEDUP_THRESHOLD to a stored one are dropped
+    CHUNKING = os.getenv("CHUNKING", "1") == "1"
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "128"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+    DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+    DEDUP_DIR = os.getenv("DEDUP_DIR", os.path.join(CACHE_DIR, f"minhash_{VECTOR_BACKEND}"))
+
+    # BM25 index fused with dense hits by reciprocal rank fusion
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+    SPARSE_INDEX_DIR = os.getenv("SPARSE_INDEX_DIR", os.path.join(CACHE_DIR, f"bm25_{VECTOR_BACKEND}"))
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+
+    # Bounded in-memory LRU of query embeddings
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+    # Pages to ingest, one URL per line
+    LINKS_FILE = os.getenv("LINKS_FILE", "data/links")
+    # Web fetching: FETCH_WORKERS <= 1 fetches serially
+    FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+    FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "8"))
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+    # Sentences embedded and inserted into Milvus per ingestion batch
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+    # Ingestion embeds on this many worker processes (1: in process), in length-sorted shards of EMBED_SHARD_SIZE
+    EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+    EMBED_SHARD_SIZE = int(os.getenv("EMBED_SHARD_SIZE", "1024"))
+
+    # Chat model and cache of generated answers (RESPONSE_CACHE_SIZE=0 turns it off)
+    CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+    # Prompt budget in tokens for retrieved passages and for each tool result
+    PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1500"))
+    TOOL_OUTPUT_TOKENS = int(os.getenv("TOOL_OUTPUT_TOKENS", "1000"))
+    OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+    # Local intent routing: confident calendar/knowledge queries skip the tool-choice completion.
+    # Threshold and margin are calibrated at startup on ROUTER_QUERIES for the loaded model;
+    # ROUTER_THRESHOLD/ROUTER_MARGIN only apply with ROUTER_CALIBRATE=0
+    INTENT_ROUTER = os.getenv("INTENT_ROUTER", "1") == "1"
+    ROUTER_CALIBRATE = os.getenv("ROUTER_CALIBRATE", "1") == "1"
+    ROUTER_QUERIES = os.getenv("ROUTER_QUERIES", "data/intent_queries.csv")
+    ROUTER_MIN_PRECISION = float(os.getenv("ROUTER_MIN_PRECISION", "1.0"))
+    ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.4"))
+    ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.05"))
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+
+    # Headless server: request workers and retrieval micro-batches (size, window in seconds)
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+    QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "32"))
+    QUERY_BATCH_WAIT = float(os.getenv("QUERY_BATCH_WAIT", "0.005"))
+    # Use the "context" sent with /query and /stream instead of retrieving it. Only for trusted
+    # clients: the context goes into the prompt and the shared response cache unchecked
+    SERVER_CLIENT_CONTEXT = os.getenv("SERVER_CLIENT_CONTEXT", "0") == "1"
+
+    # In-process vector store files
+    LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", os.path.join(CACHE_DIR, "vectors"))
+    LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "FLAT")
@@ -1,23 +1,86 @@
+import os
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet snapshot is optional, the CSV is parsed every time without it
+    pa = None
+    pq = None
+
 class CSVDataFetcher:
-    def __init__(self, csv_file: str):
+    '''
+    Loads the calendar export with explicit date/time formats.
+    The parsed frame is cached as a Parquet snapshot next to the CSV and
+    reused for as long as the CSV file keeps the same mtime and size.
+    '''
+    def __init__(self, csv_file: str, date_format: str = '%m/%d/%Y', time_format: str = '%H:%M', use_snapshot: bool = True):
         self.csv_file = csv_file
+        self.date_format = date_format
+        self.time_format = time_format
+        self.snapshot_file = os.path.splitext(csv_file)[0] + '.parquet'
+        self.use_snapshot = use_snapshot and pq is not None
         try:
-            self.df = pd.read_csv(csv_file)
-            date_columns = ['Start Date', 'End Date']
-            for col in date_columns:
-                self.df[col] = pd.to_datetime(self.df[col]).dt.strftime('%Y-%m-%d')
-            time_columns = ['Start Time', 'End Time']
-            for col in time_columns:
-                self.df[col] = pd.to_datetime(self.df[col], format='%H:%M').dt.strftime('%H:%M')
+            self.df = self._load_snapshot() if self.use_snapshot else None
+            if self.df is None:
+                self.df = self._load_csv()
+                if self.use_snapshot:
+                    self._save_snapshot()
         except Exception as e:
             raise ValueError(f"Error reading CSV file: {str(e)}")
 
+    def _load_csv(self) -> pd.DataFrame:
+        df = pd.read_csv(self.csv_file)
+        date_columns = ['Start Date', 'End Date']
+        for col in date_columns:
+            df[col] = pd.to_datetime(df[col], format=self.date_format).dt.strftime('%Y-%m-%d')
+        time_columns = ['Start Time', 'End Time']
+        for col in time_columns:
+            df[col] = pd.to_datetime(df[col], format=self.time_format).dt.strftime('%H:%M')
+        return df
+
+    def _source_stamp(self) -> dict:
+        stat = os.stat(self.csv_file)
+        return {b'source_mtime_ns': str(stat.st_mtime_ns).encode(), b'source_size': str(stat.st_size).encode()}
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_file):
+            return None
+        try:
+            metadata = pq.read_schema(self.snapshot_file).metadata or {}
+            stamp = self._source_stamp()
+            if any(metadata.get(key) != value for key, value in stamp.items()):
+                return None
+            return pq.read_table(self.snapshot_file).to_pandas()
+        except (OSError, pa.ArrowException) as e:
+            print(f"Ignoring unreadable calendar snapshot {self.snapshot_file}: {e}")
+            return None
+
+    def _save_snapshot(self):
+        try:
+            table = pa.Table.from_pandas(self.df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **self._source_stamp()})
+            tmp_file = f"{self.snapshot_file}.tmp"
+            pq.write_table(table, tmp_file)
+            os.replace(tmp_file, self.snapshot_file)
+        except (OSError, pa.ArrowException) as e:
+            print(f"Could not write calendar snapshot {self.snapshot_file}: {e}")
 
     def fetch_and_process_csv(self):
-        rows = []
-        for _, row in self.df.iterrows():
-            row_string = ', '.join([f"{col}: {row[col]}" for col in self.df.columns])
-            rows.append(row_string)
-        return rows
+        return list(self.iter_rows())
+
+    def iter_rows(self, chunk_size: int = 10000):
+        # Serialized a chunk at a time with column-wise string operations instead of iterrows
+        for start in range(0, len(self.df), chunk_size):
+            yield from self.serialize_rows(self.df.iloc[start:start + chunk_size]).tolist()
+
+    @staticmethod
+    def serialize_rows(df: pd.DataFrame) -> pd.Series:
+        # "Col: value, Col: value, ..." for every row; missing values render as 'nan' like str() does
+        parts = [
+            f"{col}: " + pd.Series(df[col].to_numpy(dtype=object).astype(str), index=df.index, dtype=object)
+            for col in df.columns
+        ]
+        if not parts:
+            return pd.Series([''] * len(df), index=df.index, dtype=object)
+        return parts[0].str.cat(parts[1:], sep=', ')
@@ -1,13 +1,64 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import re
-from typing import List
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+
+def split_html_sentences(content: bytes) -> List[str]:
+    # Module level so it can be shipped to worker processes
+    soup = BeautifulSoup(content, 'html.parser')
+
+    sentences = []
+    paragraphs = soup.find_all('p')
+    for paragraph in paragraphs:
+        text = ' '.join(paragraph.get_text().split())
+        # Replace symbols with white
+        text = re.sub(r'&[a-z]+;', '', text)
+
+        # Remove white spaces and add period where needed
+        paragraph_sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', text)
+        sentences.extend([s.strip() + '.' for s in paragraph_sentences if s.strip() and len(s) > 10])
+
+    return sentences
+
 
 class DataFetcher:
-    def __init__(self, path: str = "data/links"):
+    '''
+    max_workers <= 1 keeps the original serial fetch-then-parse loop.
+    Otherwise pages are fetched by a thread pool sharing one pooled session
+    (at most per_host_limit requests in flight per host) and parsed by a
+    process pool of parse_workers. Results always keep the order of the links file.
+
+    Everything is streamed: at most window pages are fetched or parsed ahead
+    of the consumer, so memory does not grow with the number of links.
+    '''
+    def __init__(self, path: str = "data/links", max_workers: int = 16, per_host_limit: int = 8,
+                 parse_workers: int = 1, retries: int = 3, timeout: float = 10, window: Optional[int] = None):
         self.path = path
-    
-    def fetch_and_process_urls(self) -> List[str]:
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.parse_workers = parse_workers
+        self.window = window or 2 * max(max_workers, parse_workers, 1)
+        self.timeout = timeout
+
+        # Retries with exponential backoff on connection errors and throttling/server errors
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET', 'HEAD']))
+        adapter = HTTPAdapter(pool_connections=max(max_workers, 1), pool_maxsize=max(per_host_limit, 1), max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.host_limits = {}
+        self.host_limits_lock = threading.Lock()
+
+    def load_urls(self) -> List[str]:
         try:
             with open(self.path, 'r') as f:
                 urls = f.read().splitlines()
@@ -17,33 +68,96 @@ class DataFetcher:
                 "https://en.wikipedia.org/wiki/Python_(programming_language)",
                 "https://en.wikipedia.org/wiki/Artificial_intelligence"
             ]
-        
-        urls = [url.strip().rstrip(',') for url in urls if url.strip()]
-        all_sentences = []
-        for url in urls:
-            sentences = self.fetch_and_split_sentences(url)
-            all_sentences.extend(sentences)
-        return all_sentences
 
-    def fetch_and_split_sentences(self, url: str) -> List[str]:
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
+        return [url.strip().rstrip(',') for url in urls if url.strip()]
+
+    def fetch_and_process_urls(self) -> List[str]:
+        return list(self.iter_sentences())
+
+    def iter_sentences(self) -> Iterator[str]:
+        if self.max_workers <= 1:
+            for url in self.load_urls():
+                yield from self.fetch_and_split_sentences(url)
+            return
 
-            sentences = []
-            paragraphs = soup.find_all('p')
-            for paragraph in paragraphs:
-                text = ' '.join(paragraph.get_text().split())
-                # Replace symbols with white
-                text = re.sub(r'&[a-z]+;', '', text)
+        pages = ((url, response.content if response is not None else None) for url, response in self.iter_pages(self.load_urls()))
+        for _, sentences in self.split_pages(pages):
+            yield from sentences or []
 
-                # Remove white spaces and add period where needed
-                paragraph_sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', text)
-                sentences.extend([s.strip() + '.' for s in paragraph_sentences if s.strip() and len(s) > 10])
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self.host_limits_lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self.host_limits[host]
 
-            return sentences
+    def fetch_page(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Optional[requests.Response]:
+        # Conditional GET: the server answers 304 Not Modified if the page did not change
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
 
+        try:
+            with self._host_limit(url):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return response
         except requests.exceptions.RequestException as e:
             print(f"Error fetching URL {url}: {e}")
+            return None
+
+    def iter_pages(self, urls: List[str], validators: Optional[Sequence[Tuple[Optional[str], Optional[str]]]] = None) -> Iterator[Tuple[str, Optional[requests.Response]]]:
+        '''
+        Fetches urls concurrently, validators holds an (etag, last_modified) pair per url.
+        Yields (url, response) in the order of urls, response is None for failed fetches.
+        '''
+        if validators is None:
+            validators = [(None, None)] * len(urls)
+        if self.max_workers <= 1 or len(urls) <= 1:
+            for url, pair in zip(urls, validators):
+                yield url, self.fetch_page(url, *pair)
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            pending = deque()
+            for url, pair in zip(urls, validators):
+                pending.append((url, executor.submit(self.fetch_page, url, *pair)))
+                if len(pending) >= self.window:
+                    url, future = pending.popleft()
+                    yield url, future.result()
+            while pending:
+                url, future = pending.popleft()
+                yield url, future.result()
+
+    def fetch_and_split_sentences(self, url: str) -> List[str]:
+        response = self.fetch_page(url)
+        if response is None:
             return []
+        return self.split_sentences(response.content)
+
+    def split_sentences(self, content: bytes) -> List[str]:
+        return split_html_sentences(content)
+
+    def split_pages(self, pages: Iterable[Tuple[Any, Optional[bytes]]]) -> Iterator[Tuple[Any, Optional[List[str]]]]:
+        '''
+        Splits (tag, content) pairs into (tag, sentences), keeping their order.
+        Pairs without content are passed through as (tag, None).
+        '''
+        if self.parse_workers <= 1:
+            for tag, content in pages:
+                yield tag, split_html_sentences(content) if content is not None else None
+            return
+
+        # html.parser is pure Python, so parse in separate processes to use more than one core
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            pending = deque()
+            for tag, content in pages:
+                pending.append((tag, executor.submit(split_html_sentences, content) if content is not None else None))
+                if len(pending) >= self.window:
+                    tag, future = pending.popleft()
+                    yield tag, future.result() if future is not None else None
+            while pending:
+                tag, future = pending.popleft()
+                yield tag, future.result() if future is not None else None
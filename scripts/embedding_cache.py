@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+DIGEST_SIZE = 20  # sha1
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk store of float32 vectors for one embedding model.
+
+    <model>.f32 holds the vectors row after row and is read through a memory map,
+    <model>.idx holds the sha1 digest of the text for each row in the same order.
+    """
+
+    def __init__(self, directory: str, model_name: str, dim: int):
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)
+        self.vectors_path = os.path.join(directory, f"{name}.f32")
+        self.index_path = os.path.join(directory, f"{name}.idx")
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self._load()
+
+    def _load(self):
+        digests = b''
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                digests = f.read()
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        count = min(len(digests) // DIGEST_SIZE, vector_rows)
+
+        # A crash between the two appends leaves one file longer than the other
+        if count * DIGEST_SIZE != len(digests) or count != vector_rows:
+            self._truncate(count)
+
+        self.rows = {digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]: i for i in range(count)}
+        self._remap(count)
+
+    def _truncate(self, count: int):
+        for path, row_size in ((self.index_path, DIGEST_SIZE), (self.vectors_path, self.dim * 4)):
+            with open(path, 'ab') as f:
+                f.truncate(count * row_size)
+
+    def _remap(self, count: int):
+        if count:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(count, self.dim))
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, digests: List[bytes]) -> np.ndarray:
+        # Row of each digest, -1 for misses
+        return np.fromiter((self.rows.get(digest, -1) for digest in digests), dtype=np.int64, count=len(digests))
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def add(self, digests: List[bytes], vectors: np.ndarray):
+        with self.lock:
+            # Another thread may have stored some of these in the meantime
+            keep = [i for i, digest in enumerate(digests) if digest not in self.rows]
+            if not keep:
+                return
+            vectors = np.ascontiguousarray(vectors[keep], dtype=np.float32)
+            new_digests = [digests[i] for i in keep]
+
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self.index_path, 'ab') as f:
+                f.write(b''.join(new_digests))
+
+            # lookup()/get() run without the lock: map the grown file first and only
+            # then publish the new rows, so a row a reader finds is always in self.vectors
+            start = len(self.rows)
+            self._remap(start + len(new_digests))
+            self.rows.update((digest, start + offset) for offset, digest in enumerate(new_digests))
+
+
+class CachedEncoder:
+    """
+    Wraps a SentenceTransformer so identical text is only ever embedded once.
+
+    encode() goes through the persistent EmbeddingCache and only sends the
+    misses to the model. encode_query() keeps user queries in a bounded
+    in-memory LRU instead, so arbitrary queries never grow the files on disk.
+    """
+
+    def __init__(self, model, model_name: str, cache_dir: str, query_cache_size: int = 1024,
+                 bulk_model=None, bulk_threshold: int = 2048):
+        self.model = model
+        # Misses of at least bulk_threshold texts go to bulk_model (e.g. a ShardedEncoder) instead
+        self.bulk_model = bulk_model
+        self.bulk_threshold = bulk_threshold
+        self.model_name = model_name
+        self.dim = model.get_sentence_embedding_dimension()
+        self.cache = EmbeddingCache(os.path.join(cache_dir, 'embeddings'), model_name, self.dim)
+        self.query_cache = OrderedDict()
+        self.query_cache_size = query_cache_size
+        # Guards the query LRU and the hit/miss counters
+        self.query_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences: List[str], batch_size: int = 32) -> np.ndarray:
+        digests = [text_digest(sentence) for sentence in sentences]
+        rows = self.cache.lookup(digests)
+        found = rows >= 0
+        missing = np.flatnonzero(~found)
+
+        embeddings = np.empty((len(sentences), self.dim), dtype=np.float32)
+        embeddings[found] = self.cache.get(rows[found])
+
+        if missing.size:
+            # Encode each distinct missing text once
+            positions = {}
+            texts = []
+            for i in missing:
+                if digests[i] not in positions:
+                    positions[digests[i]] = len(texts)
+                    texts.append(sentences[i])
+            model = self.bulk_model if self.bulk_model is not None and len(texts) >= self.bulk_threshold else self.model
+            vectors = np.asarray(model.encode(texts, batch_size=batch_size), dtype=np.float32)
+            self.cache.add(list(positions), vectors)
+            embeddings[missing] = vectors[[positions[digests[i]] for i in missing]]
+
+        with self.query_lock:
+            self.hits += int(found.sum())
+            self.misses += int(missing.size)
+        return embeddings
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return self.encode_queries([query])[0]
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        embeddings = np.empty((len(queries), self.dim), dtype=np.float32)
+        missing = []
+        with self.query_lock:
+            for i, query in enumerate(queries):
+                vector = self.query_cache.get(query)
+                if vector is None:
+                    missing.append(i)
+                else:
+                    self.query_cache.move_to_end(query)
+                    embeddings[i] = vector
+            self.hits += len(queries) - len(missing)
+
+        if missing:
+            # All misses go to the model in one call
+            texts = list(dict.fromkeys(queries[i] for i in missing))
+            vectors = np.asarray(self.model.encode(texts), dtype=np.float32)
+            by_text = dict(zip(texts, vectors))
+            for i in missing:
+                embeddings[i] = by_text[queries[i]]
+
+            with self.query_lock:
+                self.misses += len(missing)
+                for text, vector in by_text.items():
+                    self.query_cache[text] = vector
+                    self.query_cache.move_to_end(text)
+                while len(self.query_cache) > self.query_cache_size:
+                    self.query_cache.popitem(last=False)
+        return embeddings
+
@@ -0,0 +1,39 @@
+from typing import List
+
+from metrics import METRICS
+from sparse_index import SparseIndex
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60, top_k: int = 5) -> List[str]:
+    # Score 1 / (k + rank) summed over the rankings a sentence appears in
+    scores = {}
+    for ranking in rankings:
+        for rank, sentence in enumerate(ranking, start=1):
+            scores[sentence] = scores.get(sentence, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:top_k]
+
+
+class HybridSearcher:
+    '''
+    Dense vector search fused with BM25 hits by reciprocal rank fusion.
+
+    Both sides return `candidates` hits per query, so exact names, dates and rooms
+    the embedding misses can still make the top_k. Exposes the same search
+    surface as a VectorStore, so RetrievalService can batch over it.
+    '''
+
+    def __init__(self, store, sparse_index: SparseIndex, candidates: int = 20, rrf_k: int = 60):
+        self.store = store
+        self.sparse_index = sparse_index
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search_similar_sentences(self, query: str, top_k: int = 5) -> List[str]:
+        return self.search_many([query], top_k)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5) -> List[List[str]]:
+        depth = max(top_k, self.candidates)
+        dense = self.store.search_many(queries, depth)
+        with METRICS.timer('sparse_search'):
+            return [reciprocal_rank_fusion([hits, self.sparse_index.search(query, depth)], self.rrf_k, top_k)
+                    for query, hits in zip(queries, dense)]
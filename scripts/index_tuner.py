@@ -0,0 +1,195 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from vector_store import normalize_rows
+
+
+@dataclass
+class IndexConfig:
+    '''
+    Milvus index type with its build parameters and the search parameters used
+    against it. rows is the collection size it was chosen for; recall and latency
+    are filled in when the config was measured.
+    '''
+    index_type: str
+    params: Dict = field(default_factory=dict)
+    search_params: Dict = field(default_factory=dict)
+    rows: int = 0
+    recall: Optional[float] = None
+    p50_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+
+    def index_params(self) -> dict:
+        return {"metric_type": "IP", "index_type": self.index_type, "params": self.params}
+
+    def search_param(self) -> dict:
+        return {"metric_type": "IP", "params": self.search_params}
+
+    def same_index(self, other: 'IndexConfig') -> bool:
+        return self.index_type == other.index_type and self.params == other.params
+
+
+def load_index_config(path: str) -> Optional[IndexConfig]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return IndexConfig(**json.load(f))
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Ignoring index config {path}: {e}")
+        return None
+
+
+def save_index_config(config: IndexConfig, path: str):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(asdict(config), f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def ivf_nlist(rows: int) -> int:
+    # About 4 * sqrt(n) lists, rounded to a power of two, at least 39 rows per list
+    nlist = 2 ** int(round(np.log2(max(4 * np.sqrt(max(rows, 1)), 1))))
+    return int(min(max(nlist, 16), 65536, max(16, rows // 39)))
+
+
+def default_search_params(index_type: str, params: Dict) -> Dict:
+    if index_type.startswith('IVF'):
+        return {"nprobe": max(8, params.get("nlist", 1024) // 32)}
+    if index_type == 'HNSW':
+        return {"ef": 64}
+    return {}
+
+
+def default_config(rows: int) -> IndexConfig:
+    '''
+    Unmeasured starting point for a collection of the given size:
+    exact search while it is cheap, IVF_FLAT in the middle, HNSW for millions of rows.
+    '''
+    if rows < 20_000:
+        index_type, params = 'FLAT', {}
+    elif rows < 2_000_000:
+        index_type, params = 'IVF_FLAT', {"nlist": ivf_nlist(rows)}
+    else:
+        index_type, params = 'HNSW', {"M": 16, "efConstruction": 200}
+    return IndexConfig(index_type, params, default_search_params(index_type, params), rows)
+
+
+def candidate_configs(rows: int, every_family: bool = False) -> List[List[IndexConfig]]:
+    '''
+    Index families worth measuring at this size (all of them with every_family).
+    Each family shares one index build and lists its search parameters from
+    cheapest to most exhaustive. Below 20k rows that is FLAT alone.
+    '''
+    nlist = ivf_nlist(rows)
+    nprobes = [n for n in (8, 16, 32, 64, 128, 256) if n < nlist] + [nlist]
+    families = []
+    if rows < 200_000 or every_family:
+        families.append([IndexConfig('FLAT', {}, {}, rows)])
+    if rows >= 20_000 or every_family:
+        families.append([IndexConfig('IVF_FLAT', {"nlist": nlist}, {"nprobe": n}, rows) for n in nprobes])
+        families.append([IndexConfig('IVF_SQ8', {"nlist": nlist}, {"nprobe": n}, rows) for n in nprobes])
+        families.append([IndexConfig('HNSW', {"M": 16, "efConstruction": 200}, {"ef": ef}, rows)
+                         for ef in (16, 32, 64, 128, 256)])
+    return families
+
+
+class IndexTuner:
+    '''
+    Measures Milvus index configs against exact ground truth computed locally.
+
+    sentences/embeddings must be what the collection holds (as read back by
+    MilvusHandler.iter_entities). queries are embeddings of real questions. held_out
+    adds that many sampled corpus rows as leave-one-out queries: the row itself is
+    left out of both the ground truth and the search results, so recall is measured
+    on its neighbours only.
+    '''
+
+    def __init__(self, handler, sentences: List[str], embeddings: np.ndarray, top_k: int = 5,
+                 queries: Optional[np.ndarray] = None, held_out: int = 0, seed: int = 0):
+        self.handler = handler
+        self.sentences = sentences
+        self.top_k = top_k
+        corpus = normalize_rows(embeddings)
+
+        queries = np.empty((0, corpus.shape[1]), dtype=np.float32) if queries is None else normalize_rows(queries)
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(corpus), min(held_out, len(corpus)), replace=False)
+        self.queries = np.concatenate([queries, corpus[rows]])
+        # Corpus row each query has to skip, -1 for real questions
+        self.own_rows = np.concatenate([np.full(len(queries), -1), rows]).astype(np.int64)
+        if not len(self.queries):
+            raise ValueError("IndexTuner needs queries or held_out > 0")
+        self.truth = self.ground_truth(corpus, self.queries, top_k)
+
+    def ground_truth(self, corpus: np.ndarray, queries: np.ndarray, top_k: int) -> List[set]:
+        # Exact top-k by inner product, in chunks so the score matrix stays small
+        truth = []
+        k = min(top_k, corpus.shape[0])
+        for start in range(0, len(queries), 64):
+            scores = queries[start:start + 64] @ corpus.T
+            own = self.own_rows[start:start + 64]
+            held = np.flatnonzero(own >= 0)
+            scores[held, own[held]] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            truth.extend({self.sentences[i] for i in row if np.isfinite(score[i])} for row, score in zip(top, scores))
+        return truth
+
+    def measure(self, config: IndexConfig) -> IndexConfig:
+        # Assumes the config's index is already built; only the search params change
+        self.handler.search_params = config.search_param()
+        latencies = []
+        recall = 0.0
+        measured = 0
+        for query, own, expected in zip(self.queries, self.own_rows, self.truth):
+            start = time.perf_counter()
+            found = self.handler.search_embeddings(query[None, :], self.top_k + int(own >= 0))[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            if own >= 0:
+                found = [sentence for sentence in found if sentence != self.sentences[own]][:self.top_k]
+            # A held-out row of a one-row corpus has no neighbours to find
+            if expected:
+                recall += len(expected.intersection(found)) / len(expected)
+                measured += 1
+        config.recall = recall / max(measured, 1)
+        config.p50_ms = float(np.percentile(latencies, 50))
+        config.p99_ms = float(np.percentile(latencies, 99))
+        return config
+
+    def sweep(self, stop_at_recall: Optional[float] = None, every_family: bool = False) -> List[IndexConfig]:
+        '''
+        Builds each candidate index once and measures its search parameters in order.
+        With stop_at_recall, a family stops at its first setting that reaches it.
+        every_family also measures the families the collection is too small for.
+        '''
+        results = []
+        for family in candidate_configs(len(self.sentences), every_family):
+            self.handler.apply_index(family[0])
+            for config in family:
+                results.append(self.measure(config))
+                if stop_at_recall is not None and config.recall >= stop_at_recall:
+                    break
+        return results
+
+    def tune(self, target_recall: float = 0.95, path: Optional[str] = None) -> IndexConfig:
+        '''
+        Picks the fastest (p50) config reaching target_recall, or the most accurate
+        one if none does, rebuilds the collection index with it and persists it.
+        '''
+        results = self.sweep(stop_at_recall=target_recall)
+        passing = [config for config in results if config.recall >= target_recall]
+        if passing:
+            best = min(passing, key=lambda config: config.p50_ms)
+        else:
+            best = max(results, key=lambda config: (config.recall, -config.p50_ms))
+            print(f"No index reached recall {target_recall}, using the best one ({best.recall:.3f})")
+
+        self.handler.apply_index(best)
+        if path:
+            save_index_config(best, path)
+        return best
@@ -0,0 +1,358 @@
+import bisect
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def sentence_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def sentence_id(digest: str) -> int:
+    # Milvus primary keys are signed INT64, so use the first 8 bytes of the digest
+    return int.from_bytes(bytes.fromhex(digest[:16]), 'big', signed=True)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Records what has already been embedded and stored in the vector store.
+
+    sources maps a source key ("url:<url>" or "csv:<path>") to its fingerprint,
+    HTTP validators, the ordered hashes of the passages it produced and their
+    offsets in the source (character offset in the page text, row for CSV).
+    Only hashes are kept, the texts live in the vector store, so the manifest
+    stays small however large the corpus. loaded is False when no usable
+    manifest was found, or it was written by another model or manifest
+    version: the vector store may then hold rows it knows nothing about and
+    has to be emptied before ingesting.
+    """
+
+    VERSION = 3
+
+    def __init__(self, path: str, model_name: str):
+        self.path = path
+        self.model_name = model_name
+        self.sources: Dict[str, Dict] = {}
+        self.loaded = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable ingestion manifest {self.path}: {e}")
+            return
+
+        # Vectors from another model (or manifest layout) are useless, start over
+        if data.get('version') != self.VERSION or data.get('model') != self.model_name:
+            print(f"Ingestion manifest {self.path} is from another model or version, re-ingesting everything")
+            return
+        self.sources = data.get('sources', {})
+        self.loaded = True
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            'version': self.VERSION,
+            'model': self.model_name,
+            'sources': self.sources
+        }
+        # Write to a temp file first so a crash never leaves a half-written manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def age(self) -> Optional[float]:
+        # Seconds since the last save, None before the first one
+        try:
+            return time.time() - os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def reset(self):
+        self.sources = {}
+
+    def get_source(self, key: str) -> Dict:
+        return self.sources.get(key, {})
+
+    def set_source(self, key: str, fingerprint: str, hashes: List[str], offsets: Optional[List[int]] = None,
+                   **validators):
+        if offsets is None:
+            offsets = list(range(len(hashes)))
+        self.sources[key] = {'fingerprint': fingerprint, 'hashes': list(hashes), 'offsets': list(offsets), **validators}
+
+    def live_hashes(self) -> Set[str]:
+        return {digest for entry in self.sources.values() for digest in entry['hashes']}
+
+    def ordered_hashes(self) -> List[str]:
+        # Source order first, then sentence order; a sentence shared by sources is kept once
+        return list(dict.fromkeys(digest for entry in self.sources.values() for digest in entry['hashes']))
+
+
+class Ingestor:
+    """
+    Incrementally syncs web and CSV sentences into the vector store as a stream.
+
+    With a chunker, each page's sentences become overlapping passages, and with
+    a near-duplicate index, passages repeating one already stored are dropped.
+    CSV rows stay one row per meeting.
+
+    Sources are fetched, split, embedded and inserted in batches of batch_size
+    while the next pages are still downloading, and CSV rows are serialized a
+    chunk at a time, so only one page and one batch of texts and vectors are
+    held in memory at a time. Only sentences that are new since the last run are
+    embedded and upserted, and sentences that disappeared from every source are deleted.
+    """
+
+    def __init__(self, data_fetcher, csv_data_fetcher, vector_store, embedder, manifest: IngestionManifest,
+                 batch_size: int = 256, sparse_index=None, chunker=None, dedup=None):
+        self.data_fetcher = data_fetcher
+        self.csv_data_fetcher = csv_data_fetcher
+        self.vector_store = vector_store
+        self.embedder = embedder
+        self.manifest = manifest
+        self.batch_size = batch_size
+        # Optional BM25 index kept in step with the manifest
+        self.sparse_index = sparse_index
+        self.chunker = chunker
+        self.dedup = dedup
+        self.duplicates = 0
+
+    def run(self) -> int:
+        '''
+        Syncs every source and returns the number of stored passages.
+        '''
+        previous = self.manifest.live_hashes()
+        if self.dedup is not None:
+            # After a manifest reset nothing it remembers is stored anymore
+            self.dedup.prune(previous)
+
+        seen_sources = []
+        added = self._insert_passages(self._sync_sources(), previous, seen_sources)
+
+        for key in list(self.manifest.sources):
+            if key not in seen_sources:
+                del self.manifest.sources[key]
+
+        current = self.manifest.live_hashes()
+        removed = previous - current
+        if removed:
+            self._delete(removed)
+            if self.dedup is not None:
+                # Passages dropped as copies of what was just removed are stored after all
+                self.dedup.prune(current)
+                restored, current, lost = self._restore_duplicates(current)
+                added += restored
+                removed |= lost
+
+        # One flush for the whole run instead of one per batch
+        self.vector_store.flush()
+
+        print(f"Ingestion: {added} passages embedded, {len(removed)} removed, "
+              f"{len(current) - added} unchanged, {self.duplicates} near duplicates dropped")
+
+        self.manifest.save()
+        if self.dedup is not None:
+            self.dedup.prune(current)
+            self.dedup.save()
+        if self.sparse_index is not None:
+            # New passages were added batch by batch; this drops the removed ones and
+            # fills in anything the index missed (e.g. hybrid search turned on later)
+            self.sparse_index.sync({sentence_id(digest) for digest in current}, self.vector_store.fetch_sentences)
+        return len(current)
+
+    def _insert_passages(self, sources: Iterator[Tuple[str, Optional[Iterable[Tuple[str, int]]]]], stored: Set[str],
+                         seen_sources: Optional[List[str]] = None) -> int:
+        # Embeds and inserts the passages not in stored, batch_size at a time
+        queued = set()
+        batch = []
+        added = 0
+        for key, passages in sources:
+            if seen_sources is not None:
+                seen_sources.append(key)
+            if passages is None:
+                # Unchanged source, everything it produced is stored already
+                continue
+            source = key.split(':', 1)[1]
+            for text, offset in passages:
+                digest = sentence_hash(text)
+                if digest in stored or digest in queued:
+                    continue
+                queued.add(digest)
+                batch.append((text, source, offset))
+                if len(batch) >= self.batch_size:
+                    added += self._insert_batch(batch)
+                    batch = []
+        if batch:
+            added += self._insert_batch(batch)
+        return added
+
+    def _delete(self, digests: Set[str]):
+        self.vector_store.delete_embeddings([sentence_id(digest) for digest in digests], flush=False)
+
+    def _restore_duplicates(self, stored: Set[str]) -> Tuple[int, Set[str], Set[str]]:
+        '''
+        Pages with passages dropped as near duplicates are split again, now that
+        what they duplicated may be gone. Only hashes of dropped passages are kept,
+        so their pages are fetched once more. Returns the passages added, the live
+        hashes afterwards and the hashes no longer live.
+        '''
+        keys = [key for key, entry in self.manifest.sources.items() if entry.get('dropped') and key.startswith('url:')]
+        if not keys:
+            return 0, stored, set()
+        for key in keys:
+            # Forget the validators so the pages are downloaded and split again
+            self.manifest.sources[key].update(fingerprint='', etag=None, last_modified=None)
+        restored = self._insert_passages(self._sync_urls([key.split(':', 1)[1] for key in keys]), stored)
+        current = self.manifest.live_hashes()
+        lost = stored - current
+        if lost:
+            self._delete(lost)
+        return restored, current, lost
+
+    def _insert_batch(self, batch: List[Tuple[str, str, int]]) -> int:
+        sentences, sources, offsets = (list(column) for column in zip(*batch))
+        embeddings = self.embedder.encode(sentences)
+        self.vector_store.insert_embeddings(sentences, embeddings, flush=False, sources=sources, offsets=offsets)
+        if self.sparse_index is not None:
+            self.sparse_index.add(sentences)
+        return len(sentences)
+
+    def _sync_sources(self) -> Iterator[Tuple[str, Optional[Iterable[Tuple[str, int]]]]]:
+        # Yields each source key with its (passage, offset) pairs, or None when it did not change.
+        # A source's manifest entry is up to date once its passages have been consumed.
+        yield from self._sync_urls(self.data_fetcher.load_urls())
+        yield self._sync_csv()
+
+    def _sync_urls(self, urls: List[str]) -> Iterator[Tuple[str, Optional[List[Tuple[str, int]]]]]:
+        keys = {url: f"url:{url}" for url in urls}
+        validators = []
+        for url in urls:
+            entry = self.manifest.get_source(keys[url])
+            validators.append((entry.get('etag'), entry.get('last_modified')))
+
+        # Unchanged pages carry no content and go through split_pages untouched
+        changes = self._changed_pages(self.data_fetcher.iter_pages(urls, validators), keys)
+        for (key, change), sentences in self.data_fetcher.split_pages(changes):
+            if sentences is None:
+                yield key, None
+                continue
+            fingerprint, etag, last_modified = change
+            passages, offsets, dropped = self._passages(key, sentences)
+            self.manifest.set_source(key, fingerprint, [sentence_hash(text) for text in passages], offsets,
+                                     etag=etag, last_modified=last_modified, dropped=dropped)
+            yield key, list(zip(passages, offsets))
+
+    def _passages(self, key: str, sentences: List[str]) -> Tuple[List[str], List[int], List[List]]:
+        '''
+        Returns the passages to store with their offsets, and the [hash, offset]
+        pairs of the passages dropped as near duplicates.
+        '''
+        if self.chunker is None:
+            return sentences, list(range(len(sentences))), []
+        # A sentence repeated within the page is kept once
+        unique = list(dict.fromkeys(sentences))
+        chunks = self.chunker.chunk(unique)
+        if len(unique) < len(sentences):
+            chunks = self._page_offsets(sentences, unique, chunks)
+        if self.dedup is None:
+            return [text for text, _ in chunks], [offset for _, offset in chunks], []
+
+        # The page's previous passages must not count as duplicates of its new version
+        self.dedup.remove(self.manifest.get_source(key).get('hashes', []))
+        passages, offsets, dropped = [], [], []
+        for text, offset in chunks:
+            digest = sentence_hash(text)
+            if self.dedup.add_if_new(digest, text):
+                passages.append(text)
+                offsets.append(offset)
+            else:
+                dropped.append([digest, offset])
+                self.duplicates += 1
+        return passages, offsets, dropped
+
+    @staticmethod
+    def _page_offsets(sentences: List[str], unique: List[str], chunks: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        # Chunk offsets count in the text of the unique sentences; move each one to
+        # the first occurrence of its sentence in the full page text
+        page_starts, position = {}, 0
+        for sentence in sentences:
+            page_starts.setdefault(sentence, position)
+            position += len(sentence) + 1
+        unique_starts, position = [], 0
+        for sentence in unique:
+            unique_starts.append(position)
+            position += len(sentence) + 1
+
+        moved = []
+        for text, offset in chunks:
+            i = bisect.bisect_right(unique_starts, offset) - 1
+            moved.append((text, page_starts[unique[i]] + offset - unique_starts[i]))
+        return moved
+
+    def _changed_pages(self, pages: Iterator[Tuple[str, Optional[object]]], keys: Dict[str, str]) -> Iterator[Tuple[Tuple[str, Optional[Tuple]], Optional[bytes]]]:
+        for url, response in pages:
+            key = keys[url]
+            entry = self.manifest.get_source(key)
+            if response is None:
+                # Keep the previous sentences on transient fetch errors instead of deleting them
+                if not entry:
+                    self.manifest.set_source(key, '', [])
+                yield (key, None), None
+                continue
+            if response.status_code == 304:
+                yield (key, None), None
+                continue
+
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                fingerprint = sentence_hash(f"{url}|{etag}|{last_modified}")
+            else:
+                fingerprint = sentence_hash(url + hashlib.sha1(response.content).hexdigest())
+
+            if entry and entry.get('fingerprint') == fingerprint:
+                yield (key, None), None
+                continue
+            yield (key, (fingerprint, etag, last_modified)), response.content
+
+    def _sync_csv(self) -> Tuple[str, Optional[Iterable[Tuple[str, int]]]]:
+        path = self.csv_data_fetcher.csv_file
+        key = f"csv:{path}"
+        entry = self.manifest.get_source(key)
+        stat = os.stat(path)
+
+        if entry and entry.get('mtime') == stat.st_mtime and entry.get('size') == stat.st_size:
+            return key, None
+
+        fingerprint = file_sha256(path)
+        if entry and entry.get('fingerprint') == fingerprint:
+            # Touched but not modified, just remember the new mtime
+            entry['mtime'] = stat.st_mtime
+            entry['size'] = stat.st_size
+            return key, None
+        return key, self._csv_rows(key, fingerprint, stat)
+
+    def _csv_rows(self, key: str, fingerprint: str, stat: os.stat_result) -> Iterator[Tuple[str, int]]:
+        # Rows are streamed a serialized chunk at a time; the entry is recorded once all were read
+        hashes = []
+        for row, text in enumerate(self.csv_data_fetcher.iter_rows()):
+            hashes.append(sentence_hash(text))
+            yield text, row
+        self.manifest.set_source(key, fingerprint, hashes, mtime=stat.st_mtime, size=stat.st_size)
@@ -0,0 +1,278 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from vector_store import normalize_rows
+
+CALENDAR = 'calendar'
+KNOWLEDGE = 'knowledge'
+
+# Labeled examples each query is compared with; the tools the LLM would otherwise choose between
+PROTOTYPES = {
+    CALENDAR: [
+        "Who is the organizer of the team meeting?",
+        "Who organizes the strategy session?",
+        "Where is the budget presentation held?",
+        "When is the client review?",
+        "What time does the staff meeting start?",
+        "Which meetings does Alice Green attend?",
+        "What meetings are scheduled in Conference Room 1?",
+        "What events are on 2024-01-15?",
+        "Is there a reminder set for the design review?",
+        "Who are the required attendees of the training session?",
+        "What resources are needed for the workshop?",
+        "Which meetings are virtual?",
+        "What is the priority of the product launch?",
+        "List the meetings organized by John Smith",
+        "Do I have any meetings next week?",
+    ],
+    KNOWLEDGE: [
+        "What is Python?",
+        "Explain artificial intelligence",
+        "Who created the Python programming language?",
+        "What is machine learning?",
+        "Tell me about the history of AI",
+        "What are the main features of Python?",
+        "How does a neural network work?",
+        "What programming paradigms does Python support?",
+        "What is the difference between AI and machine learning?",
+        "Which movies are about artificial intelligence?",
+        "What is Python used for?",
+        "Explain deep learning in simple terms",
+    ],
+}
+
+MONTHS = {name: number for number, name in enumerate(
+    ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october',
+     'november', 'december'], start=1)}
+ISO_DATE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b')
+US_DATE = re.compile(r'\b(\d{1,2})/(\d{1,2})/(\d{4})\b')
+TEXT_DATE = re.compile(r'\b(' + '|'.join(MONTHS) + r')\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b')
+TIME = re.compile(r'\b(\d{1,2}):(\d{2})\b')
+
+# Settings IntentRouter.sweep() measures on a labeled query set
+THRESHOLDS = [round(0.2 + 0.05 * step, 2) for step in range(15)]
+MARGINS = [0.0, 0.02, 0.05, 0.1, 0.15, 0.2]
+
+# Calendar column -> meeting tool argument, for the people in it
+PEOPLE_FIELDS = {
+    'Meeting Organizer': 'meeting_organizer',
+    'Required Attendees': 'required_attendees',
+    'Optional Attendees': 'optional_attendees',
+}
+# Words that pick the role of a person named in the query
+ROLE_WORDS = {
+    'meeting_organizer': ('organiz', 'host'),
+    'required_attendees': ('required',),
+    'optional_attendees': ('optional',),
+}
+
+
+def load_labeled_queries(path: str) -> Tuple[List[str], List[str]]:
+    # CSV with query and intent (calendar/knowledge) columns
+    labeled = pd.read_csv(path)
+    return labeled['query'].astype(str).tolist(), labeled['intent'].tolist()
+
+
+def _phrase_pattern(phrases: List[str]) -> Optional[re.Pattern]:
+    # Longest first, so "conference room 10" wins over "conference room 1"
+    phrases = sorted({phrase.lower() for phrase in phrases if phrase}, key=len, reverse=True)
+    if not phrases:
+        return None
+    return re.compile(r'\b(?:' + '|'.join(re.escape(phrase) for phrase in phrases) + r')\b')
+
+
+class SlotExtractor:
+    '''
+    Meeting tool arguments found in a query without a model: dates, times,
+    and the subjects, rooms and people that occur in the calendar itself.
+
+    extract() returns (slots, ambiguous); ambiguous is True when a person
+    appears in several roles and the query does not say which one is meant.
+    '''
+
+    def __init__(self, df: pd.DataFrame):
+        self.subjects = _phrase_pattern(self._values(df, 'Subject'))
+        self.locations = _phrase_pattern(self._values(df, 'Location'))
+        self.roles: Dict[str, set] = {}
+        for column, param in PEOPLE_FIELDS.items():
+            for cell in self._values(df, column):
+                for name in re.split(r'[;,]', cell):
+                    if name.strip():
+                        self.roles.setdefault(name.strip().lower(), set()).add(param)
+        self.people = _phrase_pattern(list(self.roles))
+
+    @staticmethod
+    def _values(df: pd.DataFrame, column: str) -> List[str]:
+        if column not in df:
+            return []
+        return [str(value).strip() for value in df[column].dropna().unique()]
+
+    @staticmethod
+    def _dates(text: str) -> List[str]:
+        found = []
+        for year, month, day in ISO_DATE.findall(text):
+            found.append((int(year), int(month), int(day)))
+        for month, day, year in US_DATE.findall(text):
+            found.append((int(year), int(month), int(day)))
+        for month, day, year in TEXT_DATE.findall(text):
+            found.append((int(year), MONTHS[month], int(day)))
+        dates = []
+        for year, month, day in found:
+            try:
+                dates.append(date(year, month, day).isoformat())
+            except ValueError:
+                continue
+        return sorted(set(dates))
+
+    def extract(self, query: str) -> Tuple[Dict[str, Any], bool]:
+        text = query.lower()
+        slots: Dict[str, Any] = {}
+
+        dates = self._dates(text)
+        if dates:
+            slots['date_from'], slots['date_to'] = dates[0], dates[-1]
+        times = TIME.findall(text)
+        if len(times) == 1:
+            slots['start_time'] = f"{int(times[0][0]):02d}:{times[0][1]}"
+
+        for name, pattern in (('subject', self.subjects), ('location', self.locations)):
+            matches = pattern.findall(text) if pattern is not None else []
+            if len(matches) == 1:
+                slots[name] = matches[0]
+
+        ambiguous = False
+        for person in dict.fromkeys(self.people.findall(text) if self.people is not None else []):
+            roles = self.roles[person]
+            if len(roles) > 1:
+                roles = {role for role in roles if any(word in text for word in ROLE_WORDS[role])}
+            if len(roles) != 1:
+                ambiguous = True
+                continue
+            # The set may be self.roles[person] itself, so it is read, not popped
+            role = next(iter(roles))
+            if role == 'meeting_organizer':
+                slots[role] = person
+            else:
+                slots.setdefault(role, []).append(person)
+        return slots, ambiguous
+
+
+@dataclass
+class Route:
+    # CALENDAR, KNOWLEDGE, or None when the LLM has to choose the tool
+    intent: Optional[str]
+    scores: Dict[str, float]
+    slots: Dict[str, Any] = field(default_factory=dict)
+
+
+class IntentRouter:
+    '''
+    Routes a query to the meeting lookup or to a plain grounded answer without
+    the tool-choice completion.
+
+    The query embedding (the one retrieval already computed) is compared with
+    embedded PROTOTYPES; a label's score is the mean cosine similarity of its
+    top_k closest examples. A query is routed when the best label reaches
+    threshold and leads the other by margin, and its slots agree: calendar
+    needs at least one meeting filter, knowledge none. Everything else returns
+    Route(None, ...) and the LLM decides as before. calibrate() picks threshold
+    and margin for the loaded model from labeled queries.
+    '''
+
+    def __init__(self, encoder, calendar_df: pd.DataFrame, prototypes: Dict[str, List[str]] = PROTOTYPES,
+                 threshold: float = 0.4, margin: float = 0.05, top_k: int = 3):
+        self.encoder = encoder
+        self.prototypes = prototypes
+        self.threshold = threshold
+        self.margin = margin
+        self.top_k = top_k
+        self.slot_extractor = SlotExtractor(calendar_df)
+        self.labels = list(prototypes)
+        self.vectors = None
+        self.lock = threading.Lock()
+
+    def prepare(self):
+        # Embeds the prototypes once; the CachedEncoder keeps them on disk across restarts
+        with self.lock:
+            if self.vectors is None:
+                texts = [text for label in self.labels for text in self.prototypes[label]]
+                self.owners = np.repeat(np.arange(len(self.labels)), [len(self.prototypes[label]) for label in self.labels])
+                self.vectors = normalize_rows(self.encoder.encode(texts))
+
+    def scores(self, query_embedding: np.ndarray) -> Dict[str, float]:
+        self.prepare()
+        similarity = self.vectors @ normalize_rows(np.asarray(query_embedding).reshape(1, -1))[0]
+        scores = {}
+        for position, label in enumerate(self.labels):
+            closest = np.sort(similarity[self.owners == position])[::-1][:self.top_k]
+            scores[label] = float(closest.mean())
+        return scores
+
+    def route(self, query: str, query_embedding: Optional[np.ndarray] = None) -> Route:
+        if query_embedding is None:
+            query_embedding = self.encoder.encode_query(query)
+        scores = self.scores(query_embedding)
+        slots, ambiguous = self.slot_extractor.extract(query)
+        return Route(self._decide(scores, slots, ambiguous, self.threshold, self.margin), scores, slots)
+
+    @staticmethod
+    def _decide(scores: Dict[str, float], slots: Dict[str, Any], ambiguous: bool,
+                threshold: float, margin: float) -> Optional[str]:
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        best = ranked[0]
+        lead = scores[best] - (scores[ranked[1]] if len(ranked) > 1 else 0.0)
+        if ambiguous or scores[best] < threshold or lead < margin:
+            return None
+        if best == CALENDAR and slots:
+            return CALENDAR
+        if best == KNOWLEDGE and not slots:
+            return KNOWLEDGE
+        return None
+
+    def sweep(self, queries: List[str], intents: List[str],
+              embeddings: Optional[np.ndarray] = None) -> List[Dict[str, float]]:
+        '''
+        Precision (routed queries that went to their labeled intent) and skip
+        rate (queries routed without the tool-choice completion) of every
+        THRESHOLDS x MARGINS setting on a labeled query set.
+        '''
+        if embeddings is None:
+            embeddings = self.encoder.encode(queries)
+        observed = [(self.scores(embedding), *self.slot_extractor.extract(query))
+                    for query, embedding in zip(queries, embeddings)]
+        results = []
+        for threshold in THRESHOLDS:
+            for margin in MARGINS:
+                routed = [(self._decide(scores, slots, ambiguous, threshold, margin), intent)
+                          for (scores, slots, ambiguous), intent in zip(observed, intents)]
+                routed = [(route, intent) for route, intent in routed if route is not None]
+                correct = sum(route == intent for route, intent in routed)
+                results.append({'threshold': threshold, 'margin': margin,
+                                'precision': correct / len(routed) if routed else 1.0,
+                                'skip_rate': len(routed) / max(len(queries), 1)})
+        return results
+
+    def calibrate(self, queries: List[str], intents: List[str], min_precision: float = 1.0,
+                  embeddings: Optional[np.ndarray] = None) -> Optional[Dict[str, float]]:
+        '''
+        Sets threshold and margin to the swept setting that skips the most
+        tool-choice completions with at least min_precision, the strictest one
+        on ties, and returns it. Without such a setting nothing is routed.
+        '''
+        results = self.sweep(queries, intents, embeddings)
+        passing = [result for result in results if result['precision'] >= min_precision and result['skip_rate'] > 0]
+        if not passing:
+            print(f"Intent router: no setting reaches precision {min_precision:.2f}, every query goes to the LLM")
+            self.threshold = float('inf')
+            return None
+        best = max(passing, key=lambda result: (result['skip_rate'], result['threshold'], result['margin']))
+        self.threshold, self.margin = best['threshold'], best['margin']
+        print(f"Intent router: threshold {self.threshold}, margin {self.margin}, "
+              f"{best['skip_rate']:.0%} of {len(queries)} labeled queries routed at precision {best['precision']:.2f}")
+        return best
@@ -0,0 +1,232 @@
+import json
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from ingestion import sentence_hash, sentence_id
+from vector_store import VectorStore, normalize_rows
+
+
+class LocalVectorStore(VectorStore):
+    '''
+    In-process vector store for tests and small deployments, no Milvus needed.
+
+    Vectors are L2-normalized float32 rows, so inner product is cosine similarity.
+    FLAT search is exact: one BLAS matmul over all rows and argpartition for top-k.
+    IVF clusters rows with spherical k-means into nlist lists and scores only the
+    nprobe lists closest to the query. flush() compacts deleted rows and persists
+    <name>.vectors.npy / .ids.npy / .sentences.json / .metadata.json, the vectors
+    are memory-mapped on load. metadata holds each row's [source, offset].
+    '''
+
+    def __init__(self, model, directory: str, dim: int, collection_name: str = 'chatbott',
+                 index_type: str = 'FLAT', nlist: Optional[int] = None, nprobe: int = 8):
+        super().__init__(model)
+        if index_type not in ('FLAT', 'IVF'):
+            raise ValueError(f"Unsupported local index type: {index_type}")
+        self.directory = directory
+        self.collection_name = collection_name
+        self.dim = dim
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.lock = threading.RLock()
+
+        self.count = 0
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        self.sentences: List[str] = []
+        self.metadata: List[List] = []
+        self.row_of = {}
+        self.writable = True
+        self.ivf = None
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.collection_name}.{suffix}")
+
+    def create_collection(self, drop: bool = False) -> bool:
+        with self.lock:
+            if drop and os.path.exists(self._path('sentences.json')):
+                print(f"Emptying {self.collection_name}, its rows are not in the ingestion manifest")
+                # Without sentences.json the other files are no complete snapshot and get overwritten
+                os.remove(self._path('sentences.json'))
+            if not os.path.exists(self._path('sentences.json')):
+                self._reset()
+                return True
+
+            # Read-only memory maps until the first write
+            self.vectors = np.load(self._path('vectors.npy'), mmap_mode='r')
+            self.ids = np.load(self._path('ids.npy'))
+            with open(self._path('sentences.json'), 'r', encoding='utf-8') as f:
+                self.sentences = json.load(f)
+            try:
+                with open(self._path('metadata.json'), 'r', encoding='utf-8') as f:
+                    self.metadata = json.load(f)
+            except FileNotFoundError:
+                self.metadata = [['', row] for row in range(len(self.sentences))]
+            self.count = len(self.ids)
+            self.alive = np.ones(self.count, dtype=bool)
+            self.row_of = {int(id_): row for row, id_ in enumerate(self.ids.tolist())}
+            self.writable = False
+            self.ivf = None
+            return False
+
+    def _reset(self):
+        self.count = 0
+        self.vectors = np.empty((1024, self.dim), dtype=np.float32)
+        self.ids = np.empty(1024, dtype=np.int64)
+        self.alive = np.zeros(1024, dtype=bool)
+        self.sentences = []
+        self.metadata = []
+        self.row_of = {}
+        self.writable = True
+        self.ivf = None
+
+    def _reserve(self, extra: int):
+        # Amortized growth: buffers double instead of being reallocated per batch
+        needed = self.count + extra
+        if self.writable and needed <= len(self.ids):
+            return
+        capacity = max(needed, 2 * len(self.ids), 1024)
+        vectors = np.empty((capacity, self.dim), dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        alive = np.zeros(capacity, dtype=bool)
+        vectors[:self.count] = self.vectors[:self.count]
+        ids[:self.count] = self.ids[:self.count]
+        alive[:self.count] = self.alive[:self.count]
+        self.vectors, self.ids, self.alive = vectors, ids, alive
+        self.writable = True
+
+    def insert_embeddings(self, sentences: List[str], embeddings: np.ndarray, flush: bool = True,
+                          sources: Optional[List[str]] = None, offsets: Optional[List[int]] = None):
+        ids = [sentence_id(sentence_hash(sentence)) for sentence in sentences]
+        with self.lock:
+            self._delete(ids)
+            self._reserve(len(ids))
+            start, end = self.count, self.count + len(ids)
+            self.vectors[start:end] = normalize_rows(embeddings)
+            self.ids[start:end] = ids
+            self.alive[start:end] = True
+            self.sentences.extend(sentences)
+            self.metadata.extend([source, offset] for source, offset in zip(sources or [''] * len(ids), offsets or [0] * len(ids)))
+            for offset, id_ in enumerate(ids):
+                self.row_of[id_] = start + offset
+            self.count = end
+            self.ivf = None
+        if flush:
+            self.flush()
+
+    def delete_embeddings(self, ids: List[int], flush: bool = True):
+        with self.lock:
+            self._delete(ids)
+        if flush:
+            self.flush()
+
+    def _delete(self, ids: List[int]):
+        rows = [self.row_of.pop(id_) for id_ in ids if id_ in self.row_of]
+        if rows:
+            self._reserve(0)
+            self.alive[rows] = False
+            self.ivf = None
+
+    def fetch_sentences(self, ids: List[int]) -> List[str]:
+        with self.lock:
+            return [self.sentences[self.row_of[id_]] for id_ in ids if id_ in self.row_of]
+
+    def flush(self):
+        with self.lock:
+            rows = np.flatnonzero(self.alive[:self.count])
+            vectors = np.ascontiguousarray(self.vectors[rows])
+            ids = self.ids[rows]
+            sentences = [self.sentences[row] for row in rows]
+            metadata = [self.metadata[row] for row in rows]
+
+            os.makedirs(self.directory, exist_ok=True)
+            # Sentences last: their presence marks a complete snapshot
+            for suffix, array in (('vectors.npy', vectors), ('ids.npy', ids)):
+                with open(self._path(f"{suffix}.tmp"), 'wb') as f:
+                    np.save(f, array)
+                os.replace(self._path(f"{suffix}.tmp"), self._path(suffix))
+            with open(self._path('metadata.json.tmp'), 'w', encoding='utf-8') as f:
+                json.dump(metadata, f)
+            os.replace(self._path('metadata.json.tmp'), self._path('metadata.json'))
+            with open(self._path('sentences.json.tmp'), 'w', encoding='utf-8') as f:
+                json.dump(sentences, f)
+            os.replace(self._path('sentences.json.tmp'), self._path('sentences.json'))
+
+            self.create_collection()
+
+    def status(self) -> dict:
+        with self.lock:
+            rows = int(self.alive[:self.count].sum())
+        return {'ready': True, 'rows': rows, 'index_type': self.index_type}
+
+    def _build_ivf(self):
+        rows = np.flatnonzero(self.alive[:self.count])
+        nlist = min(self.nlist or max(1, int(np.sqrt(len(rows)))), max(len(rows), 1))
+        rng = np.random.default_rng(0)
+        sample = self.vectors[rng.choice(rows, min(len(rows), nlist * 64), replace=False)] if len(rows) else np.empty((0, self.dim), dtype=np.float32)
+
+        # Spherical k-means on a sample
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)] if len(sample) else np.zeros((1, self.dim), dtype=np.float32)
+        for _ in range(10):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        # Inverted lists as one row array sorted by list, plus offsets
+        assignment = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), 65536):
+            chunk = rows[start:start + 65536]
+            assignment[start:start + len(chunk)] = np.argmax(self.vectors[chunk] @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        self.ivf = (centroids, rows[order], offsets)
+
+    def _top_k(self, scores: np.ndarray, top_k: int) -> np.ndarray:
+        k = min(top_k, scores.shape[-1])
+        if k == 0:
+            return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+        top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+        return np.take_along_axis(top, order, axis=-1)
+
+    def _snapshot(self):
+        # Writers only append past count, or swap in new arrays and lists, so the
+        # first count rows stay valid after the lock is released; alive is
+        # updated in place and therefore copied
+        with self.lock:
+            if self.index_type == 'IVF' and self.ivf is None:
+                self._build_ivf()
+            return self.vectors[:self.count], self.alive[:self.count].copy(), self.ivf, self.sentences
+
+    def _search(self, embeddings: np.ndarray, top_k: int):
+        queries = normalize_rows(np.atleast_2d(embeddings))
+        vectors, alive, ivf, sentences = self._snapshot()
+        if self.index_type == 'FLAT':
+            scores = queries @ vectors.T
+            scores[:, ~alive] = -np.inf
+            top = self._top_k(scores, top_k)
+            return [row[np.isfinite(score[row])] for row, score in zip(top, scores)], sentences
+
+        centroids, list_rows, offsets = ivf
+        nearest_lists = self._top_k(queries @ centroids.T, self.nprobe)
+        results = []
+        for query, lists in zip(queries, nearest_lists):
+            candidates = np.concatenate([list_rows[offsets[c]:offsets[c + 1]] for c in lists])
+            scores = vectors[candidates] @ query
+            results.append(candidates[self._top_k(scores, top_k)])
+        return results, sentences
+
+    def search_rows(self, embeddings: np.ndarray, top_k: int = 5) -> List[np.ndarray]:
+        return self._search(embeddings, top_k)[0]
+
+    def search_embeddings(self, embeddings: np.ndarray, top_k: int = 5) -> List[List[str]]:
+        results, sentences = self._search(embeddings, top_k)
+        return [[sentences[row] for row in rows] for rows in results]
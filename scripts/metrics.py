@@ -0,0 +1,128 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Metrics:
+    '''
+    Per-stage latency histograms and counters of the query path.
+
+    observe()/timer() record seconds for a stage (query_encode, vector_search,
+    prompt_assembly, completion, tool_<name>, ...); percentiles are taken over
+    the last window samples of each stage, count and sum over the whole run.
+    inc() adds to a counter (tokens, calls, errors). Safe to use from any thread.
+    '''
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples: Dict[str, deque] = {}
+        self.counts: Dict[str, int] = {}
+        self.sums: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            if stage not in self.samples:
+                self.samples[stage] = deque(maxlen=self.window)
+                self.counts[stage] = 0
+                self.sums[stage] = 0.0
+            self.samples[stage].append(seconds)
+            self.counts[stage] += 1
+            self.sums[stage] += seconds
+
+    @contextmanager
+    def timer(self, stage: str):
+        # Failed calls are timed too, their cost is part of the latency users see
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, value: float = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.counts.clear()
+            self.sums.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            samples = {stage: np.array(values) for stage, values in self.samples.items()}
+            counts, sums, counters = dict(self.counts), dict(self.sums), dict(self.counters)
+
+        stages = {}
+        for stage, values in sorted(samples.items()):
+            stages[stage] = {'count': counts[stage], 'sum_s': sums[stage]}
+            for quantile in QUANTILES:
+                stages[stage][f"p{quantile * 100:g}_ms"] = float(np.quantile(values, quantile) * 1000)
+        return {'stages': stages, 'counters': dict(sorted(counters.items()))}
+
+    def prometheus(self, prefix: str = 'chatbot') -> str:
+        '''
+        Text exposition format: one summary of stage latencies, one counter per name.
+        '''
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_stage_seconds Latency of each stage of the query path",
+                 f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, values in snapshot['stages'].items():
+            for quantile in QUANTILES:
+                seconds = values[f"p{quantile * 100:g}_ms"] / 1000
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{quantile:g}"}} {seconds:.6g}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {values["sum_s"]:.6g}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        for name, value in snapshot['counters'].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value:g}")
+        return '\n'.join(lines) + '\n'
+
+    def write_jsonl(self, path: str):
+        # One snapshot per line, appended
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'time': time.time(), **self.snapshot()}) + '\n')
+
+
+class JsonlExporter:
+    '''
+    Appends a snapshot of metrics to path every interval seconds, and a last
+    one on stop().
+    '''
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 60):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.metrics.write_jsonl(self.path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self._write()
+
+
+# Shared by every component of the process, like the model and the Milvus connection
+METRICS = Metrics()
@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+_STOP = object()
+
+
+class MicroBatcher:
+    '''
+    Collects items submitted from many threads and processes them together.
+
+    A batch is closed once max_batch_size items are waiting or max_wait seconds
+    passed since its first item, then fn(items) runs on the batcher thread and
+    must return one result per item. Callers get a Future per item.
+    stats() reports the current queue depth and the batch sizes seen so far.
+    '''
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 32, max_wait: float = 0.005,
+                 name: str = "micro-batcher"):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.batch_size_counts = {}
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'batches': self.batches,
+                'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+                'max_batch_size': self.largest_batch,
+                'batch_size_counts': dict(sorted(self.batch_size_counts.items()))
+            }
+
+    def close(self):
+        self.queue.put((_STOP, None))
+        self.thread.join()
+
+    def _next_batch(self):
+        item, future = self.queue.get()
+        if item is _STOP:
+            return None
+        batch = [(item, future)]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item, future = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then stop
+                self.queue.put((_STOP, None))
+                break
+            batch.append((item, future))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._process(batch)
+
+    def _process(self, batch):
+        with self.stats_lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+        try:
+            results = self.fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
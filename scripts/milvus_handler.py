@@ -1,70 +1,234 @@
-from typing import List
-from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType
+import itertools
+import json
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+from pymilvus import connections, utility, Collection, CollectionSchema, FieldSchema, DataType, MilvusException
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from embedding_cache import CachedEncoder
+from index_tuner import IndexConfig, default_config, default_search_params
+from ingestion import sentence_hash, sentence_id
+from vector_store import VectorStore, normalize_rows
 
-class MilvusHandler:
-    def __init__(self, host: str, port: str, model: SentenceTransformer, collection_name: str = 'chatbott'):
+class MilvusHandler(VectorStore):
+    def __init__(self, host: str, port: str, model: CachedEncoder, dim: int, collection_name: str = 'chatbott',
+                 index_config: Optional[IndexConfig] = None, alias: str = 'default', pool_size: int = 1,
+                 connect_retries: int = 3):
+        super().__init__(model)
         self.host = host
+        self.dim = dim
         self.port = port
         self.collection_name = collection_name
         self.collection = None
-        self.model = model
-        
+        # Tuned config from index_tuner, or None to size the index from the row count
+        self.index_config = index_config
+        self.search_params = None
+
+        # One gRPC connection per alias; searches rotate over them, writes and admin use the first
+        self.alias = alias
+        self.aliases = [alias] + [f"{alias}-{i}" for i in range(1, max(1, pool_size))]
+        self.pool: List[Collection] = []
+        self.next_search = itertools.count()
+        self.connect_retries = connect_retries
+        self.lock = threading.Lock()
+        self.loaded = False
+
     def connect(self):
-        try:
-            connections.connect(alias="default", host=self.host, port=self.port)
-        except Exception as e:
-            print(f"Milvus connection error: {e}")
+        for attempt in range(1, self.connect_retries + 1):
+            try:
+                for alias in self.aliases:
+                    connections.connect(alias=alias, host=self.host, port=self.port)
+                return
+            except MilvusException as e:
+                print(f"Milvus connection error (attempt {attempt}/{self.connect_retries}): {e}")
+                if attempt == self.connect_retries:
+                    raise
+                time.sleep(min(2 ** attempt, 10))
+
+    def reconnect(self):
+        # Fresh connections and collection handles, then load again
+        with self.lock:
+            for alias in self.aliases:
+                connections.disconnect(alias)
+            self.connect()
+            self.collection = Collection(name=self.collection_name, using=self.alias)
+            self._open_pool()
+            self.load()
+
+    def _open_pool(self):
+        self.pool = [Collection(name=self.collection_name, using=alias) for alias in self.aliases]
+
+    def load(self):
+        # Once after an index build or on a warm start, not per search
+        self.collection.load()
+        self.loaded = True
+
+    def create_collection(self, drop: bool = False) -> bool:
+        if drop and utility.has_collection(self.collection_name, using=self.alias):
+            print(f"Dropping collection {self.collection_name}, its rows are not in the ingestion manifest")
+            Collection(name=self.collection_name, using=self.alias).drop()
+            self.loaded = False
+        if utility.has_collection(self.collection_name, using=self.alias):
+            self.collection = Collection(name=self.collection_name, using=self.alias)
+            fields = {field.name: field for field in self.collection.schema.fields}
+            if (not self.collection.schema.primary_field.auto_id and {'source', 'offset'} <= set(fields)
+                    and fields['embedding'].params.get('dim') == self.dim):
+                self._sync_index()
+                self._open_pool()
+                self.load()
+                return False
+            # Old layouts (auto generated ids, no source fields) can not be upserted into and
+            # vectors of another size can not be searched with this model, rebuild it
+            print(f"Dropping collection {self.collection_name} with an outdated schema")
+            self.collection.drop()
 
-    def create_collection(self):
-        # Automatically generated id, original sentance and the embedding
+        # Id derived from the sentence hash, original sentance, where it came from and the embedding
         fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
             FieldSchema(name="sentence", dtype=DataType.VARCHAR, max_length=65535),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
+            FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=2048),
+            FieldSchema(name="offset", dtype=DataType.INT64),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim)
         ]
         schema = CollectionSchema(fields, description="Wikipedia Sentences Collection")
-        self.collection = Collection(name=self.collection_name, schema=schema)
-        
-        # IP (Inner Product): Used to measure cosine similarity (larger inner product indicates more similarity).
-        # cosine_similarity — scikit-learn 1.5.2 documentation
-        index_params = {
-            "metric_type": "IP",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 2048} # Higher values improve search speed but consume more memory
-        }
-        self.collection.create_index("embedding", index_params)
+        self.collection = Collection(name=self.collection_name, schema=schema, using=self.alias)
+        self.apply_index(self.index_config or default_config(0))
+        self._open_pool()
+        self.load()
+        return True
+
+    def _sync_index(self):
+        if self.index_config is None:
+            # No tuned config: keep the index the collection already has until ensure_index resizes it
+            self.index_config = self._current_index() or default_config(self.collection.num_entities)
+        self.apply_index(self.index_config)
+
+    def _current_index(self) -> Optional[IndexConfig]:
+        if not self.collection.has_index():
+            return None
+        info = self.collection.index().params
+        params = info.get("params", {})
+        if isinstance(params, str):
+            params = json.loads(params)
+        params = {key: int(value) if str(value).isdigit() else value for key, value in params.items()}
+        # rows=0: not sized for the current collection yet
+        return IndexConfig(info["index_type"], params, default_search_params(info["index_type"], params))
+
+    def apply_index(self, config: IndexConfig):
+        '''
+        (Re)builds the embedding index with config and uses its search params.
+        IP on normalized vectors, so scores are cosine similarity.
+        '''
+        current = self._current_index()
+        if current is None or not current.same_index(config):
+            was_loaded = self.loaded
+            if current is not None:
+                self.collection.release()
+                self.loaded = False
+                self.collection.drop_index()
+            self.collection.create_index("embedding", config.index_params())
+            utility.wait_for_index_building_complete(self.collection_name, using=self.alias)
+            if was_loaded:
+                self.load()
+        self.index_config = config
+        self.search_params = config.search_param()
 
-    def insert_embeddings(self, sentences: List[str], embeddings: np.ndarray):
+    def ensure_index(self):
+        # A tuned config is kept; an untuned one follows the collection once it has grown or shrunk 2x
+        rows = self.collection.num_entities
+        config = self.index_config
+        if config.recall is not None or config.rows / 2 <= rows <= config.rows * 2:
+            return
+        target = default_config(rows)
+        if not target.same_index(config):
+            print(f"Rebuilding {self.collection_name} index as {target.index_type} for {rows} rows")
+        self.apply_index(target)
+
+    def insert_embeddings(self, sentences: List[str], embeddings: np.ndarray, flush: bool = True,
+                          sources: Optional[List[str]] = None, offsets: Optional[List[int]] = None):
+        # Upsert keyed by sentence hash so re-inserting a sentence never duplicates it.
+        # The float32 matrix is passed as is, without building a Python list copy first.
         data = [
-            sentences,  
-            embeddings.tolist()  
+            [sentence_id(sentence_hash(sentence)) for sentence in sentences],
+            sentences,
+            sources or [''] * len(sentences),
+            offsets or [0] * len(sentences),
+            normalize_rows(embeddings)
         ]
-        self.collection.insert(data)
+        self.collection.upsert(data)
+        if flush:
+            self.collection.flush()
+
+    def delete_embeddings(self, ids: List[int], batch_size: int = 1000, flush: bool = True):
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            self.collection.delete(f"id in {batch}")
+        if flush:
+            self.collection.flush()
+
+    def fetch_sentences(self, ids: List[int], batch_size: int = 1000) -> List[str]:
+        sentences = []
+        for start in range(0, len(ids), batch_size):
+            rows = self.collection.query(f"id in {ids[start:start + batch_size]}", output_fields=["sentence"])
+            sentences.extend(row["sentence"] for row in rows)
+        return sentences
+
+    def iter_entities(self, batch_size: int = 4096) -> Iterator[Tuple[List[str], np.ndarray]]:
+        # Every stored (sentences, embeddings) batch, paged with a query iterator
+        iterator = self.collection.query_iterator(batch_size=batch_size, output_fields=["sentence", "embedding"])
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    return
+                yield [row["sentence"] for row in rows], np.array([row["embedding"] for row in rows], dtype=np.float32)
+        finally:
+            iterator.close()
+
+    def flush(self):
         self.collection.flush()
 
     '''
-    Total Clusters: 2048
-    nprobe = 10  → Searches 10 clusters (fast, less precise)
-    nprobe = 50  → Searches 50 clusters (moderate speed, balanced precision)
-    nprobe = 200 → Searches 200 clusters (slow, high precision)
+    IVF: nprobe of nlist clusters are scanned (more is slower and more precise).
+    HNSW: ef candidates are kept during the graph walk. FLAT is exact.
+    scripts/tune_index.py measures recall and latency for each setting.
     '''
-    def search_similar_sentences(self, query: str, top_k: int = 5) -> List[str]:
-        self.collection.load()
-        query_embedding = self.model.encode([query])[0]
-        # Number of clusters
-        search_params = {
-            "metric_type": "IP",
-            "params": {"nprobe": 50}
-        }
-        results = self.collection.search(
-            data=[query_embedding],
+    def search_embeddings(self, embeddings: np.ndarray, top_k: int = 5) -> List[List[str]]:
+        if not self.loaded:
+            self.load()
+        try:
+            results = self._search(embeddings, top_k)
+        except MilvusException as e:
+            # Dropped connection or a restarted Milvus that lost the loaded collection
+            print(f"Milvus search failed, reconnecting: {e}")
+            self.reconnect()
+            results = self._search(embeddings, top_k)
+        return [[hit.entity.get('sentence') for hit in hits[:top_k]] for hits in results]
+
+    def _search(self, embeddings: np.ndarray, top_k: int):
+        collection = self.pool[next(self.next_search) % len(self.pool)] if self.pool else self.collection
+        return collection.search(
+            data=normalize_rows(embeddings),
             anns_field="embedding",
-            param=search_params, # Cos and clusters
+            param=self.search_params, # Cos and clusters
             limit=top_k, # Max results
             output_fields=["sentence"] # Original sentance
         )
-        return [hit.entity.get('sentence') for hit in results[0][:top_k]]
 
-    
\ No newline at end of file
+    def status(self) -> dict:
+        try:
+            index = utility.index_building_progress(self.collection_name, using=self.alias)
+            loading = utility.loading_progress(self.collection_name, using=self.alias).get('loading_progress')
+        except MilvusException as e:
+            return {'ready': False, 'loaded': self.loaded, 'error': str(e)}
+        pending = index.get('pending_index_rows', 0)
+        return {
+            'ready': self.loaded and not pending and str(loading).rstrip('%') == '100',
+            'loaded': self.loaded,
+            'loading_progress': loading,
+            'index_type': self.index_config.index_type,
+            'indexed_rows': index.get('indexed_rows'),
+            'total_rows': index.get('total_rows'),
+            'pending_index_rows': pending,
+            'connections': len(self.aliases)
+        }
@@ -0,0 +1,176 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockChatServer:
+    '''
+    Local stand-in for the Azure chat-completions endpoint.
+
+    Every request waits latency seconds. A request that offers tools and ends
+    with the user message is answered with tool_calls calls to
+    interact_with_wikipedia_db; anything else gets a plain text answer.
+    With "stream": true the answer is sent as server-sent events, one word
+    every token_latency seconds.
+    '''
+
+    def __init__(self, latency: float = 0.2, tool_calls: int = 2, host: str = '127.0.0.1', port: int = 0,
+                 token_latency: float = 0.0, answer_words: int = 0):
+        self.latency = latency
+        self.tool_calls = tool_calls
+        self.token_latency = token_latency
+        # Pads the text answer to this many words, so streams have something to stream
+        self.answer_words = answer_words
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockChatServer':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def completion(self, body: dict) -> dict:
+        messages = body.get('messages', [])
+        if body.get('tools') and messages and messages[-1].get('role') == 'user' and self.tool_calls:
+            message = {
+                'role': 'assistant',
+                'content': None,
+                'tool_calls': [
+                    {
+                        'id': f'call_{i}',
+                        'type': 'function',
+                        'function': {'name': 'interact_with_wikipedia_db', 'arguments': json.dumps({'query': f'topic {i}'})}
+                    }
+                    for i in range(self.tool_calls)
+                ]
+            }
+            finish_reason = 'tool_calls'
+        else:
+            content = f"Mock answer after {len(messages)} messages."
+            padding = self.answer_words - len(content.split())
+            if padding > 0:
+                content += ''.join(f" word{i}" for i in range(padding))
+            message = {'role': 'assistant', 'content': content}
+            finish_reason = 'stop'
+
+        return {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'mock'),
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        }
+
+    def stream_chunks(self, completion: dict):
+        # The same completion cut into chat.completion.chunk deltas
+        choice = completion['choices'][0]
+        message = choice['message']
+
+        def chunk(delta: dict, finish_reason=None) -> dict:
+            return {
+                'id': completion['id'],
+                'object': 'chat.completion.chunk',
+                'created': completion['created'],
+                'model': completion['model'],
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+
+        yield chunk({'role': 'assistant', 'content': ''})
+        for index, call in enumerate(message.get('tool_calls') or []):
+            yield chunk({'tool_calls': [{'index': index, 'id': call['id'], 'type': 'function',
+                                         'function': {'name': call['function']['name'], 'arguments': ''}}]})
+            arguments = call['function']['arguments']
+            middle = len(arguments) // 2
+            for part in (arguments[:middle], arguments[middle:]):
+                yield chunk({'tool_calls': [{'index': index, 'function': {'arguments': part}}]})
+        if message.get('content'):
+            for i, word in enumerate(message['content'].split(' ')):
+                yield chunk({'content': word if i == 0 else ' ' + word})
+        yield chunk({}, choice['finish_reason'])
+
+    def _make_handler(self):
+        mock = self
+
+        class ChatHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.split('?')[0].endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                with mock.lock:
+                    mock.requests += 1
+                time.sleep(mock.latency)
+
+                completion = mock.completion(body)
+                if body.get('stream'):
+                    self._send_stream(completion)
+                    return
+
+                payload = json.dumps(completion).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, completion: dict):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for index, chunk in enumerate(mock.stream_chunks(completion)):
+                        if index and mock.token_latency:
+                            time.sleep(mock.token_latency)
+                        self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading the stream
+                    self.close_connection = True
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return ChatHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Azure chat-completions server")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--tool-calls', type=int, default=2)
+    parser.add_argument('--token-latency', type=float, default=0.02, help="Seconds between streamed words")
+    parser.add_argument('--answer-words', type=int, default=50)
+    args = parser.parse_args()
+
+    mock = MockChatServer(args.latency, args.tool_calls, port=args.port,
+                          token_latency=args.token_latency, answer_words=args.answer_words)
+    print(f"Mock chat completions on {mock.endpoint} (set AZURE_ENDPOINT to this)")
+    mock.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
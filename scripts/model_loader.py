@@ -0,0 +1,253 @@
+import inspect
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# float32 PyTorch, int8 dynamically quantized PyTorch, or the model exported to ONNX Runtime
+BACKENDS = ('torch', 'int8', 'onnx')
+
+
+def _pooling_mode(pooling) -> str:
+    mode = getattr(pooling, 'pooling_mode', None)
+    if isinstance(mode, str):
+        return mode
+    # sentence-transformers before 5.0 keeps one flag per mode
+    return pooling.get_pooling_mode_str()
+
+
+def set_torch_threads(threads: int):
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def quantize_int8(model):
+    '''
+    Copy of a SentenceTransformer with its Linear layers quantized to int8
+    (weights ahead of time, activations per batch). encode() works as before.
+    '''
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_onnx(model, directory: str):
+    '''
+    Exports the transformer of a SentenceTransformer to directory/model.onnx,
+    with its tokenizer and an onnx_config.json describing pooling and
+    normalization, so OnnxEncoder can run it without torch.
+    '''
+    import torch
+
+    tokenizer = model.tokenizer
+    sample = tokenizer(["An example sentence.", "Another one, a little longer."], padding=True, return_tensors='pt')
+    names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(names, inputs)))[0]
+
+    pooling = next(module for module in model if type(module).__name__ == 'Pooling')
+    config = {
+        'inputs': names,
+        'pooling': _pooling_mode(pooling),
+        'normalize': any(type(module).__name__ == 'Normalize' for module in model),
+        'max_seq_length': model.max_seq_length,
+        'dim': model.get_sentence_embedding_dimension()
+    }
+    if config['pooling'] not in ('mean', 'cls', 'max'):
+        raise ValueError(f"Pooling mode {config['pooling']} is not supported by the ONNX backend")
+
+    os.makedirs(directory, exist_ok=True)
+    axes = {name: {0: 'batch', 1: 'sequence'} for name in names + ['token_embeddings']}
+    # The TorchScript exporter: newer torch defaults to the dynamo one, which needs onnxscript
+    options = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    tmp_path = os.path.join(directory, 'model.onnx.tmp')
+    with torch.no_grad():
+        torch.onnx.export(TokenEmbeddings(model[0].auto_model).eval(), tuple(sample[name] for name in names), tmp_path,
+                          input_names=names, output_names=['token_embeddings'], dynamic_axes=axes,
+                          opset_version=14, **options)
+    os.replace(tmp_path, os.path.join(directory, 'model.onnx'))
+    tokenizer.save_pretrained(directory)
+    # Written last: its presence marks a complete export
+    with open(os.path.join(directory, 'onnx_config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+
+class OnnxEncoder:
+    '''
+    Sentence encoder on ONNX Runtime over a directory written by export_onnx.
+
+    Same encode() as SentenceTransformer for our callers. Each batch is made of
+    sentences of similar length so little time goes into padding tokens.
+    '''
+
+    def __init__(self, directory: str, threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, 'onnx_config.json'), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(os.path.join(directory, 'model.onnx'), options,
+                                                    providers=['CPUExecutionProvider'])
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+        self.max_seq_length = self.config['max_seq_length']
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config['dim']
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        features = self.tokenizer(sentences, padding=True, truncation=True, max_length=self.max_seq_length,
+                                  return_tensors='np')
+        inputs = {name: features[name].astype(np.int64) for name in self.config['inputs']}
+        tokens = self.session.run(None, inputs)[0]
+        mask = features['attention_mask'][..., None].astype(np.float32)
+
+        if self.config['pooling'] == 'cls':
+            embeddings = tokens[:, 0]
+        elif self.config['pooling'] == 'max':
+            embeddings = np.where(mask > 0, tokens, -1e9).max(axis=1)
+        else:
+            embeddings = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.config['normalize']:
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self.encode([sentences], batch_size)[0]
+        embeddings = np.empty((len(sentences), self.config['dim']), dtype=np.float32)
+        order = np.argsort([-len(sentence) for sentence in sentences], kind='stable')
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([sentences[i] for i in rows])
+        return embeddings
+
+
+def cosine_drift(reference: np.ndarray, vectors: np.ndarray) -> Dict[str, float]:
+    '''
+    Row-wise cosine similarity of vectors to the reference (float32) vectors.
+    '''
+    def unit(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    cosine = (unit(reference) * unit(vectors)).sum(axis=1)
+    return {'mean': float(cosine.mean()), 'p1': float(np.percentile(cosine, 1)), 'min': float(cosine.min())}
+
+
+class PreloadedModel:
+    '''
+    Sentence encoder loaded on a background thread.
+
+    The model is read from a local snapshot under directory, written there on
+    the first load, so later starts skip the Hugging Face hub lookups and work
+    offline. backend is one of BACKENDS; the ONNX export is written once next to
+    the snapshot and later loaded without torch. threads bounds the encoder's
+    intra-op threads (0 keeps the library default). Calls that need the model
+    (encode, tokenizer) wait for the load to finish. The embedding dimension is
+    stored next to the snapshot, so it is known before the load.
+    '''
+
+    def __init__(self, model_name: str, directory: str, background: bool = True, backend: str = 'torch',
+                 threads: int = 0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown encoder backend {backend}, expected one of {', '.join(BACKENDS)}")
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.directory = directory
+        self.path = os.path.join(directory, re.sub(r'[^\w.-]', '_', model_name))
+        self.onnx_path = os.path.join(self.path, 'onnx')
+        self._model = None
+        self._error: Optional[BaseException] = None
+        self._loaded = threading.Event()
+        if background:
+            threading.Thread(target=self._load, name="model-preload", daemon=True).start()
+        else:
+            self._load()
+
+    @property
+    def name(self) -> str:
+        # Vectors of another backend differ slightly, so caches and manifests keep them apart
+        return self.model_name if self.backend == 'torch' else f"{self.model_name}@{self.backend}"
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, 'chatbot_meta.json')
+
+    def has_snapshot(self) -> bool:
+        return os.path.exists(self._meta_path())
+
+    def _load(self):
+        try:
+            if self.backend == 'onnx' and os.path.exists(os.path.join(self.onnx_path, 'onnx_config.json')):
+                self._model = OnnxEncoder(self.onnx_path, self.threads)
+                return
+
+            # torch and transformers are only imported here, off the main thread
+            from sentence_transformers import SentenceTransformer
+            set_torch_threads(self.threads)
+            if self.has_snapshot():
+                model = SentenceTransformer(self.path)
+            else:
+                model = SentenceTransformer(self.model_name)
+                self._save_snapshot(model)
+
+            if self.backend == 'onnx':
+                export_onnx(model, self.onnx_path)
+                self._model = OnnxEncoder(self.onnx_path, self.threads)
+            elif self.backend == 'int8':
+                self._model = quantize_int8(model)
+            else:
+                self._model = model
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._loaded.set()
+
+    def _save_snapshot(self, model):
+        try:
+            model.save(self.path)
+            with open(self._meta_path(), 'w', encoding='utf-8') as f:
+                json.dump({'model': self.model_name, 'dim': model.get_sentence_embedding_dimension()}, f)
+        except OSError as e:
+            print(f"Could not write model snapshot {self.path}: {e}")
+
+    def ready(self) -> bool:
+        return self._loaded.is_set() and self._error is None
+
+    def wait(self):
+        self._loaded.wait()
+        if self._error is not None:
+            raise RuntimeError(f"Loading {self.name} failed: {self._error}") from self._error
+
+    @property
+    def model(self):
+        self.wait()
+        return self._model
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    def encode(self, *args, **kwargs):
+        return self.model.encode(*args, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if not self._loaded.is_set() and self.has_snapshot():
+            try:
+                with open(self._meta_path(), 'r', encoding='utf-8') as f:
+                    return int(json.load(f)['dim'])
+            except (OSError, ValueError, KeyError):
+                pass
+        return self.model.get_sentence_embedding_dimension()
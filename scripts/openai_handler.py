@@ -1,18 +1,75 @@
+import asyncio
 import json
-from typing import List, Optional, Dict, Any
-from openai import AzureOpenAI
+import queue
+import threading
+from collections import deque
+from typing import Iterator, List, Optional, Dict, Any
+
+import numpy as np
+from openai import AzureOpenAI, AsyncAzureOpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
 from csv_data_fetcher import CSVDataFetcher
+from calendar_index import CalendarIndex
+from intent_router import CALENDAR, IntentRouter
+from metrics import METRICS
+from response_cache import ResponseCache
+from prompt_builder import PromptBuilder
+from response_stream import ResponseStream
+
+
+def _add_tool_call_deltas(calls: Dict[int, Dict[str, str]], deltas):
+    # Streamed tool calls arrive in pieces keyed by index: id and name once, arguments in fragments
+    for delta in deltas:
+        call = calls.setdefault(delta.index, {'id': '', 'name': '', 'arguments': ''})
+        if delta.id:
+            call['id'] = delta.id
+        if delta.function is not None:
+            if delta.function.name:
+                call['name'] += delta.function.name
+            if delta.function.arguments:
+                call['arguments'] += delta.function.arguments
+
+
+def _record_usage(response):
+    # Token counts reported by the service, not every deployment sends them
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        METRICS.inc('completion_prompt_tokens', usage.prompt_tokens or 0)
+        METRICS.inc('completion_tokens', usage.completion_tokens or 0)
+
+
+def _tool_calls(calls: Dict[int, Dict[str, str]]) -> List[ChatCompletionMessageToolCall]:
+    return [
+        ChatCompletionMessageToolCall(id=call['id'], type='function',
+                                      function={'name': call['name'], 'arguments': call['arguments']})
+        for _, call in sorted(calls.items())
+    ]
 
 
 class OpenAIHandler:
-    def __init__(self, azure_endpoint: str, azure_api_key: str, api_version: str, calendar_csv_path: str):
-        self.client = AzureOpenAI(
+    def __init__(self, azure_endpoint: str, azure_api_key: str, api_version: str, calendar_csv_path: str,
+                 model: str = "gpt-4o-mini", client=None, response_cache: Optional[ResponseCache] = None,
+                 prompt_builder: Optional[PromptBuilder] = None, csv_data_fetcher: Optional[CSVDataFetcher] = None,
+                 router: Optional[IntentRouter] = None):
+        # client can be injected (e.g. a stub in tests), otherwise the Azure client is created
+        self.client = client or AzureOpenAI(
             azure_endpoint=azure_endpoint,
             api_key=azure_api_key,
             api_version=api_version
         )
-        self.csv_data_fetcher = CSVDataFetcher(calendar_csv_path)
+        self.model = model
+        self.response_cache = response_cache
+        # Token budget for retrieved context and tool outputs
+        self.prompt_builder = prompt_builder or PromptBuilder(model)
+        # The caller's already loaded calendar is reused instead of reading the CSV again
+        self.csv_data_fetcher = csv_data_fetcher or CSVDataFetcher(calendar_csv_path)
+        self.calendar_index = CalendarIndex(self.csv_data_fetcher.df)
         self.tools = self._initialize_tools()
+        # Answers queries it is sure about without the tool-choice completion
+        self.router = router
+        # Time to first token of recent streamed answers, in seconds
+        self.ttfts = deque(maxlen=1000)
+        self.stats_lock = threading.Lock()
 
     def _initialize_tools(self) -> List[Dict[str, Any]]:
         return [
@@ -29,6 +86,8 @@ class OpenAIHandler:
                             "start_time": {"type": "string", "description": "Start time of the event (HH:MM format)"},
                             "end_date": {"type": "string", "description": "End date of the event (YYYY-MM-DD format)"},
                             "end_time": {"type": "string", "description": "End time of the event (HH:MM format)"},
+                            "date_from": {"type": "string", "description": "Only events starting on or after this date (YYYY-MM-DD format)"},
+                            "date_to": {"type": "string", "description": "Only events starting on or before this date (YYYY-MM-DD format)"},
                             "all_day_event": {"type": "boolean", "description": "Whether this is an all-day event"},
                             "reminder": {"type": "string", "description": "Is reminder on or off"},
                             "meeting_organizer": {"type": "string", "description": "Who is meeting organizer"},
@@ -61,115 +120,386 @@ class OpenAIHandler:
             }
         ]
 
-    def generate_response(self, query: str, context: List[str]) -> Optional[str]:
+    def generate_response(self, query: str, context: List[str], query_embedding=None) -> Optional[str]:
+        '''
+        query_embedding is the retrieval embedding of query, it enables semantic cache hits.
+        '''
+        if self.response_cache is not None:
+            cached = self.response_cache.get(query, context, self.model, query_embedding)
+            if cached is not None:
+                return cached
+
+        response = self._generate_response(query, context, query_embedding)
+        if response is not None and self.response_cache is not None:
+            self.response_cache.put(query, context, self.model, response, query_embedding)
+        return response
+
+    def generate_response_stream(self, query: str, context: List[str], query_embedding=None) -> ResponseStream:
+        '''
+        Same answer as generate_response, yielded token by token. The tool-call
+        turn is resolved first; tokens come from whichever completion answers.
+        '''
+        if self.response_cache is not None:
+            cached = self.response_cache.get(query, context, self.model, query_embedding)
+            if cached is not None:
+                return ResponseStream(iter([cached]), self._record_stream)
+
+        def on_complete(stream: ResponseStream):
+            self._record_stream(stream)
+            if stream.parts and self.response_cache is not None:
+                self.response_cache.put(query, context, self.model, stream.text, query_embedding)
+
+        return ResponseStream(self._stream_tokens(query, context, query_embedding), on_complete)
+
+    def _record_stream(self, stream: ResponseStream):
+        if stream.ttft is not None:
+            METRICS.observe('ttft', stream.ttft)
+            with self.stats_lock:
+                self.ttfts.append(stream.ttft)
+
+    def stream_stats(self) -> dict:
+        with self.stats_lock:
+            ttfts = np.array(self.ttfts)
+        if not len(ttfts):
+            return {'streams': 0}
+        return {
+            'streams': len(ttfts),
+            'ttft_p50_ms': float(np.percentile(ttfts, 50) * 1000),
+            'ttft_p95_ms': float(np.percentile(ttfts, 95) * 1000)
+        }
+
+    def _build_messages(self, query: str, context: List[str]) -> List[Dict[str, Any]]:
+        return self.prompt_builder.build_messages(query, context)
+
+    def _routed_request(self, query: str, context: List[str], query_embedding=None) -> Optional[Dict[str, Any]]:
+        '''
+        Arguments of the single completion that answers a query the router is
+        sure about, or None when the model has to choose the tool.
+        '''
+        if self.router is None:
+            return None
+        # With the retrieval embedding passed in this is numpy work only, cheap enough for the event loop
+        with METRICS.timer('intent_routing'):
+            route = self.router.route(query, query_embedding)
+            intent, rows = route.intent, None
+            if intent == CALENDAR:
+                try:
+                    rows = self.calendar_index.search(route.slots)
+                except ValueError:
+                    rows = []
+                # Nothing matched the extracted filters: the model may read the query differently
+                if not len(rows):
+                    intent = None
+            elif not context:
+                # A knowledge answer is only grounded with retrieved passages
+                intent = None
+        METRICS.inc(f"route_{intent or 'llm'}")
+        if intent is None:
+            return None
+
+        messages = self._build_messages(query, context)
+        if intent == CALENDAR:
+            # Recorded as the meeting tool call the model would have made
+            tool_call = ChatCompletionMessageToolCall(id='call_router', type='function',
+                                                      function={'name': 'interact_with_meeting_db',
+                                                                'arguments': json.dumps(route.slots)})
+            self._append_tool_result(messages, tool_call, self.calendar_index.to_json(rows))
+            return {'messages': messages, 'tools': self.tools, 'max_tokens': 500, 'temperature': 0}
+        # Knowledge: answered from the retrieved passages, no tool offered
+        return {'messages': messages, 'max_tokens': 500, 'temperature': 0}
+
+    def _append_tool_result(self, messages: List[Dict[str, Any]], tool_call, function_response: Optional[str]):
+        if function_response:
+            function_response = self.prompt_builder.trim_tool_output(function_response)
+            # Add the function call and its response to the message history
+            messages.append(
+                {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            )
+            messages.append(
+                {"role": "tool", "tool_call_id": tool_call.id, "content": function_response}
+            )
+
+    def _execute_tool(self, tool_call, context: List[str]) -> Optional[str]:
+        function_name = tool_call.function.name
+        function_args = json.loads(tool_call.function.arguments)
+        METRICS.inc('tool_calls')
+
+        # Execute the right function based on the tool call
+        with METRICS.timer(f"tool_{function_name}"):
+            if function_name == "interact_with_wikipedia_db":
+                return self.interact_with_wikipedia_db(function_args["query"], context)
+            elif function_name == "interact_with_meeting_db":
+                return self.interact_with_meeting_db(function_args)
+        return None
+
+    def _create(self, **kwargs):
+        METRICS.inc('completions')
+        with METRICS.timer('completion'):
+            response = self.client.chat.completions.create(model=self.model, **kwargs)
+        _record_usage(response)
+        return response
+
+    def _generate_response(self, query: str, context: List[str], query_embedding=None) -> Optional[str]:
         try:
-            context_str = "\n".join(context)
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant using provided context to answer queries. Use the available tools when appropriate to fetch specific information."
-                },
-                {
-                    "role": "user",
-                    "content": f"Context:\n{context_str}\n\nQuery: {query}\n\nResponse:"
-                }
-            ]
+            routed = self._routed_request(query, context, query_embedding)
+            if routed is not None:
+                return self._create(**routed).choices[0].message.content
+
+            messages = self._build_messages(query, context)
             
-            initial_response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=self.tools
-            )
+            initial_response = self._create(messages=messages, tools=self.tools)
 
             if not initial_response.choices[0].message.tool_calls:
-                print("None")
                 return initial_response.choices[0].message.content
 
             for tool_call in initial_response.choices[0].message.tool_calls:
-                function_name = tool_call.function.name
-                print(function_name)
-                function_args = json.loads(tool_call.function.arguments)
-                
-                # Execute the right function based on the tool call
-                if function_name == "interact_with_wikipedia_db":
-                    function_response = self.interact_with_wikipedia_db(function_args["query"], context)
-                elif function_name == "interact_with_meeting_db":
-                    function_response = self.interact_with_meeting_db(function_args)
-                
-                if function_response:
-                    # Add the function call and its response to the message history
-                    messages.append(
-                        {"role": "assistant", "content": None, "tool_calls": [tool_call]}
-                    )
-                    messages.append(
-                        {"role": "tool", "tool_call_id": tool_call.id, "content": function_response}
-                    )
+                self._append_tool_result(messages, tool_call, self._execute_tool(tool_call, context))
 
             # Generate final response incorporating the tool results
-            final_response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=self.tools,
-                max_tokens=500,
-                temperature=0
-            )
-            
+            final_response = self._create(messages=messages, tools=self.tools, max_tokens=500, temperature=0)
+
             return final_response.choices[0].message.content
 
         except Exception as e:
+            METRICS.inc('completion_errors')
             print(f"Error generating response: {str(e)}")
             return None
 
+    def _stream(self, calls: Dict[int, Dict[str, str]], **kwargs) -> Iterator[str]:
+        # Yields content deltas; tool call deltas are collected into calls
+        METRICS.inc('completions')
+        with METRICS.timer('completion'):
+            stream = self.client.chat.completions.create(model=self.model, stream=True, **kwargs)
+            try:
+                for chunk in stream:
+                    if not chunk.choices:
+                        # Azure sends content filter results in chunks without choices
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        METRICS.inc('completion_chunks')
+                        yield delta.content
+                    if delta.tool_calls:
+                        _add_tool_call_deltas(calls, delta.tool_calls)
+            finally:
+                # Releases the connection when the consumer stops early
+                if hasattr(stream, 'close'):
+                    stream.close()
+
+    def _stream_tokens(self, query: str, context: List[str], query_embedding=None) -> Iterator[str]:
+        routed = self._routed_request(query, context, query_embedding)
+        if routed is not None:
+            yield from self._stream({}, **routed)
+            return
+
+        messages = self._build_messages(query, context)
+
+        calls = {}
+        # A direct answer streams from the first completion
+        yield from self._stream(calls, messages=messages, tools=self.tools)
+        if not calls:
+            return
+
+        for tool_call in _tool_calls(calls):
+            self._append_tool_result(messages, tool_call, self._execute_tool(tool_call, context))
+        yield from self._stream({}, messages=messages, tools=self.tools, max_tokens=500, temperature=0)
+
     def interact_with_meeting_db(self, query: Dict[str, Any]) -> str:
-        df = self.csv_data_fetcher.df
-        filtered_df = df.copy()
+        try:
+            rows = self.calendar_index.search(query)
+        except ValueError as e:
+            return f"Invalid meeting filter: {e}"
 
-        if 'subject' in query:
-            filtered_df = filtered_df[filtered_df['Subject'].str.contains(query['subject'], case=False, na=False)]
+        if len(rows):
+            return self.calendar_index.to_json(rows)
+        else:
+            return "No matching events found."
 
-        if 'start_date' in query:
-            filtered_df = filtered_df[filtered_df['Start Date'] == query['start_date']]
+    def interact_with_wikipedia_db(self, query: str, context: List[str]) -> Optional[str]:
+        # The retrieved passages are already in the prompt, so point the model at them
+        # instead of sending them again in a second completion
+        if not context:
+            return "No Wikipedia passages were retrieved for this query."
+        return "The Wikipedia passages retrieved for this query are in the Context of the user message. Answer from them."
 
-        if 'end_date' in query:
-            filtered_df = filtered_df[filtered_df['End Date'] == query['end_date']]
 
-        if 'start_time' in query:
-            filtered_df = filtered_df[filtered_df['Start Time'] == query['start_time']]
+class AsyncOpenAIHandler(OpenAIHandler):
+    '''
+    OpenAIHandler on the async client.
 
-        if 'end_time' in query:
-            filtered_df = filtered_df[filtered_df['End Time'] == query['end_time']]
+    Tool calls returned together run concurrently: each one on a worker thread,
+    gathered with asyncio.gather, so a turn waits about as long as its slowest
+    tool. At most max_concurrency completions are in flight across all requests,
+    creating a completion and every read of a streamed one are bounded by
+    request_timeout seconds.
+    generate_response() stays a blocking facade for existing callers; it runs the
+    coroutine on a private event loop thread, so it is safe to call from any thread.
+    '''
 
-        if 'meeting_organizer' in query:
-            filtered_df = filtered_df[filtered_df['Meeting Organizer'].str.contains(query['meeting_organizer'], case=False, na=False)]
+    def __init__(self, azure_endpoint: str, azure_api_key: str, api_version: str, calendar_csv_path: str,
+                 model: str = "gpt-4o-mini", client=None, response_cache: Optional[ResponseCache] = None,
+                 prompt_builder: Optional[PromptBuilder] = None, csv_data_fetcher: Optional[CSVDataFetcher] = None,
+                 async_client=None, max_concurrency: int = 16, request_timeout: float = 30,
+                 router: Optional[IntentRouter] = None):
+        super().__init__(azure_endpoint, azure_api_key, api_version, calendar_csv_path,
+                         model=model, client=client, response_cache=response_cache, prompt_builder=prompt_builder,
+                         csv_data_fetcher=csv_data_fetcher, router=router)
+        self.async_client = async_client or AsyncAzureOpenAI(
+            azure_endpoint=azure_endpoint,
+            api_key=azure_api_key,
+            api_version=api_version
+        )
+        self.request_timeout = request_timeout
 
-        if 'required_attendees' in query:
-            filtered_df = filtered_df[filtered_df['Required Attendees'].str.contains(query['required_attendees'], case=False, na=False)]
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="openai-loop", daemon=True)
+        self.loop_thread.start()
+        # Created on the loop it guards
+        self.semaphore = asyncio.run_coroutine_threadsafe(self._make_semaphore(max_concurrency), self.loop).result()
 
-        if 'location' in query:
-            filtered_df = filtered_df[filtered_df['Location'].str.contains(query['location'], case=False, na=False)]
+    @staticmethod
+    async def _make_semaphore(limit: int) -> asyncio.Semaphore:
+        return asyncio.Semaphore(limit)
 
-        if 'priority' in query:
-            filtered_df = filtered_df[filtered_df['Priority'].str.contains(query['priority'], case=False, na=False)]
+    def generate_response(self, query: str, context: List[str], query_embedding=None) -> Optional[str]:
+        return asyncio.run_coroutine_threadsafe(self.agenerate_response(query, context, query_embedding), self.loop).result()
 
-        if not filtered_df.empty:
-            print(filtered_df.to_string(index=False))
-            return filtered_df.to_string(index=False)
-        else:
-            return "No matching events found."
+    def _stream_tokens(self, query: str, context: List[str], query_embedding=None) -> Iterator[str]:
+        # Tokens are produced on the loop thread and handed over through a queue
+        tokens = queue.Queue()
+        done = object()
 
-    def interact_with_wikipedia_db(self, query: str, context: List[str]) -> Optional[str]:
-        context_str = "\n".join(context)
-        prompt = f"Context:\n{context_str}\n\nQuery: {query}\n\nResponse:"
-        
+        async def pump():
+            try:
+                async for token in self._astream_tokens(query, context, query_embedding):
+                    tokens.put(token)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                tokens.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "system", "content": "You are a helpful assistant using provided context to answer queries."},
-                          {"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0
-            )
-            return response.choices[0].message.content
+            while True:
+                item = tokens.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # The consumer stopped early: stop reading the completion
+            future.cancel()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.async_client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+
+    async def agenerate_response(self, query: str, context: List[str], query_embedding=None) -> Optional[str]:
+        if self.response_cache is not None:
+            cached = self.response_cache.get(query, context, self.model, query_embedding)
+            if cached is not None:
+                return cached
+
+        response = await self._agenerate_response(query, context, query_embedding)
+        if response is not None and self.response_cache is not None:
+            self.response_cache.put(query, context, self.model, response, query_embedding)
+        return response
+
+    async def _complete(self, **kwargs):
+        METRICS.inc('completions')
+        async with self.semaphore:
+            with METRICS.timer('completion'):
+                response = await asyncio.wait_for(
+                    self.async_client.chat.completions.create(model=self.model, **kwargs),
+                    self.request_timeout
+                )
+        _record_usage(response)
+        return response
+
+    async def _agenerate_response(self, query: str, context: List[str], query_embedding=None) -> Optional[str]:
+        try:
+            routed = self._routed_request(query, context, query_embedding)
+            if routed is not None:
+                return (await self._complete(**routed)).choices[0].message.content
+
+            messages = self._build_messages(query, context)
+
+            initial_response = await self._complete(messages=messages, tools=self.tools)
+
+            tool_calls = initial_response.choices[0].message.tool_calls
+            if not tool_calls:
+                return initial_response.choices[0].message.content
+
+            await self._aexecute_tools(messages, tool_calls, context)
+
+            final_response = await self._complete(messages=messages, tools=self.tools, max_tokens=500, temperature=0)
+            return final_response.choices[0].message.content
+
         except Exception as e:
-            print(f"Error generating response: {e}")
+            METRICS.inc('completion_errors')
+            print(f"Error generating response: {e!r}")
             return None
+
+    async def _astream(self, calls: Dict[int, Dict[str, str]], **kwargs):
+        # The slot is held until the stream is read to the end
+        METRICS.inc('completions')
+        async with self.semaphore:
+            with METRICS.timer('completion'):
+                stream = await asyncio.wait_for(
+                    self.async_client.chat.completions.create(model=self.model, stream=True, **kwargs),
+                    self.request_timeout
+                )
+                try:
+                    chunks = stream.__aiter__()
+                    while True:
+                        # A stalled stream fails like a stalled create() instead of hanging the request
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), self.request_timeout)
+                        except StopAsyncIteration:
+                            break
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            METRICS.inc('completion_chunks')
+                            yield delta.content
+                        if delta.tool_calls:
+                            _add_tool_call_deltas(calls, delta.tool_calls)
+                finally:
+                    if hasattr(stream, 'close'):
+                        await stream.close()
+
+    async def _astream_tokens(self, query: str, context: List[str], query_embedding=None):
+        routed = self._routed_request(query, context, query_embedding)
+        if routed is not None:
+            async for token in self._astream({}, **routed):
+                yield token
+            return
+
+        messages = self._build_messages(query, context)
+
+        calls = {}
+        async for token in self._astream(calls, messages=messages, tools=self.tools):
+            yield token
+        if not calls:
+            return
+
+        await self._aexecute_tools(messages, _tool_calls(calls), context)
+
+        async for token in self._astream({}, messages=messages, tools=self.tools, max_tokens=500, temperature=0):
+            yield token
+
+    async def _aexecute_tools(self, messages: List[Dict[str, Any]], tool_calls, context: List[str]):
+        # Independent tool calls run side by side, results are appended in call order
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._execute_tool, tool_call, context) for tool_call in tool_calls),
+            return_exceptions=True
+        )
+        for tool_call, function_response in zip(tool_calls, results):
+            if isinstance(function_response, BaseException):
+                METRICS.inc('tool_errors')
+                print(f"Error executing {tool_call.function.name}: {function_response!r}")
+                function_response = None
+            self._append_tool_result(messages, tool_call, function_response)
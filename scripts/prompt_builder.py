@@ -0,0 +1,167 @@
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import METRICS
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate without tiktoken
+    tiktoken = None
+
+# Context windows of the chat models we deploy, anything else gets the smallest
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-35-turbo": 16385,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+SYSTEM_PROMPT = ("You are a helpful assistant using provided context to answer queries. "
+                 "Use the available tools when appropriate to fetch specific information.")
+
+
+class TokenCounter:
+    '''
+    tiktoken encoding of the model when it can be loaded, otherwise about four
+    characters per token, which is close for English text.
+    '''
+
+    def __init__(self, model: str):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                try:
+                    self.encoding = tiktoken.get_encoding("o200k_base" if "4o" in model else "cl100k_base")
+                except Exception:
+                    # Encodings are downloaded on first use, offline hosts use the estimate
+                    self.encoding = None
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, tokens: int) -> str:
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:tokens])
+        return text[:tokens * 4]
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r'\w+', text.lower())
+
+
+class PromptBuilder:
+    '''
+    Assembles the chat prompt within a token budget.
+
+    Retrieved passages are taken in retrieval rank order; exact repeats and
+    passages mostly contained in an already chosen one are dropped, overlapping
+    neighbours (chunk windows) are merged, and passages stop being added once
+    context_tokens is reached. Tool outputs are cut to tool_tokens. Both budgets
+    are clamped to the model's context window minus the completion's max_tokens.
+    Assembly time, prompt tokens and passages used are recorded in METRICS.
+    '''
+
+    def __init__(self, model: str, context_tokens: int = 1500, tool_tokens: int = 1000, max_output_tokens: int = 500,
+                 containment: float = 0.8, min_overlap_words: int = 5):
+        self.model = model
+        self.counter = TokenCounter(model)
+        window = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS) - max_output_tokens
+        self.context_tokens = max(0, min(context_tokens, window // 2))
+        self.tool_tokens = max(0, min(tool_tokens, window // 4))
+        self.containment = containment
+        self.min_overlap_words = min_overlap_words
+
+    @staticmethod
+    def _overlap(left: List[str], right: List[str], minimum: int) -> int:
+        # Longest run of words ending left that also starts right
+        for size in range(min(len(left), len(right)) - 1, minimum - 1, -1):
+            if left[-size:] == right[:size]:
+                return size
+        return 0
+
+    def _merge(self, first: str, second: str) -> Optional[str]:
+        # Windows of the same page overlap by a few sentences: join them instead of repeating the overlap
+        first_words, second_words = first.split(), second.split()
+        size = self._overlap(first_words, second_words, self.min_overlap_words)
+        if size:
+            return ' '.join(first_words + second_words[size:])
+        size = self._overlap(second_words, first_words, self.min_overlap_words)
+        if size:
+            return ' '.join(second_words + first_words[size:])
+        return None
+
+    def pack_context(self, passages: List[str]) -> List[str]:
+        chosen: List[str] = []
+        chosen_words: List[set] = []
+        used = 0
+        for passage in passages:
+            words = set(_words(passage))
+            if not words:
+                continue
+            if any(len(words & other) >= self.containment * len(words) for other in chosen_words):
+                continue
+
+            merged = None
+            for i, other in enumerate(chosen):
+                merged = self._merge(other, passage)
+                if merged is not None:
+                    cost = self.counter.count(merged) - self.counter.count(other)
+                    if used + cost <= self.context_tokens:
+                        chosen[i], chosen_words[i] = merged, chosen_words[i] | words
+                        used += cost
+                    break
+            if merged is not None:
+                continue
+
+            cost = self.counter.count(passage) + 1
+            if used + cost > self.context_tokens:
+                continue
+            chosen.append(passage)
+            chosen_words.append(words)
+            used += cost
+        return chosen
+
+    def build_messages(self, query: str, context: List[str], system_prompt: str = SYSTEM_PROMPT) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        packed = self.pack_context(context)
+        context_str = "\n".join(packed)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Context:\n{context_str}\n\nQuery: {query}\n\nResponse:"}
+        ]
+        METRICS.observe('prompt_assembly', time.perf_counter() - start)
+        METRICS.inc('prompt_tokens', sum(self.counter.count(message["content"]) for message in messages))
+        METRICS.inc('context_passages', len(packed))
+        METRICS.inc('retrieved_passages', len(context))
+        return messages
+
+    def trim_tool_output(self, output: str) -> str:
+        if self.counter.count(output) <= self.tool_tokens:
+            return output
+        # Meeting results are JSON {total, returned, events}: drop whole events rather than cutting one
+        try:
+            data = json.loads(output)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get('events'), list):
+            def with_events(count: int) -> str:
+                return json.dumps({**data, 'returned': count, 'events': data['events'][:count], 'truncated': True})
+
+            # Most events that still fit
+            low, high = 0, len(data['events'])
+            while low < high:
+                middle = (low + high + 1) // 2
+                if self.counter.count(with_events(middle)) <= self.tool_tokens:
+                    low = middle
+                else:
+                    high = middle - 1
+            return with_events(low)
+        return self.counter.truncate(output, self.tool_tokens) + " [truncated]"
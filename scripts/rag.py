@@ -1,100 +1,100 @@
 from typing import Dict, List, Tuple
-import re
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+STOP_WORDS = {'what', 'is', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at'}
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in text.split('.') if s.strip()]
+
 
 @dataclass
 class RAGMetrics:
     groundedness: float
     answer_relevance: float
     context_relevance: float
-    
+
     def get_average_score(self) -> float:
         return (self.groundedness + self.answer_relevance + self.context_relevance) / 3
 
 class RAGEvaluator:
     def __init__(self):
         self.nlp = None  # Could integrate with spacy or other NLP library if needed
-        
+
     def evaluate_groundedness(self, response: str, context: str) -> Tuple[float, List[str]]:
         """
         Evaluates how well the response is grounded in the context.
         Returns a score and list of statements not found in context.
         """
         # Split response and context into sentences
-        response_sentences = [s.strip() for s in response.split('.') if s.strip()]
-        context_sentences = [s.strip() for s in context.split('.') if s.strip()]
-        
-        # Convert to lowercase for comparison
-        context_lower = [s.lower() for s in context_sentences]
-        
+        response_sentences = split_sentences(response)
+        # Each context sentence is tokenized once, not once per response sentence
+        context_words = [set(s.lower().split()) for s in split_sentences(context)]
+
         ungrounded_statements = []
         grounded_count = 0
-        
+
         for sentence in response_sentences:
-            sentence_lower = sentence.lower()
-            is_grounded = False
-            
-            # Check if the sentence or a similar version exists in context
-            for context_sent in context_lower:
-                # Calculate similarity (simplified version - could use more sophisticated methods)
-                common_words = set(sentence_lower.split()) & set(context_sent.split())
-                total_words = len(set(sentence_lower.split()))
-                
-                if len(common_words) / total_words > 0.5:  # Threshold for similarity
-                    is_grounded = True
-                    break
-                    
+            sentence_words = set(sentence.lower().split())
+
+            # Grounded when more than half of its words appear in one context sentence
+            is_grounded = any(len(sentence_words & words) / len(sentence_words) > 0.5 for words in context_words)
+
             if is_grounded:
                 grounded_count += 1
             else:
                 ungrounded_statements.append(sentence)
-                
+
+        if not response_sentences:
+            return 0.0, []
         score = (grounded_count / len(response_sentences)) * 10
         return score, ungrounded_statements
-    
+
     def evaluate_answer_relevance(self, question: str, response: str) -> float:
         """
         Evaluates how well the response answers the question.
         Returns a score out of 10.
         """
         # Simple keyword-based relevance check
-        question_keywords = set(question.lower().split())
+        question_keywords = set(question.lower().split()) - STOP_WORDS
         response_keywords = set(response.lower().split())
-        
-        # Remove common stop words (simplified version)
-        stop_words = {'what', 'is', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at'}
-        question_keywords = question_keywords - stop_words
-        
+        if not question_keywords:
+            return 0.0
+
         # Check if key question terms are addressed in response
         covered_keywords = question_keywords & response_keywords
         keyword_coverage = len(covered_keywords) / len(question_keywords)
-        
+
         # Additional factors could be considered here
         return keyword_coverage * 10
-    
+
     def evaluate_context_relevance(self, question: str, context: str) -> float:
         """
         Evaluates how well the context matches the question.
         Returns a score out of 10.
         """
-        question_keywords = set(question.lower().split())
+        question_keywords = set(question.lower().split()) - STOP_WORDS
         context_keywords = set(context.lower().split())
-        
-        # Remove stop words
-        stop_words = {'what', 'is', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at'}
-        question_keywords = question_keywords - stop_words
-        
+        if not question_keywords:
+            return 0.0
+
         # Check keyword coverage
         covered_keywords = question_keywords & context_keywords
         keyword_coverage = len(covered_keywords) / len(question_keywords)
-        
+
         # Consider context length (penalize if too long or too short)
         ideal_length = len(question_keywords) * 20  # Arbitrary multiplier
         length_ratio = min(len(context.split()) / ideal_length, 1.5)
         length_score = 1 - abs(1 - length_ratio) * 0.5
-        
+
         return min(keyword_coverage * length_score * 10, 10)
-    
+
     def evaluate(self, question: str, response: str, context: str) -> RAGMetrics:
         """
         Evaluates all three RAG metrics for the given QA pair and context.
@@ -102,29 +102,199 @@ class RAGEvaluator:
         groundedness_score, ungrounded = self.evaluate_groundedness(response, context)
         answer_relevance_score = self.evaluate_answer_relevance(question, response)
         context_relevance_score = self.evaluate_context_relevance(question, context)
-        
+
         return RAGMetrics(
             groundedness=groundedness_score,
             answer_relevance=answer_relevance_score,
             context_relevance=context_relevance_score
         )
 
+
+def _tokenize(texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Word ids of every text flattened (pandas hashes them in C) and the text each word came from
+    tokens = [text.lower().split() for text in texts]
+    lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+    words = np.fromiter(chain.from_iterable(tokens), dtype=object, count=int(lengths.sum()))
+    codes, uniques = pd.factorize(words)
+    return codes, np.repeat(np.arange(len(texts)), lengths), uniques
+
+
+def _binary_matrix(rows: np.ndarray, columns: np.ndarray, shape: Tuple[int, int]) -> sparse.csr_matrix:
+    # Repeated words are summed on conversion, then every present word counts once like in a set
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=shape)
+    matrix.data[:] = 1
+    return matrix
+
+
+def _lexical_scores(rows: List[Tuple[str, str, str]], threshold: float) -> Dict[str, np.ndarray]:
+    '''
+    The three RAGEvaluator scores for a chunk of (question, response, context)
+    rows, each text tokenized once and every overlap taken from sparse products.
+    '''
+    count = len(rows)
+    questions, responses, contexts = (list(texts) for texts in zip(*rows)) if rows else ([], [], [])
+
+    # Answer and context relevance: coverage of the question's keywords in the whole texts
+    codes, text_of, uniques = _tokenize(questions + responses + contexts)
+    words = _binary_matrix(text_of, codes, (3 * count, max(len(uniques), 1)))
+    keep = np.ones(words.shape[1])
+    keep[np.flatnonzero(np.isin(np.asarray(uniques, dtype=object), list(STOP_WORDS)))] = 0
+    keywords = words[:count] @ sparse.diags(keep)
+    keyword_count = np.asarray(keywords.sum(axis=1)).ravel()
+    safe_count = np.maximum(keyword_count, 1)
+    answer_coverage = np.asarray(keywords.multiply(words[count:2 * count]).sum(axis=1)).ravel() / safe_count
+    answer_relevance = np.where(keyword_count > 0, answer_coverage * 10, 0.0)
+    context_coverage = np.asarray(keywords.multiply(words[2 * count:]).sum(axis=1)).ravel() / safe_count
+    context_length = np.bincount(text_of, minlength=3 * count)[2 * count:]
+    length_ratio = np.minimum(context_length / (safe_count * 20), 1.5)
+    length_score = 1 - np.abs(1 - length_ratio) * 0.5
+    context_relevance = np.where(keyword_count > 0, np.minimum(context_coverage * length_score * 10, 10), 0.0)
+
+    # Groundedness: response sentences against the context sentences of their row
+    response_sentences = [split_sentences(response) for response in responses]
+    context_sentences = [split_sentences(context) for context in contexts]
+    response_count = np.array([len(sentences) for sentences in response_sentences], dtype=np.int64)
+    context_count = np.array([len(sentences) for sentences in context_sentences], dtype=np.int64)
+    total = int(response_count.sum())
+    groundedness = np.zeros(count)
+    ungrounded = response_count.copy()
+    if total:
+        sentences = [s for group in response_sentences for s in group] + [s for group in context_sentences for s in group]
+        row_of = np.concatenate([np.repeat(np.arange(count), response_count), np.repeat(np.arange(count), context_count)])
+        codes, sentence_of, uniques = _tokenize(sentences)
+        # Word ids made unique per row: the product then only pairs sentences of the same row
+        keys, columns = np.unique(row_of[sentence_of] * len(uniques) + codes, return_inverse=True)
+        matrix = _binary_matrix(sentence_of, columns.ravel(), (len(sentences), max(len(keys), 1)))
+        response_words, context_words = matrix[:total], matrix[total:]
+
+        common = (response_words @ context_words.T).tocsr()
+        sentence_words = np.asarray(response_words.sum(axis=1)).ravel()
+        best = np.asarray(common.max(axis=1).todense()).ravel() / np.maximum(sentence_words, 1)
+        owner = np.repeat(np.arange(count), response_count)
+        grounded_count = np.bincount(owner, weights=best > threshold, minlength=count)
+        groundedness = np.where(response_count > 0, grounded_count / np.maximum(response_count, 1) * 10, 0.0)
+        ungrounded = response_count - grounded_count.astype(np.int64)
+
+    return {
+        'groundedness': groundedness,
+        'answer_relevance': answer_relevance,
+        'context_relevance': context_relevance,
+        'response_sentences': response_count,
+        'ungrounded_sentences': ungrounded
+    }
+
+
+def _score_chunk(args) -> Dict[str, np.ndarray]:
+    rows, threshold = args
+    return _lexical_scores(rows, threshold)
+
+
+class BatchRAGEvaluator:
+    '''
+    RAGEvaluator scores over a whole table of question, response and context
+    rows, e.g. data/rag.csv.
+
+    Rows are scored chunk_size at a time with sparse token matrices, chunks
+    spread over workers processes. With an encoder (a CachedEncoder, so repeated
+    sentences are embedded once) semantic_groundedness also counts a response
+    sentence as grounded when its cosine similarity to a context sentence of the
+    same row reaches semantic_threshold.
+    '''
+
+    COLUMNS = ('question', 'response', 'context')
+
+    def __init__(self, threshold: float = 0.5, workers: int = 1, chunk_size: int = 1000, encoder=None,
+                 semantic_threshold: float = 0.75):
+        self.threshold = threshold
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.encoder = encoder
+        self.semantic_threshold = semantic_threshold
+
+    def evaluate_file(self, path: str) -> pd.DataFrame:
+        return self.evaluate_frame(pd.read_csv(path, keep_default_na=False))
+
+    def evaluate_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        missing = [column for column in self.COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        rows = list(zip(*(df[column].fillna('').astype(str).tolist() for column in self.COLUMNS)))
+        chunks = [(rows[start:start + self.chunk_size], self.threshold) for start in range(0, len(rows), self.chunk_size)]
+
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(self.workers) as executor:
+                results = list(executor.map(_score_chunk, chunks))
+        else:
+            results = [_score_chunk(chunk) for chunk in chunks]
+
+        metrics = pd.DataFrame({
+            name: np.concatenate([result[name] for result in results]) if results else np.empty(0)
+            for name in ('groundedness', 'answer_relevance', 'context_relevance', 'response_sentences', 'ungrounded_sentences')
+        }, index=df.index)
+        metrics['average'] = metrics[['groundedness', 'answer_relevance', 'context_relevance']].mean(axis=1)
+        if self.encoder is not None:
+            metrics['semantic_groundedness'] = self.semantic_groundedness(rows)
+        return metrics
+
+    def semantic_groundedness(self, rows: List[Tuple[str, str, str]]) -> np.ndarray:
+        response_sentences = [split_sentences(response) for _, response, _ in rows]
+        context_sentences = [split_sentences(context) for _, _, context in rows]
+        # One encode call for all distinct sentences
+        texts = list(dict.fromkeys(s for sentences in response_sentences + context_sentences for s in sentences))
+        position = {text: i for i, text in enumerate(texts)}
+        vectors = np.asarray(self.encoder.encode(texts), dtype=np.float32) if texts else np.empty((0, 1), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        scores = np.zeros(len(rows))
+        for row, (responses, contexts) in enumerate(zip(response_sentences, context_sentences)):
+            if not responses or not contexts:
+                continue
+            similarity = vectors[[position[s] for s in responses]] @ vectors[[position[s] for s in contexts]].T
+            scores[row] = (similarity.max(axis=1) >= self.semantic_threshold).mean() * 10
+        return scores
+
+    @staticmethod
+    def aggregate(metrics: pd.DataFrame) -> Dict[str, float]:
+        summary = {'rows': len(metrics)}
+        for column in metrics.columns:
+            if column in ('response_sentences', 'ungrounded_sentences'):
+                summary[column] = int(metrics[column].sum())
+            else:
+                summary[f"{column}_mean"] = float(metrics[column].mean()) if len(metrics) else 0.0
+                summary[f"{column}_p10"] = float(metrics[column].quantile(0.1)) if len(metrics) else 0.0
+        return summary
+
+
 def main():
-    # Example usage
-    evaluator = RAGEvaluator()
-    
-    # Test case
-    question = "what is python"
-    response = "Python is a high-level, general-purpose programming language that supports multiple programming paradigms. It is designed to be easily readable and aims to provide a fun and enjoyable experience for developers. Additionally, Python's design and philosophy have influenced many other programming languages."
-    context = "Python is a high-level, general-purpose programming language. Python is a multi-paradigm programming language. Python's developers aim for it to be fun to use. Python is meant to be an easily readable language. Python's design and philosophy have influenced many other programming languages."
-    
-    metrics = evaluator.evaluate(question, response, context)
-    
-    print(f"RAG Evaluation Results:")
-    print(f"Groundedness: {metrics.groundedness:.1f}/10")
-    print(f"Answer Relevance: {metrics.answer_relevance:.1f}/10")
-    print(f"Context Relevance: {metrics.context_relevance:.1f}/10")
-    print(f"Average Score: {metrics.get_average_score():.1f}/10")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate groundedness and relevance of RAG answers")
+    parser.add_argument('--file', default="data/rag.csv", help="CSV with question, response and context columns")
+    parser.add_argument('--output', help="Write the per-row metrics table to this CSV")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--semantic', action='store_true', help="Also score groundedness with cached sentence embeddings")
+    args = parser.parse_args()
+
+    encoder = None
+    if args.semantic:
+        from config import Config
+        from embedding_cache import CachedEncoder
+        from model_loader import PreloadedModel
+        model = PreloadedModel(Config.SENTENCE_MODEL, Config.MODEL_DIR, backend=Config.ENCODER_BACKEND,
+                               threads=Config.ENCODER_THREADS)
+        encoder = CachedEncoder(model, model.name, Config.CACHE_DIR)
+
+    evaluator = BatchRAGEvaluator(workers=args.workers, chunk_size=args.chunk_size, encoder=encoder)
+    metrics = evaluator.evaluate_file(args.file)
+    if args.output:
+        metrics.to_csv(args.output, index_label='row')
+    elif len(metrics) <= 20:
+        print(metrics.round(2).to_string())
+
+    print(f"RAG Evaluation Results ({len(metrics)} rows):")
+    for name, value in evaluator.aggregate(metrics).items():
+        print(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,162 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    # Case, whitespace and trailing punctuation do not change the question
+    return re.sub(r'\s+', ' ', query).strip().lower().rstrip('?!. ')
+
+
+def context_hash(context: List[str]) -> str:
+    return hashlib.sha1('\n'.join(context).encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    response: str
+    model: str
+    context_hash: str
+    expires_at: float
+    slot: int = -1  # Row in the semantic matrix, -1 without a query embedding
+
+
+class ResponseCache:
+    '''
+    Two-tier cache of generated answers.
+
+    The exact tier is keyed on normalized query + retrieved context hash + model.
+    The semantic tier compares the query embedding from retrieval against the
+    embeddings of cached queries and returns the best answer whose cosine
+    similarity reaches similarity_threshold. By default a semantic hit also needs
+    the same retrieved context, so "when is John's meeting" can not be answered
+    with Maria's meeting. Entries expire after ttl seconds and the least recently
+    used entry is evicted beyond max_entries; max_entries=0 disables the cache.
+    '''
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, similarity_threshold: float = 0.95,
+                 semantic_requires_same_context: bool = True, clock: Callable[[], float] = time.monotonic):
+        if max_entries < 0:
+            raise ValueError(f"max_entries must be 0 (disabled) or more, got {max_entries}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.semantic_requires_same_context = semantic_requires_same_context
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.entries = OrderedDict()
+        # Unit query embeddings, one row per slot; allocated once the dimension is known
+        self.vectors = None
+        self.slot_keys: List[Optional[str]] = [None] * max_entries
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, context_digest: str, model: str) -> str:
+        return hashlib.sha1(f"{normalize_query(query)}\0{context_digest}\0{model}".encode('utf-8')).hexdigest()
+
+    def get(self, query: str, context: List[str], model: str, query_embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        digest = context_hash(context)
+        key = self.make_key(query, digest, model)
+        now = self.clock()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.response
+            if entry is not None:
+                self._remove(key)
+
+            if query_embedding is not None and self.vectors is not None:
+                semantic_key = self._nearest(self._unit(query_embedding), model, digest, now)
+                if semantic_key is not None:
+                    self.entries.move_to_end(semantic_key)
+                    self.semantic_hits += 1
+                    return self.entries[semantic_key].response
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, context: List[str], model: str, response: str, query_embedding: Optional[np.ndarray] = None):
+        if self.max_entries == 0:
+            return
+        digest = context_hash(context)
+        key = self.make_key(query, digest, model)
+
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self._purge_expired(self.clock())
+            while len(self.entries) >= self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+            entry = CacheEntry(response, model, digest, self.clock() + self.ttl)
+            if query_embedding is not None:
+                vector = self._unit(query_embedding)
+                if self.vectors is None:
+                    self.vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                entry.slot = self.free_slots.pop()
+                self.vectors[entry.slot] = vector
+                self.slot_keys[entry.slot] = key
+            self.entries[key] = entry
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _nearest(self, vector: np.ndarray, model: str, digest: str, now: float) -> Optional[str]:
+        slots = [slot for slot, key in enumerate(self.slot_keys) if key is not None]
+        if not slots:
+            return None
+        scores = self.vectors[slots] @ vector
+        for position in np.argsort(-scores):
+            if scores[position] < self.similarity_threshold:
+                break
+            key = self.slot_keys[slots[position]]
+            entry = self.entries[key]
+            if entry.expires_at <= now or entry.model != model:
+                continue
+            if self.semantic_requires_same_context and entry.context_hash != digest:
+                continue
+            return key
+        return None
+
+    def _purge_expired(self, now: float):
+        for key in [key for key, entry in self.entries.items() if entry.expires_at <= now]:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key)
+        if entry.slot >= 0:
+            self.slot_keys[entry.slot] = None
+            self.free_slots.append(entry.slot)
@@ -0,0 +1,40 @@
+import time
+from typing import Callable, Iterator, List, Optional
+
+
+class ResponseStream:
+    '''
+    Iterable over the answer's tokens as the completion streams them.
+
+    ttft is the seconds from the request to the first token (None until it
+    arrives), text the answer received so far. An error ends the iteration
+    early, is printed and kept in error; on_complete runs after a full answer.
+    '''
+
+    def __init__(self, tokens: Iterator[str], on_complete: Optional[Callable[['ResponseStream'], None]] = None):
+        self.start = time.perf_counter()
+        self.ttft: Optional[float] = None
+        self.total: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self.parts: List[str] = []
+        self._tokens = tokens
+        self._on_complete = on_complete
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for token in self._tokens:
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - self.start
+                self.parts.append(token)
+                yield token
+        except Exception as e:
+            print(f"Error generating response: {e!r}")
+            self.error = e
+            return
+        self.total = time.perf_counter() - self.start
+        if self._on_complete is not None:
+            self._on_complete(self)
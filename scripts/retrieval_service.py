@@ -0,0 +1,32 @@
+from typing import List, Tuple
+
+from micro_batcher import MicroBatcher
+
+
+class RetrievalService:
+    '''
+    Micro-batching front of a vector store for concurrent callers.
+
+    Queries arriving within max_wait seconds (or until max_batch_size are
+    waiting) are encoded with one encode call and sent as a single multi-vector
+    search, then each caller gets its own hits back.
+    '''
+
+    def __init__(self, store, max_batch_size: int = 32, max_wait: float = 0.005):
+        self.store = store
+        self.batcher = MicroBatcher(self._search_batch, max_batch_size, max_wait, name="retrieval")
+
+    def search(self, query: str, top_k: int = 5) -> List[str]:
+        return self.batcher((query, top_k))
+
+    def _search_batch(self, requests: List[Tuple[str, int]]) -> List[List[str]]:
+        # One search at the largest top_k, trimmed per caller
+        limit = max(top_k for _, top_k in requests)
+        hits = self.store.search_many([query for query, _ in requests], limit)
+        return [sentences[:top_k] for sentences, (_, top_k) in zip(hits, requests)]
+
+    def stats(self) -> dict:
+        return self.batcher.stats()
+
+    def close(self):
+        self.batcher.close()
@@ -0,0 +1,154 @@
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from config import Config
+from metrics import METRICS
+
+
+class PooledHTTPServer(HTTPServer):
+    '''
+    HTTPServer that hands each connection to a fixed pool of worker threads
+    instead of spawning a thread per request.
+    '''
+
+    def __init__(self, server_address, handler_class, workers: int):
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-worker")
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def make_handler(chatbot, client_context: bool = False):
+    # HTTP/1.0: the connection closes after each response, so idle keep-alive
+    # clients can not hold on to one of the pooled workers
+    class ChatRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict):
+            self._send_text(status, json.dumps(payload), 'application/json')
+
+        def _send_text(self, status: int, text: str, content_type: str):
+            body = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_query(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return None
+            if not isinstance(payload, dict) or not str(payload.get('query', '')).strip():
+                return None
+            return payload
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/ready':
+                # Not ready while the index is building or the collection is loading
+                status = chatbot.vector_store.status()
+                self._send_json(200 if status['ready'] else 503, status)
+            elif self.path == '/stats':
+                stats = {'streaming': chatbot.openai_handler.stream_stats(), 'query_path': METRICS.snapshot()}
+                if chatbot.retrieval is not None:
+                    stats['retrieval'] = chatbot.retrieval.stats()
+                self._send_json(200, stats)
+            elif self.path == '/metrics':
+                # Prometheus scrape endpoint
+                self._send_text(200, METRICS.prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path not in ('/query', '/retrieve', '/stream'):
+                self._send_json(404, {'error': 'not found'})
+                return
+            payload = self._read_query()
+            if payload is None:
+                self._send_json(400, {'error': 'expected a JSON body with a non-empty "query"'})
+                return
+
+            query = payload['query']
+            with METRICS.timer(f"request_{self.path.lstrip('/')}"):
+                self._answer(query, payload)
+
+        def _answer(self, query: str, payload: dict):
+            try:
+                # A trusted client that already retrieved (e.g. the thin UI) can pass the context back in,
+                # otherwise it is ignored so a request can not inject text into the prompt and the cache
+                sentences = payload.get('context') if client_context else None
+                if not self._valid_context(sentences):
+                    sentences = chatbot.get_similar_sentences(query)
+                if self.path == '/retrieve':
+                    self._send_json(200, {'sentences': sentences})
+                    return
+                if self.path == '/stream':
+                    self._send_stream(chatbot.generate_response_stream(query, sentences))
+                    return
+                response = chatbot.generate_response(query, sentences)
+                self._send_json(200, {'response': response, 'sentences': sentences})
+            except Exception as e:
+                METRICS.inc('request_errors')
+                self._send_json(500, {'error': str(e)})
+
+        @staticmethod
+        def _valid_context(sentences) -> bool:
+            return isinstance(sentences, list) and all(isinstance(sentence, str) for sentence in sentences)
+
+        def _send_stream(self, stream):
+            # Plain text written as the tokens arrive; HTTP/1.0, so the closed connection ends the body
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.end_headers()
+            for token in stream:
+                self.wfile.write(token.encode('utf-8'))
+                self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return ChatRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless chatbot HTTP server")
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=Config.SERVER_WORKERS)
+    parser.add_argument('--profile-startup', action='store_true', help="Print the time spent in each startup phase")
+    args = parser.parse_args()
+
+    from chatbot import Chatbot
+
+    # One Chatbot per process: a single warm SentenceTransformer and Milvus connection shared by all workers
+    chatbot = Chatbot(batch_queries=True, profile=args.profile_startup or Config.PROFILE_STARTUP)
+    server = PooledHTTPServer((args.host, args.port), make_handler(chatbot, Config.SERVER_CLIENT_CONTEXT), args.workers)
+    print(f"Serving /query, /stream and /retrieve on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        chatbot.close()
+
+
+if __name__ == "__main__":
+    main()
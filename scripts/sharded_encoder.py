@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from model_loader import PreloadedModel
+
+# One model per worker process, loaded by the pool initializer
+_model = None
+
+
+def _init_worker(model_name: str, directory: str, backend: str, threads: int):
+    global _model
+    _model = PreloadedModel(model_name, directory, background=False, backend=backend, threads=threads)
+
+
+def _encode_shard(output_path: str, shape: Tuple[int, int], rows: np.ndarray, sentences: List[str],
+                  batch_size: int) -> int:
+    vectors = np.asarray(_model.encode(sentences, batch_size=batch_size), dtype=np.float32)
+    # Written straight into the shared output at the sentences' original rows
+    output = np.memmap(output_path, dtype=np.float32, mode='r+', shape=shape)
+    output[rows] = vectors
+    output.flush()
+    del output
+    return len(rows)
+
+
+class ShardedEncoder:
+    '''
+    Embeds large sentence lists on a pool of worker processes, each with its
+    own copy of the model.
+
+    Sentences are ordered by length and cut into shards of shard_size, so the
+    batches inside a shard need little padding; the longest shards go first so
+    no worker is left with a slow one at the end. Workers write their vectors
+    into a memory-mapped float32 array in the original sentence order, nothing
+    goes back through the pool's pipes. threads is per worker and defaults to an
+    even split of the cores. The pool starts on the first encode(), close()
+    frees it and the workers' models.
+    '''
+
+    def __init__(self, model: PreloadedModel, workers: int, threads: int = 0, shard_size: int = 1024,
+                 tmp_dir: Optional[str] = None):
+        # The process's own model: its snapshot (and ONNX export) is on disk before any worker loads it
+        self.model = model
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.shard_size = shard_size
+        self.tmp_dir = tmp_dir
+        self.pool = None
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.model.wait()
+            # spawn: forking a process that already runs torch threads can deadlock
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker,
+                                            initargs=(self.model.model_name, self.model.directory,
+                                                      self.model.backend, self.threads))
+        return self.pool
+
+    def shards(self, sentences: List[str]) -> List[np.ndarray]:
+        # Row numbers of each shard, longest sentences first
+        order = np.argsort([-len(sentence) for sentence in sentences], kind='stable')
+        return [order[start:start + self.shard_size] for start in range(0, len(order), self.shard_size)]
+
+    def encode_to(self, sentences: List[str], output_path: str, batch_size: int = 32) -> np.memmap:
+        '''
+        Embeds sentences into a float32 file at output_path and returns it memory-mapped.
+        '''
+        shape = (len(sentences), self.get_sentence_embedding_dimension())
+        output = np.memmap(output_path, dtype=np.float32, mode='w+', shape=shape)
+        output.flush()
+        if sentences:
+            pool = self._pool()
+            futures = [pool.submit(_encode_shard, output_path, shape, rows, [sentences[i] for i in rows], batch_size)
+                       for rows in self.shards(sentences)]
+            for future in futures:
+                future.result()
+        return output
+
+    def encode(self, sentences: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if self.tmp_dir:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.f32', dir=self.tmp_dir)
+        os.close(fd)
+        try:
+            output = self.encode_to(sentences, path, batch_size)
+            embeddings = np.array(output)
+            del output
+            return embeddings
+        finally:
+            os.remove(path)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,236 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Set, Tuple
+
+import numpy as np
+
+from ingestion import sentence_hash, sentence_id
+
+# Dates, times and numbers like 2024-01-11, 1/11/2024 or 09:00 stay one token
+TOKEN_PATTERN = re.compile(r'\d+(?:[-/:.]\d+)+|\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class SparseIndex:
+    '''
+    In-process BM25 index over the ingested sentences.
+
+    Posting lists are CSR arrays sorted by term: offsets (per term), rows (int32
+    document row), tfs (uint16) and the precomputed BM25 term weight (float32),
+    about 10 bytes per posting. Within a term postings are impact ordered (highest
+    weight first), so a query reads at most max_postings per term and frequent
+    words cost no more than rare ones; 0 reads every posting for exact scores.
+
+    New sentences are tokenized into a pending block and merged with one sort on
+    flush(); deletes only clear the row's alive flag until enough rows are dead to
+    compact. Arrays are persisted as .npy files under directory and memory-mapped on load.
+    '''
+
+    FILES = ('offsets', 'rows', 'tfs', 'weights', 'doc_ids', 'doc_len', 'alive')
+
+    def __init__(self, directory: str, k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.2,
+                 max_postings: int = 1024):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.max_postings = max_postings
+        self.lock = threading.RLock()
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.terms: Dict[str, int] = {}
+        self.sentences: List[str] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.rows = np.empty(0, dtype=np.int32)
+        self.tfs = np.empty(0, dtype=np.uint16)
+        self.weights = np.empty(0, dtype=np.float32)
+        self.doc_ids = np.empty(0, dtype=np.int64)
+        self.doc_len = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        self.row_of: Dict[int, int] = {}
+        self.pending: List[Tuple[int, str]] = []
+        self.dirty = False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        if not os.path.exists(self._path('meta.json')):
+            return
+        try:
+            with open(self._path('meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = {name: np.load(self._path(f"{name}.npy"), mmap_mode='r') for name in self.FILES}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable sparse index {self.directory}: {e}")
+            return
+        with self.lock:
+            self.terms = {term: i for i, term in enumerate(meta['terms'])}
+            self.sentences = meta['sentences']
+            for name, array in arrays.items():
+                setattr(self, name, array)
+            # Deletes flip alive in place, so it is the one array not left memory-mapped
+            self.alive = np.array(self.alive)
+            self.row_of = {id_: row for row, (id_, alive) in enumerate(zip(self.doc_ids.tolist(), self.alive.tolist())) if alive}
+
+    def save(self, names=FILES):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in names:
+            with open(self._path(f"{name}.npy.tmp"), 'wb') as f:
+                np.save(f, getattr(self, name))
+            os.replace(self._path(f"{name}.npy.tmp"), self._path(f"{name}.npy"))
+        # Written last: its presence marks a complete index
+        terms = sorted(self.terms, key=self.terms.get)
+        with open(self._path('meta.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump({'terms': terms, 'sentences': self.sentences}, f)
+        os.replace(self._path('meta.json.tmp'), self._path('meta.json'))
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.row_of) + len(self.pending)
+
+    def add(self, sentences: List[str]):
+        with self.lock:
+            for sentence in sentences:
+                id_ = sentence_id(sentence_hash(sentence))
+                if id_ not in self.row_of:
+                    self.pending.append((id_, sentence))
+
+    def delete(self, ids: List[int]):
+        with self.lock:
+            rows = [self.row_of.pop(id_) for id_ in ids if id_ in self.row_of]
+            if rows:
+                self.alive[rows] = False
+                self.dirty = True
+            dropped = set(ids)
+            self.pending = [(id_, sentence) for id_, sentence in self.pending if id_ not in dropped]
+
+    def sync(self, live: Set[int], fetch_sentences: Callable[[List[int]], List[str]], batch_size: int = 1000) -> bool:
+        '''
+        Brings the index in line with the live sentence ids: deletes the ones no
+        longer live, adds the missing ones with their texts from fetch_sentences
+        (the vector store) and merges what is pending. Returns True if anything changed.
+        '''
+        with self.lock:
+            known = set(self.row_of).union(id_ for id_, _ in self.pending)
+            removed = [id_ for id_ in known if id_ not in live]
+            missing = [id_ for id_ in live if id_ not in known]
+            self.delete(removed)
+            for start in range(0, len(missing), batch_size):
+                self.add(fetch_sentences(missing[start:start + batch_size]))
+            added = len(self.pending)
+            if not removed and not added:
+                return False
+            self.flush()
+        print(f"Sparse index: {added} added, {len(removed)} removed, {len(self.row_of)} documents")
+        return True
+
+    def flush(self):
+        with self.lock:
+            dead = len(self.doc_ids) - len(self.row_of)
+            if self.pending or dead > self.compact_ratio * max(len(self.doc_ids), 1):
+                self._merge()
+                self.save()
+            elif self.dirty:
+                # Only deletes below the compaction threshold: the alive flags are all that changed
+                self.save(('alive',))
+                self.dirty = False
+
+    def _merge(self):
+        # Existing postings with their term ids, minus dead rows
+        term_of = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+        keep_rows = np.flatnonzero(self.alive)
+        new_row = np.full(len(self.doc_ids), -1, dtype=np.int64)
+        new_row[keep_rows] = np.arange(len(keep_rows))
+        keep = new_row[self.rows] >= 0 if len(self.rows) else np.empty(0, dtype=bool)
+        terms = [term_of[keep]]
+        rows = [new_row[self.rows[keep]]]
+        tfs = [np.asarray(self.tfs)[keep]]
+        doc_ids = [np.asarray(self.doc_ids)[keep_rows]]
+        doc_len = [np.asarray(self.doc_len)[keep_rows]]
+        sentences = [self.sentences[row] for row in keep_rows]
+
+        # Pending documents tokenized into the same (term, row, tf) layout
+        pending_terms, pending_rows, pending_tfs, pending_len = [], [], [], []
+        for offset, (id_, sentence) in enumerate(self.pending):
+            counts = Counter(tokenize(sentence))
+            for term, tf in counts.items():
+                pending_terms.append(self.terms.setdefault(term, len(self.terms)))
+                pending_rows.append(len(keep_rows) + offset)
+                pending_tfs.append(min(tf, 65535))
+            pending_len.append(sum(counts.values()))
+            sentences.append(sentence)
+        terms.append(np.array(pending_terms, dtype=np.int64))
+        rows.append(np.array(pending_rows, dtype=np.int64))
+        tfs.append(np.array(pending_tfs, dtype=np.uint16))
+        doc_ids.append(np.array([id_ for id_, _ in self.pending], dtype=np.int64))
+        doc_len.append(np.array(pending_len, dtype=np.int32))
+
+        terms = np.concatenate(terms)
+        rows = np.concatenate(rows)
+        tfs = np.concatenate(tfs)
+        self.doc_ids = np.concatenate(doc_ids)
+        self.doc_len = np.concatenate(doc_len)
+
+        # Term-frequency part of BM25, only idf is left for query time
+        avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 1.0
+        tf = tfs.astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / max(avgdl, 1e-9))
+        weights = (tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+        # By term, then by weight descending within the term
+        order = np.lexsort((-weights, terms))
+        self.rows = rows[order].astype(np.int32)
+        self.tfs = tfs[order]
+        self.weights = weights[order]
+        self.offsets = np.searchsorted(terms[order], np.arange(len(self.terms) + 1)).astype(np.int64)
+        self.sentences = sentences
+        self.alive = np.ones(len(self.doc_ids), dtype=bool)
+        self.row_of = {id_: row for row, id_ in enumerate(self.doc_ids.tolist())}
+        self.pending = []
+
+    def search_rows(self, query: str, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns (rows, scores) of the best top_k live documents for query.
+        Only the head (max_postings) of each query term's posting list is read.
+        '''
+        with self.lock:
+            term_ids = {self.terms[term] for term in tokenize(query) if term in self.terms}
+            term_ids = [t for t in term_ids if t < len(self.offsets) - 1]
+            if not term_ids:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            n_docs = len(self.doc_ids)
+            rows, contributions = [], []
+            for t in term_ids:
+                start, stop = int(self.offsets[t]), int(self.offsets[t + 1])
+                df = stop - start
+                if self.max_postings:
+                    stop = min(stop, start + self.max_postings)
+                rows.append(self.rows[start:stop])
+                contributions.append(self.weights[start:stop] * np.log1p((n_docs - df + 0.5) / (df + 0.5)))
+            rows = np.concatenate(rows)
+            contributions = np.concatenate(contributions)
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=contributions)
+            alive = self.alive[candidates]
+            candidates, scores = candidates[alive], scores[alive]
+
+            k = min(top_k, len(candidates))
+            if k == 0:
+                return candidates, scores
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return candidates[top], scores[top]
+
+    def search(self, query: str, top_k: int = 5) -> List[str]:
+        rows, _ = self.search_rows(query, top_k)
+        return [self.sentences[row] for row in rows]
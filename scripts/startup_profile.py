@@ -0,0 +1,34 @@
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupProfile:
+    '''
+    Wall-clock time of each named startup phase, in the order they ran.
+    Imports done inside a phase are counted in that phase.
+    '''
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def add(self, name: str, seconds: float):
+        self.phases.append((name, seconds))
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.phases)
+
+    def report(self):
+        total = self.total
+        print(f"Startup profile ({total:.2f}s total):")
+        for name, seconds in self.phases:
+            print(f"  {name:<20} {seconds * 1000:8.0f} ms  {seconds / max(total, 1e-9):6.1%}")
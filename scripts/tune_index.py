@@ -0,0 +1,75 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import Config
+from embedding_cache import CachedEncoder
+from index_tuner import IndexTuner, load_index_config
+from milvus_handler import MilvusHandler
+from model_loader import PreloadedModel
+
+
+def print_results(results):
+    print(f"{'index':<9} | {'build params':<28} | {'search params':<15} | {'recall':>6} | {'p50 ms':>7} | {'p99 ms':>7}")
+    for config in results:
+        build = ', '.join(f"{key}={value}" for key, value in config.params.items()) or '-'
+        search = ', '.join(f"{key}={value}" for key, value in config.search_params.items()) or '-'
+        print(f"{config.index_type:<9} | {build:<28} | {search:<15} | {config.recall:>6.3f} | {config.p50_ms:>7.2f} | {config.p99_ms:>7.2f}")
+
+
+def load_queries(path: str) -> list:
+    if path.endswith('.csv'):
+        return pd.read_csv(path)['query'].dropna().astype(str).tolist()
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the Milvus index for the ingested collection")
+    parser.add_argument('--target-recall', type=float, default=Config.MILVUS_TARGET_RECALL)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--queries-file', default="data/intent_queries.csv",
+                        help="Real questions, a CSV with a query column or one per line")
+    parser.add_argument('--held-out', type=int, default=200, help="Corpus rows added as leave-one-out queries")
+    parser.add_argument('--sweep', action='store_true',
+                        help="Only print the recall/latency table of every index family, keep the current index")
+    args = parser.parse_args()
+
+    model = PreloadedModel(Config.SENTENCE_MODEL, Config.MODEL_DIR, backend=Config.ENCODER_BACKEND,
+                           threads=Config.ENCODER_THREADS)
+    encoder = CachedEncoder(model, model.name, Config.CACHE_DIR)
+    handler = MilvusHandler(Config.MILVUS_HOST, Config.MILVUS_PORT, encoder, encoder.dim, index_config=load_index_config(Config.MILVUS_INDEX_CONFIG),
+                            alias=Config.MILVUS_ALIAS)
+    handler.connect()
+    handler.create_collection()
+
+    # Corpus as stored: texts and vectors read back from the collection, nothing is fetched or embedded
+    sentences, embeddings = [], []
+    for batch_sentences, batch_embeddings in handler.iter_entities():
+        sentences.extend(batch_sentences)
+        embeddings.append(batch_embeddings)
+    if not sentences:
+        print("Nothing ingested yet, run the chatbot once first")
+        return
+    embeddings = np.concatenate(embeddings)
+    queries = encoder.encode_queries(load_queries(args.queries_file)) if args.queries_file else None
+
+    tuner = IndexTuner(handler, sentences, embeddings, args.top_k, queries, args.held_out)
+
+    if args.sweep:
+        current = handler.index_config
+        print_results(tuner.sweep(every_family=True))
+        handler.apply_index(current)
+        return
+
+    best = tuner.tune(args.target_recall, Config.MILVUS_INDEX_CONFIG)
+    print_results([best])
+    print(f"Saved to {Config.MILVUS_INDEX_CONFIG}")
+
+
+if __name__ == "__main__":
+    main()
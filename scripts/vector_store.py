@@ -0,0 +1,96 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+from metrics import METRICS
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    # Unit length rows, so inner product is cosine similarity
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return embeddings / norms
+
+
+class VectorStore(ABC):
+    '''
+    Surface shared by the vector database backends (MilvusHandler, LocalVectorStore).
+
+    model is the CachedEncoder used to embed queries. Rows are keyed by the
+    sentence hash id, so insert_embeddings behaves as an upsert. sources/offsets
+    record where each passage came from (URL or CSV path, and its offset there).
+    '''
+
+    def __init__(self, model):
+        self.model = model
+
+    def connect(self):
+        pass
+
+    @abstractmethod
+    def create_collection(self, drop: bool = False) -> bool:
+        '''
+        Opens the collection, creating it if needed; with drop, an existing one
+        is emptied first. Returns True when the collection was (re)created empty.
+        '''
+
+    @abstractmethod
+    def insert_embeddings(self, sentences: List[str], embeddings: np.ndarray, flush: bool = True,
+                          sources: Optional[List[str]] = None, offsets: Optional[List[int]] = None):
+        '''
+        Upserts the sentences with their embeddings, keyed by sentence hash id.
+        '''
+
+    @abstractmethod
+    def delete_embeddings(self, ids: List[int], flush: bool = True):
+        '''
+        Deletes the rows with the given ids, ids that are not stored are ignored.
+        '''
+
+    @abstractmethod
+    def fetch_sentences(self, ids: List[int]) -> List[str]:
+        '''
+        Stored texts of the given row ids, ids that are not stored are skipped.
+        '''
+
+    def flush(self):
+        pass
+
+    def ensure_index(self):
+        # Called after ingestion so the index can follow the collection size
+        pass
+
+    def status(self) -> dict:
+        # Readiness probe, 'ready' is False while the store can not answer searches
+        return {'ready': True}
+
+    @abstractmethod
+    def search_embeddings(self, embeddings: np.ndarray, top_k: int = 5) -> List[List[str]]:
+        '''
+        The top_k stored sentences closest to each embedding, best first.
+        '''
+
+    def search_similar_sentences(self, query: str, top_k: int = 5) -> List[str]:
+        return self.search_many([query], top_k)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 5) -> List[List[str]]:
+        # All queries are encoded in one call and searched in one request
+        with METRICS.timer('query_encode'):
+            embeddings = self.model.encode_queries(queries)
+        with METRICS.timer('vector_search'):
+            return self.search_embeddings(embeddings, top_k)
+
+
+def create_vector_store(backend: str, model, **options) -> VectorStore:
+    # Backends are imported lazily so the local one runs without pymilvus installed
+    dim = options.get('dim') or model.get_sentence_embedding_dimension()
+    if backend == 'milvus':
+        from milvus_handler import MilvusHandler
+        return MilvusHandler(options['host'], options['port'], model, dim, index_config=options.get('index_config'),
+                             alias=options.get('alias', 'default'), pool_size=options.get('pool_size', 1))
+    if backend == 'local':
+        from local_vector_store import LocalVectorStore
+        return LocalVectorStore(model, options['directory'], dim, index_type=options.get('index_type', 'FLAT'))
+    raise ValueError(f"Unknown vector backend: {backend}")
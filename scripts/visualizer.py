@@ -1,8 +1,296 @@
-from typing import List, Optional
+import base64
+import io
+import json
+import os
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
 import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 
+# Source kinds a passage can come from, in legend order, and the colormap of each
+SOURCE_KINDS = ('web', 'calendar', 'unknown')
+KIND_CMAPS = {'web': 'Blues', 'calendar': 'Oranges', 'unknown': 'Greys'}
+KIND_COLORS = {'web': (0.12, 0.47, 0.71), 'calendar': (1.0, 0.5, 0.05), 'unknown': (0.4, 0.4, 0.4)}
+
+
+def source_kind(source: str) -> str:
+    # Ingestion stores the page URL or the CSV path as a passage's source
+    if source.startswith(('http://', 'https://')):
+        return 'web'
+    if source.lower().endswith('.csv'):
+        return 'calendar'
+    return 'unknown'
+
+
+Batch = Tuple[np.ndarray, np.ndarray]
+
+
+class ArraySource:
+    '''
+    Embeddings of a matrix (usually memory-mapped), read batch_size rows at a time.
+    kinds holds the source kind of each row, all 'unknown' when not given.
+    '''
+
+    def __init__(self, vectors: np.ndarray, kinds: Optional[List[str]] = None, batch_size: int = 8192):
+        self.vectors = vectors
+        self.kinds = np.asarray(kinds if kinds is not None else ['unknown'] * len(vectors))
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_file(cls, path: str, dim: int = 384, batch_size: int = 8192) -> 'ArraySource':
+        # .npy (LocalVectorStore) or the raw float32 rows of the embedding cache (.f32)
+        if path.endswith('.npy'):
+            vectors = np.load(path, mmap_mode='r')
+        else:
+            vectors = np.memmap(path, dtype=np.float32, mode='r').reshape(-1, dim)
+        return cls(vectors, batch_size=batch_size)
+
+    @classmethod
+    def from_local_store(cls, directory: str, collection_name: str = 'chatbott', batch_size: int = 8192) -> 'ArraySource':
+        vectors = np.load(os.path.join(directory, f"{collection_name}.vectors.npy"), mmap_mode='r')
+        try:
+            with open(os.path.join(directory, f"{collection_name}.metadata.json"), 'r', encoding='utf-8') as f:
+                kinds = [source_kind(source) for source, _ in json.load(f)]
+        except FileNotFoundError:
+            kinds = None
+        return cls(vectors, kinds, batch_size)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def batches(self) -> Iterator[Batch]:
+        for start in range(0, len(self.vectors), self.batch_size):
+            end = start + self.batch_size
+            yield np.asarray(self.vectors[start:end], dtype=np.float32), self.kinds[start:end]
+
+
+class MilvusSource:
+    '''
+    Embeddings and sources of a Milvus collection, paged with a query iterator
+    so the collection never has to fit in memory.
+    '''
+
+    def __init__(self, collection, batch_size: int = 8192):
+        self.collection = collection
+        self.batch_size = batch_size
+
+    def __len__(self) -> int:
+        return self.collection.num_entities
+
+    def batches(self) -> Iterator[Batch]:
+        iterator = self.collection.query_iterator(batch_size=self.batch_size, output_fields=['embedding', 'source'])
+        try:
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    return
+                yield (np.array([row['embedding'] for row in rows], dtype=np.float32),
+                       np.array([source_kind(row['source']) for row in rows]))
+        finally:
+            iterator.close()
+
+
+class StratifiedSample:
+    '''
+    Uniform sample of a stream of rows, stratified by source kind.
+
+    Every row gets a random key and each kind keeps its size rows with the
+    smallest keys, so memory stays bounded by size rows per kind however long
+    the stream. sample() then shares size between the kinds: a small kind (the
+    calendar rows) is taken whole, the rest is split among the larger ones.
+    '''
+
+    def __init__(self, size: int, seed: int = 0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.kept: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.pending: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self.counts = Counter()
+
+    def add(self, vectors: np.ndarray, kinds: np.ndarray):
+        keys = self.rng.random(len(vectors))
+        for kind in np.unique(kinds):
+            rows = np.flatnonzero(kinds == kind)
+            self.counts[kind] += len(rows)
+            kept_keys, _ = self.kept.get(kind, (np.empty(0), None))
+            if len(kept_keys) >= self.size:
+                # Only keys below the current cut can still make it into the sample
+                rows = rows[keys[rows] < kept_keys.max()]
+            if len(rows):
+                pending = self.pending.setdefault(kind, [])
+                pending.append((keys[rows], vectors[rows]))
+                # Compacting at a quarter of size keeps at most 2.5 * size rows alive, the concatenation included
+                if sum(len(part[0]) for part in pending) >= max(self.size // 4, 1):
+                    self._compact(kind)
+
+    def _compact(self, kind: str):
+        parts = self.pending.pop(kind, [])
+        if kind in self.kept:
+            parts.insert(0, self.kept[kind])
+        if not parts:
+            return
+        keys = np.concatenate([part[0] for part in parts])
+        vectors = np.concatenate([part[1] for part in parts])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, vectors = keys[keep], vectors[keep]
+        self.kept[kind] = (keys, vectors)
+
+    def sample(self) -> np.ndarray:
+        for kind in list(self.pending):
+            self._compact(kind)
+        kinds = sorted(self.kept, key=lambda kind: len(self.kept[kind][0]))
+        budget, chosen = self.size, []
+        for position, kind in enumerate(kinds):
+            keys, vectors = self.kept[kind]
+            take = min(len(keys), budget // (len(kinds) - position))
+            chosen.append(vectors[np.argsort(keys)[:take]])
+            budget -= take
+        return np.concatenate(chosen) if chosen else np.empty((0, 0), dtype=np.float32)
+
+
+class StreamingProjection:
+    '''
+    2-D PCA of a collection that is read in batches, twice: once to fit, once
+    to project.
+
+    method 'randomized' fits a randomized-SVD PCA on a stratified sample of
+    sample_size rows; 'incremental' runs IncrementalPCA over every batch,
+    which sees all rows and costs one small SVD per batch. Only the 2-D points
+    and their source kinds are kept, 8 bytes and a label per vector.
+    '''
+
+    METHODS = ('randomized', 'incremental')
+
+    def __init__(self, method: str = 'randomized', sample_size: int = 50000, seed: int = 0):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown projection method {method}, expected one of {', '.join(self.METHODS)}")
+        self.method = method
+        self.sample_size = sample_size
+        self.seed = seed
+        self.pca = None
+        self.sampled = 0
+        self.counts = Counter()
+
+    def fit(self, source) -> 'StreamingProjection':
+        if self.method == 'incremental':
+            from sklearn.decomposition import IncrementalPCA
+            self.pca = IncrementalPCA(n_components=2)
+            leftover = None
+            for vectors, kinds in source.batches():
+                self.counts.update(kinds.tolist())
+                if leftover is not None:
+                    vectors = np.concatenate([leftover, vectors])
+                    leftover = None
+                # partial_fit needs at least n_components rows
+                if len(vectors) < 2:
+                    leftover = vectors
+                    continue
+                self.pca.partial_fit(vectors)
+            self.sampled = sum(self.counts.values())
+        else:
+            sample = StratifiedSample(self.sample_size, self.seed)
+            for vectors, kinds in source.batches():
+                sample.add(vectors, kinds)
+            self.counts = sample.counts
+            rows = sample.sample()
+            self.sampled = len(rows)
+            self.pca = PCA(n_components=2, svd_solver='randomized', random_state=self.seed).fit(rows)
+        return self
+
+    def transform(self, source) -> Tuple[np.ndarray, np.ndarray]:
+        points, labels = [], []
+        components = self.pca.components_.T.astype(np.float32)
+        mean = self.pca.mean_.astype(np.float32)
+        for vectors, kinds in source.batches():
+            points.append((vectors - mean) @ components)
+            labels.append(kinds)
+        if not points:
+            return np.empty((0, 2), dtype=np.float32), np.empty(0, dtype=str)
+        return np.concatenate(points), np.concatenate(labels)
+
+
+def _shade(points: np.ndarray, kinds: np.ndarray, extent, resolution: int) -> np.ndarray:
+    # Datashader-style categorical shading: per-pixel counts of each kind, log-scaled, mixed by their colors
+    (x0, x1), (y0, y1) = extent
+    densities, colors = [], []
+    for kind in SOURCE_KINDS:
+        mask = kinds == kind
+        if not mask.any():
+            continue
+        counts, _, _ = np.histogram2d(points[mask, 1], points[mask, 0], bins=resolution, range=[[y0, y1], [x0, x1]])
+        densities.append(np.log1p(counts))
+        colors.append(KIND_COLORS[kind])
+    densities = np.stack(densities)
+    total = densities.sum(axis=0)
+    rgb = np.einsum('kyx,kc->yxc', densities, np.array(colors)) / np.maximum(total, 1e-12)[..., None]
+    alpha = np.clip(total / max(total.max(), 1e-12) * 1.5, 0, 1)
+    return np.dstack([rgb, alpha])
+
+
+def render_density(points: np.ndarray, kinds: np.ndarray, output: str, color_by_source: bool = False,
+                   kind: str = 'hexbin', gridsize: int = 200, title: str = 'Sentence Embeddings - PCA Density',
+                   summary: Optional[dict] = None):
+    '''
+    Writes the density of the projected points to output, a .png or a .html
+    page with the image and summary embedded. Drawn on the Agg canvas, so no
+    display is needed.
+    '''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.colors import LogNorm
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Patch
+
+    figure = Figure(figsize=(12, 10))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    present = [name for name in SOURCE_KINDS if (kinds == name).any()]
+
+    if len(points):
+        low, high = np.percentile(points, [0.1, 99.9], axis=0)
+        extent = ((low[0], high[0]), (low[1], high[1]))
+        if kind == 'hexbin':
+            layers = present if color_by_source else [None]
+            for name in layers:
+                mask = kinds == name if name is not None else slice(None)
+                ax.hexbin(points[mask, 0], points[mask, 1], gridsize=gridsize, bins='log', mincnt=1,
+                          extent=(*extent[0], *extent[1]), cmap=KIND_CMAPS[name] if name else 'viridis',
+                          alpha=0.6 if color_by_source else 1.0)
+        elif color_by_source:
+            ax.imshow(_shade(points, kinds, extent, gridsize), origin='lower', aspect='auto',
+                      extent=(*extent[0], *extent[1]))
+        else:
+            counts, _, _ = np.histogram2d(points[:, 1], points[:, 0], bins=gridsize, range=[extent[1], extent[0]])
+            ax.imshow(np.ma.masked_equal(counts, 0), origin='lower', aspect='auto', norm=LogNorm(),
+                      extent=(*extent[0], *extent[1]), cmap='viridis')
+    if color_by_source:
+        ax.legend(handles=[Patch(color=KIND_COLORS[name], label=f"{name} ({int((kinds == name).sum())})")
+                           for name in present], loc='upper right')
+
+    ax.set_title(title)
+    ax.set_xlabel('First Principal Component')
+    ax.set_ylabel('Second Principal Component')
+    figure.tight_layout()
+
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not output.endswith('.html'):
+        figure.savefig(output, dpi=100)
+        return
+
+    image = io.BytesIO()
+    figure.savefig(image, format='png', dpi=100)
+    rows = ''.join(f"<tr><th>{key}</th><td>{value}</td></tr>" for key, value in (summary or {}).items())
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title></head><body>"
+                f"<h1>{title}</h1><img src='data:image/png;base64,{base64.b64encode(image.getvalue()).decode()}'>"
+                f"<table>{rows}</table></body></html>")
+
+
 class Visualizer:
     @staticmethod
     def visualize_embeddings_pca(embeddings: np.ndarray, sentences: Optional[List[str]] = None, n_components: int = 2):
@@ -25,3 +313,71 @@ class Visualizer:
         plt.ylabel('Second Principal Component')
         plt.tight_layout()
         plt.show()
+
+    @staticmethod
+    def visualize_collection(source, output: str, method: str = 'randomized', sample_size: int = 50000,
+                             color_by_source: bool = False, kind: str = 'hexbin', gridsize: int = 200) -> dict:
+        '''
+        Density plot of a collection too large for visualize_embeddings_pca:
+        source (ArraySource or MilvusSource) is streamed, never held in memory.
+        Returns the figures written into the HTML summary, timings included.
+        '''
+        start = time.perf_counter()
+        projection = StreamingProjection(method, sample_size).fit(source)
+        fitted = time.perf_counter()
+        points, kinds = projection.transform(source)
+        projected = time.perf_counter()
+
+        summary = {
+            'vectors': len(points),
+            'method': method,
+            'fitted on': projection.sampled,
+            'explained variance': ', '.join(f"{ratio:.3f}" for ratio in projection.pca.explained_variance_ratio_),
+            'sources': ', '.join(f"{name} {count}" for name, count in sorted(projection.counts.items())),
+            'fit s': round(fitted - start, 2),
+            'project s': round(projected - fitted, 2)
+        }
+        render_density(points, kinds, output, color_by_source, kind, gridsize, summary=summary)
+        summary['render s'] = round(time.perf_counter() - projected, 2)
+        return summary
+
+
+def main():
+    import argparse
+
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Density plot of the stored embeddings, written to a PNG or HTML file")
+    parser.add_argument('--source', choices=['milvus', 'local', 'file'], default=Config.VECTOR_BACKEND)
+    parser.add_argument('--file', help="For --source file: a .npy matrix or the raw float32 rows of the embedding cache")
+    parser.add_argument('--dim', type=int, default=384, help="Vector size of a raw float32 file")
+    parser.add_argument('--output', default="embeddings.png", help="A .png, or .html for the image with a summary")
+    parser.add_argument('--method', choices=StreamingProjection.METHODS, default='randomized')
+    parser.add_argument('--sample-size', type=int, default=50000, help="Rows the randomized PCA is fitted on")
+    parser.add_argument('--kind', choices=['hexbin', 'hist2d'], default='hexbin')
+    parser.add_argument('--gridsize', type=int, default=200)
+    parser.add_argument('--color-by-source', action='store_true', help="Web pages and calendar rows in separate colors")
+    args = parser.parse_args()
+
+    if args.source == 'milvus':
+        from pymilvus import Collection, connections
+        connections.connect(alias=Config.MILVUS_ALIAS, host=Config.MILVUS_HOST, port=Config.MILVUS_PORT)
+        collection = Collection('chatbott', using=Config.MILVUS_ALIAS)
+        collection.load()
+        source = MilvusSource(collection)
+    elif args.source == 'local':
+        source = ArraySource.from_local_store(Config.LOCAL_VECTOR_DIR)
+    else:
+        if not args.file:
+            parser.error("--source file needs --file")
+        source = ArraySource.from_file(args.file, args.dim)
+
+    summary = Visualizer.visualize_collection(source, args.output, args.method, args.sample_size,
+                                              args.color_by_source, args.kind, args.gridsize)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    print(f"Written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
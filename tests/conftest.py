@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules in scripts/ import each other by bare name
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+sys.path.insert(0, SCRIPTS)
+
+DATA_CSV = os.path.join(os.path.dirname(SCRIPTS), 'data', 'data.csv')
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import DATA_CSV
+from openai_handler import AsyncOpenAIHandler
+from prompt_builder import PromptBuilder
+
+
+def tool_call(i):
+    return SimpleNamespace(id=f"call_{i}", type='function',
+                           function=SimpleNamespace(name='interact_with_wikipedia_db',
+                                                    arguments=json.dumps({'query': f"topic {i}"})))
+
+
+def completion(message):
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeAsyncClient:
+    '''Answers the first call of a turn with tool_calls tool calls, the next one with text.'''
+
+    def __init__(self, tool_calls=3, stall=0.0):
+        self.tool_calls = tool_calls
+        self.stall = stall
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        if stream:
+            return self.stream()
+        if messages[-1]['role'] == 'user' and kwargs.get('tools'):
+            return completion(SimpleNamespace(content=None, tool_calls=[tool_call(i) for i in range(self.tool_calls)]))
+        return completion(SimpleNamespace(content="answer", tool_calls=None))
+
+    async def stream(self):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="first", tool_calls=None))])
+        await asyncio.sleep(self.stall)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=" second", tool_calls=None))])
+
+    async def close(self):
+        pass
+
+
+def make_handler(client, **options):
+    return AsyncOpenAIHandler("http://unused", "key", "2024-02-15-preview", DATA_CSV, client=object(),
+                              async_client=client, prompt_builder=PromptBuilder("gpt-4o-mini"), **options)
+
+
+@pytest.fixture
+def handler():
+    handler = make_handler(FakeAsyncClient(tool_calls=3))
+    yield handler
+    handler.close()
+
+
+def test_tool_calls_of_one_turn_overlap(handler):
+    spans = []
+    lock = threading.Lock()
+    execute = handler._execute_tool
+
+    def slow_execute(call, context):
+        start = time.perf_counter()
+        time.sleep(0.2)
+        with lock:
+            spans.append((start, time.perf_counter()))
+        return execute(call, context)
+
+    handler._execute_tool = slow_execute
+    start = time.perf_counter()
+    assert handler.generate_response("what is python", ["Python is a language."]) == "answer"
+    elapsed = time.perf_counter() - start
+
+    assert len(spans) == 3
+    # Every call started before any of them finished, so the turn cost about one call
+    assert max(begin for begin, _ in spans) < min(end for _, end in spans)
+    assert elapsed < 0.5
+
+
+def test_failing_tool_call_is_dropped_from_the_prompt(handler):
+    execute = handler._execute_tool
+    answered = []
+
+    def failing_execute(call, context):
+        if call.id == 'call_1':
+            raise RuntimeError("lookup failed")
+        answered.append(call.id)
+        return execute(call, context)
+
+    handler._execute_tool = failing_execute
+    assert handler.generate_response("what is python", ["Python is a language."]) == "answer"
+    assert sorted(answered) == ['call_0', 'call_2']
+
+
+def test_stalled_stream_read_times_out():
+    handler = make_handler(FakeAsyncClient(tool_calls=0, stall=5), request_timeout=0.2)
+    try:
+        stream = handler.generate_response_stream("what is python", ["Python is a language."])
+        start = time.perf_counter()
+        tokens = list(stream)
+        assert time.perf_counter() - start < 2
+        assert tokens == ["first"]
+        assert isinstance(stream.error, asyncio.TimeoutError)
+    finally:
+        handler.close()
@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import DATA_CSV
+from openai_handler import OpenAIHandler
+from prompt_builder import PromptBuilder
+from response_cache import ResponseCache
+
+CONTEXT = ["Python is a high-level, general-purpose programming language."]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def vector(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_exact_hit_ignores_case_whitespace_and_punctuation():
+    cache = ResponseCache(max_entries=4)
+    cache.put("What is Python?", CONTEXT, "m", "a language")
+    assert cache.get("  what is   python ", CONTEXT, "m") == "a language"
+    assert cache.get("What is Python?", CONTEXT, "other-model") is None
+    assert cache.get("What is Python?", ["other context"], "m") is None
+    assert cache.stats()['exact_hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_semantic_hit_needs_similarity_model_and_context():
+    cache = ResponseCache(max_entries=4, similarity_threshold=0.9)
+    cache.put("What is Python?", CONTEXT, "m", "a language", vector(1, 0, 0))
+
+    assert cache.get("Tell me about Python", CONTEXT, "m", vector(1, 0.1, 0)) == "a language"
+    assert cache.get("Who is Alice?", CONTEXT, "m", vector(0, 1, 0)) is None
+    assert cache.get("Tell me about Python", CONTEXT, "other-model", vector(1, 0.1, 0)) is None
+    assert cache.get("Tell me about Python", ["other context"], "m", vector(1, 0.1, 0)) is None
+    assert cache.stats()['semantic_hits'] == 1
+
+
+def test_semantic_hit_across_contexts_when_allowed():
+    cache = ResponseCache(max_entries=4, similarity_threshold=0.9, semantic_requires_same_context=False)
+    cache.put("What is Python?", CONTEXT, "m", "a language", vector(1, 0, 0))
+    assert cache.get("Tell me about Python", ["other context"], "m", vector(1, 0.1, 0)) == "a language"
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = ResponseCache(max_entries=4, ttl=10, clock=clock)
+    cache.put("q", CONTEXT, "m", "answer", vector(1, 0))
+    clock.now = 9
+    assert cache.get("q", CONTEXT, "m") == "answer"
+    clock.now = 10
+    assert cache.get("q", CONTEXT, "m") is None
+    assert cache.get("similar", CONTEXT, "m", vector(1, 0)) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("first", CONTEXT, "m", "1", vector(1, 0))
+    cache.put("second", CONTEXT, "m", "2", vector(0, 1))
+    # Reading first makes second the least recently used
+    assert cache.get("first", CONTEXT, "m") == "1"
+    cache.put("third", CONTEXT, "m", "3", vector(1, 1))
+
+    assert cache.get("second", CONTEXT, "m") is None
+    assert cache.get("first", CONTEXT, "m") == "1"
+    assert cache.get("third", CONTEXT, "m") == "3"
+    # The evicted entry's semantic slot was freed and reused
+    assert cache.get("almost second", CONTEXT, "m", vector(0, 1)) is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_zero_entries_disables_the_cache():
+    cache = ResponseCache(max_entries=0)
+    cache.put("q", CONTEXT, "m", "answer", vector(1, 0))
+    assert cache.get("q", CONTEXT, "m", vector(1, 0)) is None
+    assert cache.stats() == {'entries': 0, 'exact_hits': 0, 'semantic_hits': 0, 'misses': 1, 'hit_rate': 0.0}
+
+
+def test_negative_size_is_rejected():
+    with pytest.raises(ValueError):
+        ResponseCache(max_entries=-1)
+
+
+class StubClient:
+    '''Sync chat-completions stub that answers without tool calls and counts requests.'''
+
+    def __init__(self):
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        self.requests += 1
+        message = SimpleNamespace(content=f"answer {self.requests}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_handler_answers_repeated_questions_from_the_cache():
+    client = StubClient()
+    handler = OpenAIHandler("http://unused", "key", "2024-02-15-preview", DATA_CSV, client=client,
+                            response_cache=ResponseCache(max_entries=4, similarity_threshold=0.9),
+                            prompt_builder=PromptBuilder("gpt-4o-mini"))
+
+    assert handler.generate_response("What is Python?", CONTEXT, vector(1, 0)) == "answer 1"
+    assert handler.generate_response("what is python", CONTEXT, vector(1, 0)) == "answer 1"
+    assert handler.generate_response("Explain Python", CONTEXT, vector(1, 0.05)) == "answer 1"
+    assert client.requests == 1
+    assert handler.generate_response("Who is Alice?", CONTEXT, vector(0, 1)) == "answer 2"
+    assert client.requests == 2
@@ -0,0 +1,106 @@
+import time
+from types import SimpleNamespace
+
+from conftest import DATA_CSV
+from metrics import METRICS
+from openai_handler import OpenAIHandler
+from prompt_builder import PromptBuilder
+from response_cache import ResponseCache
+from response_stream import ResponseStream
+
+CONTEXT = ["Python is a high-level, general-purpose programming language."]
+
+
+def slow_tokens(tokens, delay=0.05):
+    time.sleep(delay)
+    yield from tokens
+
+
+def test_ttft_text_and_on_complete_after_a_full_answer():
+    completed = []
+    stream = ResponseStream(slow_tokens(["Hello", " world"]), completed.append)
+    assert stream.ttft is None
+
+    assert list(stream) == ["Hello", " world"]
+    assert stream.text == "Hello world"
+    assert 0.05 <= stream.ttft <= stream.total
+    assert stream.error is None
+    assert completed == [stream]
+
+
+def test_error_ends_the_stream_without_on_complete():
+    def failing():
+        yield "partial"
+        raise RuntimeError("connection reset")
+
+    completed = []
+    stream = ResponseStream(failing(), completed.append)
+    assert list(stream) == ["partial"]
+    assert isinstance(stream.error, RuntimeError)
+    assert stream.text == "partial"
+    assert stream.ttft is not None and stream.total is None
+    assert completed == []
+
+
+def test_empty_stream_has_no_ttft():
+    completed = []
+    stream = ResponseStream(iter([]), completed.append)
+    assert list(stream) == []
+    assert stream.ttft is None and stream.parts == []
+    assert completed == [stream]
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))])
+
+
+class FakeStreamingClient:
+    '''Sync client whose streamed completion sends a few words after a delay.'''
+
+    def __init__(self, words, delay=0.05):
+        self.words = words
+        self.delay = delay
+        self.requests = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.requests += 1
+        return slow_tokens([chunk(word) for word in self.words], self.delay)
+
+
+def make_handler(client):
+    return OpenAIHandler("http://unused", "key", "2024-02-15-preview", DATA_CSV, client=client,
+                         response_cache=ResponseCache(max_entries=4), prompt_builder=PromptBuilder("gpt-4o-mini"))
+
+
+def test_handler_stream_records_ttft_and_caches_the_answer():
+    client = FakeStreamingClient(["Python", " is", " a", " language."])
+    handler = make_handler(client)
+    observed = METRICS.snapshot()['stages'].get('ttft', {}).get('count', 0)
+
+    stream = handler.generate_response_stream("What is Python?", CONTEXT)
+    assert ''.join(stream) == "Python is a language."
+    assert stream.ttft >= 0.05
+    assert handler.stream_stats()['streams'] == 1
+    assert METRICS.snapshot()['stages']['ttft']['count'] == observed + 1
+
+    # The finished answer is cached, a repeated question streams it without a request
+    cached = handler.generate_response_stream("what is python", CONTEXT)
+    assert ''.join(cached) == "Python is a language."
+    assert client.requests == 1
+
+
+def test_handler_stream_error_is_kept_and_not_cached():
+    class BrokenClient(FakeStreamingClient):
+        def create(self, model, messages, stream=False, **kwargs):
+            self.requests += 1
+            raise ConnectionError("unreachable")
+
+    client = BrokenClient([])
+    handler = make_handler(client)
+    stream = handler.generate_response_stream("What is Python?", CONTEXT)
+    assert list(stream) == []
+    assert isinstance(stream.error, ConnectionError)
+    assert handler.stream_stats() == {'streams': 0}
+    assert list(handler.generate_response_stream("What is Python?", CONTEXT)) == []
+    assert client.requests == 2